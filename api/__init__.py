@@ -1,3 +1,7 @@
 """Пакет, отвечающий за работу со сторонним api"""
 from .api_module import APIModule
 from .egs_api import EGSAPIModule
+from .deadline import Deadline
+from .exceptions import APIRequestError, DeadlineExceededError, ExecutorBusyError, InFlightLimitError
+from .executor import BoundedExecutor
+from .game import Game
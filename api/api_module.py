@@ -1,14 +1,34 @@
 """Модуль, в котором хранится базовый класс для работы со сторонним API.
 Все другие модули должны наследоваться от этого класса"""
 from abc import ABC, abstractmethod
-import requests
+import asyncio
+import aiohttp
 from requests import Response
-from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 import time
-from typing import Optional
+from typing import Any, AsyncIterator, Awaitable, Iterator, Literal, Mapping, Optional
 from loguru import logger
 
-from config_data.config import Config, load_config
+from my_logging import sampled
+
+from config_data.config import Config, get_config
+from api.deadline import Deadline
+from api.exceptions import APIRequestError, DeadlineExceededError
+from api.http_client import get_async_session, get_sync_session
+from api.rate_limit import TokenBucket, get_rate_limiter
+from api.retry import RETRYABLE_STATUSES, RetryPolicy, parse_retry_after, quota_exhausted
+from api.single_flight import SingleFlight
+from api.streaming import CHUNK_SIZE, JSONArrayParser
+from metrics import REGISTRY, Counter, Family, Histogram
+
+
+# Метрики запросов к API (общие для всех модулей)
+API_REQUEST_SECONDS: Histogram = REGISTRY.histogram('bot_api_request_duration_seconds',
+                                                    'Длительность одной попытки запроса к API')
+API_RESPONSES: Family[Counter] = REGISTRY.counter('bot_api_responses_total',
+                                                  'Ответы API по коду статуса (error - ответа не было)',
+                                                  labels=('status',))
+API_RETRIES: Counter = REGISTRY.counter('bot_api_retries_total', 'Повторные попытки запросов к API')
 
 
 class APIModule(ABC):
@@ -18,10 +38,27 @@ class APIModule(ABC):
     Args:
         base_url (str): Базовый url, к которому будут отправляться запросы
         x_rapid_api_host (str): Хост rapidAPI
+        config (Optional[Config]): Конфиг (если не передан, то используется общий конфиг процесса)
+        retry_policy (Optional[RetryPolicy]): Политика повторных запросов (если не передана, то строится по конфигу)
     """
-    def __init__(self, base_url: str, x_rapid_api_host: str) -> None:
+    # Общий для всех модулей слой объединения одинаковых одновременных запросов
+    flight: SingleFlight = SingleFlight()
+
+    def __init__(self, base_url: str, x_rapid_api_host: str, config: Optional[Config] = None,
+                 retry_policy: Optional[RetryPolicy] = None) -> None:
         self._base_url: str = base_url
         self._rapid_api_host: str = x_rapid_api_host
+        self._config: Config = config if config is not None else get_config()
+        # Ограничитель общий для всех модулей, работающих с одним хостом
+        self._rate_limiter: TokenBucket = get_rate_limiter(x_rapid_api_host,
+                                                           rate=self._config.api.rate_limit,
+                                                           capacity=self._config.api.rate_burst)
+        self._retry_policy: RetryPolicy = retry_policy if retry_policy is not None else RetryPolicy(
+            max_attempts=self._config.api.max_attempts,
+            deadline=self._config.api.deadline
+        )
+        # Заголовки одинаковы для всех запросов модуля, поэтому собираются один раз
+        self._headers: dict[str, str] = self._build_headers()
         self.lexicon: dict[str, Optional[str]] = {
             'low': None,
             'high': None,
@@ -46,20 +83,22 @@ class APIModule(ABC):
         return self._rapid_api_host
 
     @abstractmethod
-    def low_api(self, product: str, number: int) -> str:
+    def low_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
         """
         Запрос, при котором будут запрашиваться самые низкие цены / самые близкие места / самые доступные авто и т.д.
         :param product: Услуга/товар, по которым будет проводиться поиск
         :type product: str
         :param number:  Количество единиц категории (товаров/услуг)
         :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
         :return: Результат запроса уже в строковом виде
         :rtype: str
         """
         pass
 
     @abstractmethod
-    def high_api(self, product: str, number: int) -> str:
+    def high_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
         """
         Запрос, при котором будут запрашиваться самая высокая стоимость,
         самые дорогие авто, самое удалённое местоположение и так далее
@@ -67,13 +106,16 @@ class APIModule(ABC):
         :type product: str
         :param number:  Количество единиц категории (товаров/услуг)
         :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
         :return: Результат запроса уже в строковом виде
         :rtype: list[dict]
         """
         pass
 
     @abstractmethod
-    def custom_api(self, product: str, custom_range: tuple[float, float], number: int) -> str:
+    def custom_api(self, product: str, custom_range: tuple[float, float], number: int,
+                   deadline: Optional[Deadline] = None) -> str:
         """
         Вывод показателей пользовательского диапазона
         :param product: Услуга/товар, по которым будет проводиться поиск
@@ -83,13 +125,237 @@ class APIModule(ABC):
         :type custom_range: tuple[float, float]
         :param number:  Количество единиц категории (товаров/услуг)
         :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
+        :return: Результат запроса уже в строковом виде
+        :rtype: str
+        """
+        pass
+
+    @abstractmethod
+    async def alow_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант low_api, не блокирующий цикл событий
+        :param product: Услуга/товар, по которым будет проводиться поиск
+        :type product: str
+        :param number:  Количество единиц категории (товаров/услуг)
+        :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
+        :return: Результат запроса уже в строковом виде
+        :rtype: str
+        """
+        pass
+
+    @abstractmethod
+    async def ahigh_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант high_api, не блокирующий цикл событий
+        :param product: Услуга/товар, по которым будет проводиться поиск
+        :type product: str
+        :param number:  Количество единиц категории (товаров/услуг)
+        :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
+        :return: Результат запроса уже в строковом виде
+        :rtype: str
+        """
+        pass
+
+    @abstractmethod
+    async def acustom_api(self, product: str, custom_range: tuple[float, float], number: int,
+                          deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант custom_api, не блокирующий цикл событий
+        :param product: Услуга/товар, по которым будет проводиться поиск
+        :type product: str
+        :param custom_range: Диапазон значений выборки
+        :type custom_range: tuple[float, float]
+        :param number:  Количество единиц категории (товаров/услуг)
+        :type number: int
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
         :return: Результат запроса уже в строковом виде
         :rtype: str
         """
         pass
 
+    @abstractmethod
+    async def afind_games(self, command: Literal['low', 'high', 'custom'], product: str, number: int,
+                          custom_range: Optional[tuple[float, float]] = None,
+                          deadline: Optional[Deadline] = None) -> Optional[list]:
+        """
+        Асинхронный запрос по команде, возвращающий результат в структурированном виде (для хранения в истории).
+        Текст из него собирает render
+        :param command: Команда
+        :type command: Literal['low', 'high', 'custom']
+        :param product: Услуга/товар, по которым будет проводиться поиск
+        :type product: str
+        :param number:  Количество единиц категории (товаров/услуг)
+        :type number: int
+        :param custom_range: Диапазон значений выборки (только для custom)
+        :type custom_range: Optional[tuple[float, float]]
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса)
+        :type deadline: Optional[Deadline]
+        :return: Найденные позиции или None, если по запросу ничего не найдено
+        :rtype: Optional[list]
+        """
+        pass
+
+    @abstractmethod
+    def render(self, result: Optional[list]) -> str:
+        """
+        Метод переводит структурированный результат запроса в строку
+        :param result: Найденные позиции или None
+        :type result: Optional[list]
+        :return: Результат запроса в строковом виде
+        :rtype: str
+        """
+        pass
+
+    @property
+    def config(self) -> Config:
+        """Геттер для config"""
+        return self._config
+
+    def configure(self, config: Config) -> None:
+        """
+        Метод подменяет конфиг модуля (например, после перезагрузки конфига) и пересобирает заголовки
+        :param config: Новый конфиг
+        :type config: Config
+        :return: None
+        """
+        self._config = config
+        self._headers = self._build_headers()
+
+    def _build_headers(self) -> dict[str, str]:
+        """
+        Метод формирует заголовки запроса к rapidAPI
+        :return: Заголовки запроса
+        :rtype: dict[str, str]
+        """
+        return {
+            "X-RapidAPI-Key": self._config.api.rapidAPI_key,
+            "X-RapidAPI-Host": self.rapid_api_host
+        }
+
+    @classmethod
+    def _retry_reason(cls, status: int, data: Any, key_word: Optional[str]) -> Optional[str]:
+        """
+        Метод проверяет ответ сервера. Если запрос удался, то возвращает None, если его стоит повторить - причину,
+        а если повторять бессмысленно (например, неверный ключ) - выбрасывает APIRequestError
+        :param status: Код статуса ответа
+        :type status: int
+        :param data: Разобранный JSON ответа (только при статусе 200)
+        :type data: Any
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера (см. request)
+        :type key_word: Optional[str]
+        :return: Причина повтора или None
+        :rtype: Optional[str]
+        """
+        if status == 200:
+            if isinstance(data, dict) and (key_word is not None) and (key_word not in data):
+                return 'Превышена скорость запросов'
+            return None
+        if status in RETRYABLE_STATUSES:
+            return f'Код статуса запроса равен {status}'
+        raise APIRequestError(f'Код статуса запроса равен {status}', status=status, attempts=1)
+
+    def _next_delay(self, attempt: int, started: float, reason: str, status: Optional[int],
+                    headers: Mapping[str, str], pause: float, deadline: Optional[Deadline] = None) -> float:
+        """
+        Метод решает, делать ли еще одну попытку, и если да, то возвращает задержку перед ней.
+        Если попытки или время закончились или исчерпана квота тарифа, то выбрасывает APIRequestError. Паузу,
+        о которой просит сервер, ограничитель хоста получает, только если попытка будет повторена
+        :param attempt: Номер неудавшейся попытки
+        :type attempt: int
+        :param started: Момент начала запроса (time.monotonic)
+        :type started: float
+        :param reason: Причина неудачи
+        :type reason: str
+        :param status: Код статуса ответа (None, если ответа не было)
+        :type status: Optional[int]
+        :param headers: Заголовки ответа
+        :type headers: Mapping[str, str]
+        :param pause: Минимальная задержка, если сервер сообщил о превышении скорости, но не указал время ожидания
+        :type pause: float
+        :param deadline: Крайний срок поиска, переданный из хэндлера
+        :type deadline: Optional[Deadline]
+        :return: Задержка перед следующей попыткой в секундах
+        :rtype: float
+        """
+        if quota_exhausted(headers):
+            # Квота тарифа обновится только в следующем периоде - ни повтор, ни пауза ограничителя не помогут
+            raise APIRequestError(f'Исчерпана квота запросов к API: {reason}', status=status, attempts=attempt)
+
+        retry_after: Optional[float] = parse_retry_after(headers)
+        if retry_after is None and status in (200, 429):
+            retry_after = pause
+        if retry_after is not None:
+            # Дольше, чем все время на запрос, ждать нельзя: иначе один ответ остановил бы ограничитель надолго
+            retry_after = min(retry_after, self._retry_policy.deadline)
+
+        delay: float = self._retry_policy.backoff(attempt, retry_after)
+        elapsed: float = time.monotonic() - started
+        if attempt >= self._retry_policy.max_attempts or elapsed + delay > self._retry_policy.deadline:
+            raise APIRequestError(f'Запрос не удался после {attempt} попыток: {reason}',
+                                  status=status, attempts=attempt)
+        if deadline is not None and delay >= deadline.remaining():
+            # Следующая попытка началась бы уже после крайнего срока поиска
+            raise DeadlineExceededError(f'Время на поиск истекло после {attempt} попыток: {reason}',
+                                        status=status, attempts=attempt)
+
+        if retry_after is not None:
+            # Сервер просит подождать - остальные запросы к этому хосту тоже должны подождать
+            self._rate_limiter.block(retry_after)
+        logger.warning('{}. Попытка {} не удалась, повтор через {:.2f} сек', reason, attempt, delay)
+        API_RETRIES.inc()
+        return delay
+
+    @staticmethod
+    def _observe_attempt(started: float, status: Optional[int]) -> None:
+        """
+        Метод записывает в метрики длительность попытки запроса и код статуса ответа
+        :param started: Момент начала попытки (time.perf_counter)
+        :type started: float
+        :param status: Код статуса ответа (None, если ответа не было)
+        :type status: Optional[int]
+        :return: None
+        """
+        API_REQUEST_SECONDS.observe(time.perf_counter() - started)
+        API_RESPONSES.labels(status if status is not None else 'error').inc()
+
+    def _limiter_timeout(self, started: float, deadline: Optional[Deadline]) -> float:
+        """
+        Метод возвращает, сколько попытка может ждать токен ограничителя: не дольше оставшегося времени на запрос
+        и до крайнего срока поиска
+        :param started: Момент начала запроса (time.monotonic)
+        :type started: float
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Время ожидания в секундах
+        :rtype: float
+        """
+        timeout: float = self._retry_policy.deadline - (time.monotonic() - started)
+        return timeout if deadline is None else min(timeout, deadline.remaining())
+
+    def _attempt_timeout(self, deadline: Optional[Deadline]) -> float:
+        """
+        Метод возвращает таймаут очередной попытки: не больше таймаута политики и оставшегося до крайнего срока
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Таймаут в секундах
+        :rtype: float
+        :raises DeadlineExceededError: Если срок уже истек
+        """
+        if deadline is None:
+            return self._retry_policy.timeout
+        deadline.check('запрос к API')
+        return deadline.budget(self._retry_policy.timeout)
+
     def request(self, url_request: str, query_string: Optional[str] = None,
-                key_word: Optional[str] = None, pause: int = 1) -> list[dict] | dict:
+                key_word: Optional[str] = None, pause: int = 1,
+                deadline: Optional[Deadline] = None) -> list[dict] | dict:
         """
         Метод делает полностью сформированный запрос по переданному url
         :param url_request: url запроса
@@ -98,32 +364,270 @@ class APIModule(ABC):
         :type query_string: Optional[str]
         :param key_word: Ключевое слово, которое отслеживается в ответе от сервера. В бесплатных api есть ограничение
         на количество запросов в секунду. Если в полученном ответе ключевое слово не найдено, значит,
-        что этот лимит превышен и программа остановится на pause секунд
+        что этот лимит превышен и запрос будет повторен не раньше, чем через pause секунд
         :type key_word: Optional[str]
-        :param pause: Время задержки запросов к серверу в случае задержки
+        :param pause: Время задержки запросов к серверу в случае превышения лимита, если сервер не указал его сам
         :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
         :return: Ответ на запрос
         :rtype: list[dict] | dict
+        :raises APIRequestError: Если запрос не удался за отведенные попытки и время
+        :raises DeadlineExceededError: Если истек крайний срок поиска
         """
-        config: Config = load_config()
-        headers: dict[str, str] = {
-            "X-RapidAPI-Key": config.api.rapidAPI_key,
-            "X-RapidAPI-Host": self.rapid_api_host
-        }
+        # Запрос мог начать другой поток со своим сроком - этот поток ждет его результата не дольше своего срока
+        return self.flight.do((url_request, query_string, key_word),
+                              lambda: self.__request(url_request, query_string, key_word, pause, deadline),
+                              timeout=None if deadline is None else deadline.remaining())
+
+    def __request(self, url_request: str, query_string: Optional[str],
+                  key_word: Optional[str], pause: int, deadline: Optional[Deadline]) -> list[dict] | dict:
+        """
+        Метод непосредственно выполняет запрос (см. request)
+        :param url_request: url запроса
+        :type url_request: str
+        :param query_string: url код словаря с параметрами
+        :type query_string: Optional[str]
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера
+        :type key_word: Optional[str]
+        :param pause: Время задержки запросов к серверу в случае превышения лимита
+        :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
+        :return: Ответ на запрос
+        :rtype: list[dict] | dict
+        """
+        headers: dict[str, str] = self._headers
+        started: float = time.monotonic()
+        attempt: int = 0
+
+        while True:
+            attempt += 1
+            self._rate_limiter.acquire(self._limiter_timeout(started, deadline))
+            status: Optional[int] = None
+            response_headers: Mapping[str, str] = dict()
+            attempt_started: float = time.perf_counter()
+            try:
+                response: Response = get_sync_session().get(url_request, headers=headers, params=query_string,
+                                                             timeout=self._attempt_timeout(deadline))
+                status, response_headers = response.status_code, response.headers
+                data: Any = response.json() if status == 200 else None
+                reason: Optional[str] = self._retry_reason(status, data, key_word)
+            except APIRequestError:
+                if status is not None:
+                    # Повторять бессмысленно (например, неверный ключ), но ответ тоже попадает в метрики
+                    self._observe_attempt(attempt_started, status)
+                raise
+            except (RequestException, ValueError) as exc:
+                reason = f'Ошибка запроса: {exc!r}'
+
+            self._observe_attempt(attempt_started, status)
+            if reason is None:
+                # Логгируем успешный запрос
+                sampled.success('Запрос успешно выполнен')
+                return data
+            time.sleep(self._next_delay(attempt, started, reason, status, response_headers, pause, deadline))
+
+    async def arequest(self, url_request: str, query_string: Optional[str] = None,
+                       key_word: Optional[str] = None, pause: int = 1,
+                       deadline: Optional[Deadline] = None) -> list[dict] | dict:
+        """
+        Асинхронный вариант метода request. Запрос идет через общую сессию aiohttp с пулом соединений,
+        поэтому медленный ответ сервера не блокирует обработку остальных чатов.
+        Одинаковые одновременные запросы объединяются в один
+        :param url_request: url запроса
+        :type url_request: str
+        :param query_string: url код словаря с параметрами
+        :type query_string: Optional[str]
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера (см. request)
+        :type key_word: Optional[str]
+        :param pause: Время задержки запросов к серверу в случае превышения лимита
+        :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
+        :return: Ответ на запрос
+        :rtype: list[dict] | dict
+        :raises APIRequestError: Если запрос не удался за отведенные попытки и время
+        :raises DeadlineExceededError: Если истек крайний срок поиска
+        """
+        flight: Awaitable[list[dict] | dict] = self.flight.ado(
+            (url_request, query_string, key_word),
+            lambda: self.__arequest(url_request, query_string, key_word, pause, deadline)
+        )
+        if deadline is None:
+            return await flight
+        # Запрос мог начать другой чат со своим сроком - этот чат ждет его результата не дольше своего срока
+        return await deadline.run(flight, 'ожидание общего запроса к API')
+
+    async def __arequest(self, url_request: str, query_string: Optional[str],
+                         key_word: Optional[str], pause: int, deadline: Optional[Deadline]) -> list[dict] | dict:
+        """
+        Метод непосредственно выполняет асинхронный запрос (см. arequest)
+        :param url_request: url запроса
+        :type url_request: str
+        :param query_string: url код словаря с параметрами
+        :type query_string: Optional[str]
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера
+        :type key_word: Optional[str]
+        :param pause: Время задержки запросов к серверу в случае превышения лимита
+        :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
+        :return: Ответ на запрос
+        :rtype: list[dict] | dict
+        """
+        headers: dict[str, str] = self._headers
+        started: float = time.monotonic()
+        attempt: int = 0
 
         while True:
+            attempt += 1
+            await self._rate_limiter.aacquire(self._limiter_timeout(started, deadline))
+            status: Optional[int] = None
+            response_headers: Mapping[str, str] = dict()
+            attempt_started: float = time.perf_counter()
             try:
-                response: Response = requests.get(url_request, headers=headers, params=query_string)
-                # Если код статуса не равен 200, то это ошибка - залоггируем ее
-                if response.status_code != 200:
-                    raise HTTPError(f'Код статуса запроса равен {response.status_code}')
-                if isinstance(response.json(), dict) and (key_word is not None) and (key_word not in response):
-                    print('Превышена скорость запросов. Засыпаю на', pause, 'сек')
-                    time.sleep(pause)
-                else:
-                    # Логгируем успешный запрос
-                    logger.success('Запрос успешно выполнен')
-                    return response.json()
-            except HTTPError as exc:
-                # Логгируем ошибку
-                logger.error(exc)
+                timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=self._attempt_timeout(deadline))
+                session: aiohttp.ClientSession = await get_async_session()
+                async with session.get(url_request, headers=headers, params=query_string,
+                                       timeout=timeout) as response:
+                    status, response_headers = response.status, response.headers
+                    data: Any = await response.json(content_type=None) if status == 200 else None
+                reason: Optional[str] = self._retry_reason(status, data, key_word)
+            except APIRequestError:
+                if status is not None:
+                    # Повторять бессмысленно (например, неверный ключ), но ответ тоже попадает в метрики
+                    self._observe_attempt(attempt_started, status)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                reason = f'Ошибка запроса: {exc!r}'
+
+            self._observe_attempt(attempt_started, status)
+            if reason is None:
+                # Логгируем успешный запрос
+                sampled.success('Запрос успешно выполнен')
+                return data
+            await asyncio.sleep(self._next_delay(attempt, started, reason, status, response_headers, pause, deadline))
+
+    def stream(self, url_request: str, query_string: Optional[str] = None,
+               key_word: Optional[str] = None, pause: int = 1,
+               deadline: Optional[Deadline] = None) -> Iterator[Any]:
+        """
+        Метод делает запрос, ответ на который - JSON-массив, и отдает элементы массива по мере получения тела ответа.
+        В отличие от request, ответ целиком в памяти не хранится, поэтому он не кэшируется и не разделяется между
+        одинаковыми запросами. Если сервер вернул не массив (и это не превышение лимита), то элементов не будет
+        :param url_request: url запроса
+        :type url_request: str
+        :param query_string: url код словаря с параметрами
+        :type query_string: Optional[str]
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера (см. request)
+        :type key_word: Optional[str]
+        :param pause: Время задержки запросов к серверу в случае превышения лимита
+        :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
+        :return: Элементы массива
+        :rtype: Iterator[Any]
+        :raises APIRequestError: Если запрос не удался за отведенные попытки и время или оборвался посреди ответа
+        """
+        started: float = time.monotonic()
+        attempt: int = 0
+
+        while True:
+            attempt += 1
+            self._rate_limiter.acquire(self._limiter_timeout(started, deadline))
+            status: Optional[int] = None
+            response_headers: Mapping[str, str] = dict()
+            attempt_started: float = time.perf_counter()
+            streamed: bool = False
+            try:
+                with get_sync_session().get(url_request, headers=self._headers, params=query_string,
+                                            timeout=self._attempt_timeout(deadline), stream=True) as response:
+                    status, response_headers = response.status_code, response.headers
+                    reason: Optional[str] = self._retry_reason(status, None, None)
+                    if reason is None:
+                        parser: JSONArrayParser = JSONArrayParser()
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            for item in parser.feed(chunk):
+                                streamed = True
+                                yield item
+                        yield from parser.close()
+                        reason = None if parser.is_array else self._retry_reason(status, parser.document, key_word)
+            except APIRequestError:
+                if status is not None:
+                    # Повторять бессмысленно (например, неверный ключ), но ответ тоже попадает в метрики
+                    self._observe_attempt(attempt_started, status)
+                raise
+            except (RequestException, ValueError) as exc:
+                if streamed:
+                    # Часть элементов уже отдана - повтор продублировал бы их
+                    raise APIRequestError(f'Ответ оборвался: {exc!r}', status=status, attempts=attempt) from exc
+                reason = f'Ошибка запроса: {exc!r}'
+
+            self._observe_attempt(attempt_started, status)
+            if reason is None:
+                sampled.success('Запрос успешно выполнен')
+                return
+            time.sleep(self._next_delay(attempt, started, reason, status, response_headers, pause, deadline))
+
+    async def astream(self, url_request: str, query_string: Optional[str] = None,
+                      key_word: Optional[str] = None, pause: int = 1,
+                      deadline: Optional[Deadline] = None) -> AsyncIterator[Any]:
+        """
+        Асинхронный вариант метода stream
+        :param url_request: url запроса
+        :type url_request: str
+        :param query_string: url код словаря с параметрами
+        :type query_string: Optional[str]
+        :param key_word: Ключевое слово, которое отслеживается в ответе от сервера (см. request)
+        :type key_word: Optional[str]
+        :param pause: Время задержки запросов к серверу в случае превышения лимита
+        :type pause: int
+        :param deadline: Крайний срок поиска (запрос и паузы между попытками в него укладываются)
+        :type deadline: Optional[Deadline]
+        :return: Элементы массива
+        :rtype: AsyncIterator[Any]
+        :raises APIRequestError: Если запрос не удался за отведенные попытки и время или оборвался посреди ответа
+        """
+        started: float = time.monotonic()
+        attempt: int = 0
+
+        while True:
+            attempt += 1
+            await self._rate_limiter.aacquire(self._limiter_timeout(started, deadline))
+            status: Optional[int] = None
+            response_headers: Mapping[str, str] = dict()
+            attempt_started: float = time.perf_counter()
+            streamed: bool = False
+            try:
+                timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=self._attempt_timeout(deadline))
+                session: aiohttp.ClientSession = await get_async_session()
+                async with session.get(url_request, headers=self._headers, params=query_string,
+                                       timeout=timeout) as response:
+                    status, response_headers = response.status, response.headers
+                    reason: Optional[str] = self._retry_reason(status, None, None)
+                    if reason is None:
+                        parser: JSONArrayParser = JSONArrayParser()
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            for item in parser.feed(chunk):
+                                streamed = True
+                                yield item
+                        for item in parser.close():
+                            yield item
+                        reason = None if parser.is_array else self._retry_reason(status, parser.document, key_word)
+            except APIRequestError:
+                if status is not None:
+                    # Повторять бессмысленно (например, неверный ключ), но ответ тоже попадает в метрики
+                    self._observe_attempt(attempt_started, status)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                if streamed:
+                    # Часть элементов уже отдана - повтор продублировал бы их
+                    raise APIRequestError(f'Ответ оборвался: {exc!r}', status=status, attempts=attempt) from exc
+                reason = f'Ошибка запроса: {exc!r}'
+
+            self._observe_attempt(attempt_started, status)
+            if reason is None:
+                sampled.success('Запрос успешно выполнен')
+                return
+            await asyncio.sleep(self._next_delay(attempt, started, reason, status, response_headers, pause, deadline))
@@ -0,0 +1,144 @@
+"""Модуль с in-process кэшем ответов стороннего API (TTL + LRU с ограничением по числу записей и по объему)"""
+from collections import OrderedDict
+from threading import Lock
+import sys
+import time
+from typing import Any, Callable, Hashable, Optional
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Функция приблизительно оценивает объем памяти, занимаемый объектом вместе со всеми вложенными объектами
+    :param obj: Объект
+    :type obj: Any
+    :return: Объем в байтах
+    :rtype: int
+    """
+    size: int = 0
+    stack: list = [obj]
+    seen: set[int] = set()
+
+    while stack:
+        current: Any = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__slots__'):
+            stack.extend(getattr(current, slot) for slot in current.__slots__ if hasattr(current, slot))
+
+    return size
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш с ограниченным временем жизни записей. Если превышено максимальное число записей
+    или суммарный объем, то вытесняются давно не использованные записи (LRU)
+
+    Args:
+        ttl (float): Время жизни записи в секундах
+        max_entries (int): Максимальное количество записей
+        max_bytes (int): Максимальный суммарный объем записей в байтах
+        sizeof (Callable[[Any], int]): Функция оценки объема записи
+    """
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int,
+                 sizeof: Callable[[Any], int] = deep_sizeof) -> None:
+        self.__ttl: float = ttl
+        self.__max_entries: int = max_entries
+        self.__max_bytes: int = max_bytes
+        self.__sizeof: Callable[[Any], int] = sizeof
+        # Ключ -> (момент устаревания, объем, значение). Порядок словаря - порядок использования
+        self.__entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self.__current_bytes: int = 0
+        self.__lock: Lock = Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def current_bytes(self) -> int:
+        """Геттер для суммарного объема записей"""
+        return self.__current_bytes
+
+    @property
+    def hit_ratio(self) -> float:
+        """Доля запросов, обслуженных из кэша"""
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Метод возвращает значение из кэша, если оно есть и не устарело
+        :param key: Ключ
+        :type key: Hashable
+        :return: Значение или None
+        :rtype: Optional[Any]
+        """
+        with self.__lock:
+            entry: Optional[tuple[float, int, Any]] = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self.__remove(key)
+                self.misses += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Метод сохраняет значение в кэш, при необходимости вытесняя старые записи
+        :param key: Ключ
+        :type key: Hashable
+        :param value: Значение
+        :type value: Any
+        :return: None
+        """
+        if self.__ttl <= 0 or self.__max_entries <= 0:
+            return
+        size: int = self.__sizeof(value)
+        if size > self.__max_bytes:
+            # Запись больше всего бюджета - хранить ее нет смысла
+            return
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (time.monotonic() + self.__ttl, size, value)
+            self.__current_bytes += size
+
+            while len(self.__entries) > self.__max_entries or self.__current_bytes > self.__max_bytes:
+                oldest_key: Hashable = next(iter(self.__entries))
+                self.__remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Метод очищает кэш
+        :return: None
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__current_bytes = 0
+
+    def __remove(self, key: Hashable) -> None:
+        """
+        Метод удаляет запись (вызывается под блокировкой)
+        :param key: Ключ
+        :type key: Hashable
+        :return: None
+        """
+        self.__current_bytes -= self.__entries.pop(key)[1]
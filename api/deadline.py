@@ -0,0 +1,70 @@
+"""Модуль с крайним сроком поиска. Срок создается в хэндлере и передается вниз до HTTP-запроса: каждый этап
+(поиск в истории, ожидание в очереди, попытки запроса и паузы между ними) получает не больше оставшегося времени"""
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from api.exceptions import DeadlineExceededError
+
+
+T = TypeVar('T')
+
+
+class Deadline:
+    """
+    Крайний срок (по time.monotonic, поэтому не зависит от перевода системных часов)
+
+    Args:
+        seconds (float): Через сколько секунд срок истекает
+    """
+    __slots__ = ('__expires_at',)
+
+    def __init__(self, seconds: float) -> None:
+        self.__expires_at: float = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Сколько секунд осталось (не меньше нуля)"""
+        return max(0.0, self.__expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.__expires_at
+
+    def budget(self, seconds: Optional[float] = None) -> float:
+        """
+        Метод возвращает время на этап: не больше seconds и не больше оставшегося
+        :param seconds: Бюджет этапа (None - без отдельного ограничения)
+        :type seconds: Optional[float]
+        :return: Время на этап в секундах
+        :rtype: float
+        """
+        return self.remaining() if seconds is None else min(seconds, self.remaining())
+
+    def check(self, stage: str) -> None:
+        """
+        Метод выбрасывает DeadlineExceededError, если срок уже истек
+        :param stage: Название этапа (для сообщения об ошибке)
+        :type stage: str
+        :return: None
+        """
+        if self.expired:
+            raise DeadlineExceededError(f'Время на поиск истекло: {stage}')
+
+    async def run(self, awaitable: Awaitable[T], stage: str, seconds: Optional[float] = None) -> T:
+        """
+        Метод ждет awaitable не дольше budget(seconds). Если время вышло, то awaitable отменяется
+        (aiohttp при этом возвращает соединение в пул или закрывает его)
+        :param awaitable: Этап
+        :type awaitable: Awaitable[T]
+        :param stage: Название этапа (для сообщения об ошибке)
+        :type stage: str
+        :param seconds: Бюджет этапа
+        :type seconds: Optional[float]
+        :return: Результат этапа
+        :rtype: T
+        :raises DeadlineExceededError: Если этап не уложился во время
+        """
+        try:
+            return await asyncio.wait_for(awaitable, self.budget(seconds))
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f'Время на поиск истекло: {stage}') from None
@@ -1,8 +1,15 @@
 """Модуль, отвечающий за работу с api steam (https://rapidapi.com/1yesari1/api/epic-store-games)"""
 from api.api_module import APIModule
+from api.deadline import Deadline
+from api.cache import TTLCache
+from api.game import Game, iter_games, parse_games, to_game
+from api.price_index import PriceIndex
+from api.selection import PriceQuery, aselect_games, select_games
+from config_data.config import Config
 from urllib.parse import urlencode
-from typing import Callable, Optional, Any
-from my_logging import info_logger
+from typing import AsyncIterator, Literal, Optional
+from my_logging import info_logger, sampled
+from service import normalize_product
 from loguru import logger
 
 
@@ -16,10 +23,17 @@ class EGSAPIModule(APIModule):
         весь полученный список результатов. Например, если лимит будет установлен на 100 игр, пользователь попросит
         найти 200 игр с минимальной ценой, по его ключевому слову будет найдено 1000 игр, то программа просто выведет
         первые 200 игр из этого списка. Это реализованно для того, чтобы время ожидания было коротким.
+        config (Optional[Config]) - Конфиг (если не передан, то используется общий конфиг процесса). Из него же
+        берутся настройки кэша списков игр и режим работы: с кэшем и ценовым индексом каталога или потоковый
+        (ответ разбирается по мере получения и в памяти держатся только отбираемые игры)
     """
-    def __init__(self, request_length_limit: int = 100):
+    locale: str = 'ru'
+    country: str = 'ru'
+
+    def __init__(self, request_length_limit: int = 100, config: Optional[Config] = None):
         super().__init__(base_url='https://epic-store-games.p.rapidapi.com/onSale',
-                         x_rapid_api_host="epic-store-games.p.rapidapi.com")
+                         x_rapid_api_host="epic-store-games.p.rapidapi.com",
+                         config=config)
         self.lexicon['low'] = 'Пожалуйста, введите ключевое слово, по которому будут искаться самые дешевые игры'
         self.lexicon['high'] = 'Пожалуйста, введите ключевое слово, по которому будут искаться самые дорогие игры'
         self.lexicon['custom'] = ('Пожалуйста, введите ключевое слово,'
@@ -32,80 +46,203 @@ class EGSAPIModule(APIModule):
                                        ' введите два числа через пробел')
 
         self.__req_len_limit: int = request_length_limit
+        # Кэш списков игр по нормализованному ключевому слову. /low, /high и /custom отличаются только
+        # локальной сортировкой и фильтром, поэтому один ответ сервера может обслужить их все
+        self.__cache: TTLCache = TTLCache(ttl=self.config.api.cache_ttl,
+                                          max_entries=self.config.api.cache_max_entries,
+                                          max_bytes=self.config.api.cache_max_bytes)
 
     def __str__(self) -> str:
         return 'На данный момент бот работает с API https://rapidapi.com/1yesari1/api/epic-store-games, '\
                'который позволяет получать информацию о играх с магазина epic games store'
 
-    def __get_response(self, *, product: str, number: int,
-                       func_sort: Callable, func_filter: Optional[Callable[[Any], bool]] = None) -> str:
+    @property
+    def cache(self) -> TTLCache:
+        """Геттер для кэша ответов (в том числе для счетчиков попаданий и промахов)"""
+        return self.__cache
+
+    def __cache_key(self, product: str) -> tuple[str, str, str]:
         """
-        У методов low_api, high_api и custom_api код отличается только в методе сортировки и фильтре значений.
-        Это функция несет в себе их общий функционал
+        Метод формирует ключ кэша: нормализованное ключевое слово (нижний регистр, одиночные пробелы), локаль и страна
         :param product: Ключевое слово, по которому проводится поиск
         :type product: str
-        :param number: Количество запрашиваемых игр
-        :param number: int
-        :param func_sort: Функция сортировки
-        :type func_sort: Callable
-        :param func_filter: Функция фильтр
-        :type func_filter: Optional[Callable]
-        :return: Список запрашиваемых игр
+        :return: Ключ кэша
+        :rtype: tuple[str, str, str]
+        """
+        return normalize_product(product), self.locale, self.country
+
+    @classmethod
+    def __build_query(cls, key: tuple[str, str, str]) -> str:
+        """
+        Метод формирует строку параметров запроса по ключу кэша
+        :param key: Ключ кэша (ключевое слово, локаль, страна)
+        :type key: tuple[str, str, str]
+        :return: url код словаря с параметрами
         :rtype: str
         """
-        query_string: str = urlencode({"searchWords": product,
-                                       "categories": "Games",
-                                       "locale": "ru",
-                                       "country": "ru"})
+        return urlencode({"searchWords": key[0],
+                          "categories": "Games",
+                          "locale": key[1],
+                          "country": key[2]})
 
-        # Сделаем запрос
-        list_games: list[dict] = self.request(
-            url_request=self.base_url,
-            query_string=query_string
-        )
-        # Отфильтруем значения
-        if func_filter is not None:
-            list_games = [game for game in list_games if func_filter(game)]
-
-        # Выведем самые дешевые игры
-        logger.warning(f'Метод __get_response пытается отфильтровать это\n{list_games}')
-        try:
-            list_games.sort(key=func_sort)
-            list_games = list_games[:number]
-            # Отсеем лишнюю информацию
-            result_games: list[dict] = [
-                {'title': game['title'],
-                 'price': round(game['price']['totalPrice']['discountPrice'] / 100, 2),
-                 'url': game['url']
-                 }
-                for game in list_games
-            ]
-
-            return self.__create_str_result(result_games)
-        except AttributeError:
-            logger.warning('Запрос успешно обработан, но результат не найден')
-            return 'По вашему ключевому слову игры не найдены('
+    @classmethod
+    def __price_query(cls, command: Literal['low', 'high', 'custom'], number: int,
+                      custom_range: Optional[tuple[float, float]]) -> PriceQuery:
+        """
+        Метод переводит команду в запрос на отбор игр по цене
+        :param command: Команда
+        :type command: Literal['low', 'high', 'custom']
+        :param number: Количество игр
+        :type number: int
+        :param custom_range: Ценовой диапазон (только для custom)
+        :type custom_range: Optional[tuple[float, float]]
+        :return: Запрос на отбор игр
+        :rtype: PriceQuery
+        """
+        if command == 'high':
+            return PriceQuery(number, descending=True)
+        if command == 'custom':
+            return PriceQuery(number, custom_range=custom_range)
+        return PriceQuery(number)
+
+    def __get_games(self, *, product: str, query: PriceQuery,
+                    deadline: Optional[Deadline] = None) -> Optional[list[Game]]:
+        """
+        У методов low_api, high_api и custom_api код отличается только в запросе на отбор игр по цене.
+        Это функция несет в себе их общий функционал
+        :param product: Ключевое слово, по которому проводится поиск
+        :type product: str
+        :param query: Запрос на отбор игр
+        :type query: PriceQuery
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Список запрашиваемых игр или None, если сервер вернул не список игр
+        :rtype: Optional[list[Game]]
+        """
+        key: tuple[str, str, str] = self.__cache_key(product)
+        if self.config.api.streaming:
+            # Игры отбираются по мере получения ответа
+            return select_games(
+                iter_games(self.stream(url_request=self.base_url, query_string=self.__build_query(key),
+                                       deadline=deadline)),
+                query
+            )
+
+        index: Optional[PriceIndex] = self.__cache.get(key)
+        if index is None:
+            # Сделаем запрос
+            index = self.__save_to_cache(key, self.request(
+                url_request=self.base_url,
+                query_string=self.__build_query(key),
+                deadline=deadline
+            ))
+
+        return self.__process_games(index, query)
+
+    async def __aget_games(self, *, product: str, query: PriceQuery,
+                           deadline: Optional[Deadline] = None) -> Optional[list[Game]]:
+        """
+        Асинхронный вариант __get_games
+        :param product: Ключевое слово, по которому проводится поиск
+        :type product: str
+        :param query: Запрос на отбор игр
+        :type query: PriceQuery
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Список запрашиваемых игр или None, если сервер вернул не список игр
+        :rtype: Optional[list[Game]]
+        """
+        key: tuple[str, str, str] = self.__cache_key(product)
+        if self.config.api.streaming:
+            # Игры отбираются по мере получения ответа
+            return await aselect_games(self.__astream_games(key, deadline), query)
+
+        index: Optional[PriceIndex] = self.__cache.get(key)
+        if index is None:
+            # Сделаем запрос
+            index = self.__save_to_cache(key, await self.arequest(
+                url_request=self.base_url,
+                query_string=self.__build_query(key),
+                deadline=deadline
+            ))
+
+        return self.__process_games(index, query)
+
+    async def __astream_games(self, key: tuple[str, str, str],
+                              deadline: Optional[Deadline] = None) -> AsyncIterator[Game]:
+        """
+        Метод отдает игры по мере получения ответа сервера
+        :param key: Ключ кэша (ключевое слово, локаль, страна)
+        :type key: tuple[str, str, str]
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Записи об играх
+        :rtype: AsyncIterator[Game]
+        """
+        async for raw in self.astream(url_request=self.base_url, query_string=self.__build_query(key),
+                                      deadline=deadline):
+            game: Optional[Game] = to_game(raw)
+            if game is not None:
+                yield game
+
+    def __save_to_cache(self, key: tuple[str, str, str], response: list[dict] | dict) -> Optional[PriceIndex]:
+        """
+        Метод один раз разбирает ответ сервера в список записей Game, строит по нему ценовой индекс
+        и сохраняет индекс в кэш. Кэшируются только списки игр (не сообщения об ошибках)
+        :param key: Ключ кэша
+        :type key: tuple[str, str, str]
+        :param response: Ответ сервера
+        :type response: list[dict] | dict
+        :return: Ценовой индекс или None, если сервер вернул не список игр
+        :rtype: Optional[PriceIndex]
+        """
+        list_games: Optional[list[Game]] = parse_games(response)
+        if list_games is None:
+            return None
+
+        index: PriceIndex = PriceIndex(list_games)
+        self.__cache.set(key, index)
+        sampled.debug('Кэш ответов: попаданий {}, промахов {}', self.__cache.hits, self.__cache.misses)
+        return index
 
     @classmethod
-    def __create_str_result(cls, response: list[dict]) -> str:
+    def __process_games(cls, index: Optional[PriceIndex], query: PriceQuery) -> Optional[list[Game]]:
+        """
+        Метод выбирает игры из ценового индекса
+        :param index: Ценовой индекс (None, если сервер вернул не список игр)
+        :type index: Optional[PriceIndex]
+        :param query: Запрос на отбор игр
+        :type query: PriceQuery
+        :return: Список запрашиваемых игр или None
+        :rtype: Optional[list[Game]]
+        """
+        # Если сервер вернул не список игр, а сообщение, то игр не найдено
+        if index is None:
+            logger.warning('Запрос успешно обработан, но результат не найден')
+            return None
+
+        logger.debug('Игры выбираются из индекса по {} играм', len(index))
+        return index.select(query)
+
+    def render(self, result: Optional[list[Game]]) -> str:
         """
-        Метод переводит обработанный ответ сервера в строку
-        :param response: Обработанный ответ сервера
-        :type response: list[dict]
-        :return: Строковый вид обработанного ответа сервера
+        Метод переводит отобранные игры в строку
+        :param result: Отобранные игры (None, если сервер вернул не список игр)
+        :type result: Optional[list[Game]]
+        :return: Строковый вид списка игр
         :rtype: str
         """
-        result_string: str = '\n'.join(['{num}. {title} - {price} руб\nurl: {url}\n'.format(
-            num=num + 1,
-            title=game['title'],
-            price=game['price'],
-            url=game['url']
-        ) for num, game in enumerate(response)])
+        if result is None:
+            return 'По вашему ключевому слову игры не найдены('
+
+        # Текст собирается при каждом выводе истории, поэтому f-строка, а не более медленный str.format
+        result_string: str = '\n'.join([f'{num}. {game.title} - {game.rubles} руб\nurl: {game.url}\n'
+                                        for num, game in enumerate(result, 1)])
 
         return result_string
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
-    def low_api(self, product: str, number: int) -> str:
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    def low_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
         """
         Функция ищет игры по ключевому слову product и выводит number самых дешевых из них
         (если цены совпадают, то выводит первые попавшиеся)
@@ -113,17 +250,19 @@ class EGSAPIModule(APIModule):
         :type product: str
         :param number: Количество игр с наименьшими ценами
         :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
         :return: Список игр
         :rtype: list[dict]
         """
-        return self.__get_response(
+        return self.render(self.__get_games(
             product=product,
-            number=number,
-            func_sort=lambda game: game['price']['totalPrice']['discountPrice']
-        )
+            query=PriceQuery(number),
+            deadline=deadline
+        ))
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
-    def high_api(self, product: str, number: int) -> str:
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    def high_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
         """
         Функция ищет игры по ключевому слову product и выводит number самых дорогих из них
         (если цены совпадают, то выводит первые попавшиеся)
@@ -131,17 +270,20 @@ class EGSAPIModule(APIModule):
         :type product: str
         :param number: Количество игр с наименьшими ценами
         :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
         :return: Список игр
         :rtype: list[dict]
         """
-        return self.__get_response(
+        return self.render(self.__get_games(
             product=product,
-            number=number,
-            func_sort=lambda game: -game['price']['totalPrice']['discountPrice']
-        )
+            query=PriceQuery(number, descending=True),
+            deadline=deadline
+        ))
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
-    def custom_api(self, product: str, custom_range: tuple[float, float], number: int) -> str:
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    def custom_api(self, product: str, custom_range: tuple[float, float], number: int,
+                   deadline: Optional[Deadline] = None) -> str:
         """
         Функция ищет игры по ключевому слову product и выводит number шт по возрастанию в ценовом диапазоне custom_range
         (если цены совпадают, то выводит первые попавшиеся)
@@ -151,15 +293,101 @@ class EGSAPIModule(APIModule):
         :type custom_range: tuple[float, float]
         :param number: Количество игр с наименьшими ценами
         :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
         :return: Список игр
         :rtype: list[dict]
         """
-        return self.__get_response(
+        return self.render(self.__get_games(
+            product=product,
+            query=PriceQuery(number, custom_range=custom_range),
+            deadline=deadline
+        ))
+
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    async def alow_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант low_api
+        :param product: ключевое слово, по которому будут искаться игры
+        :type product: str
+        :param number: Количество игр с наименьшими ценами
+        :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Список игр
+        :rtype: str
+        """
+        return self.render(await self.__aget_games(
+            product=product,
+            query=PriceQuery(number),
+            deadline=deadline
+        ))
+
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    async def ahigh_api(self, product: str, number: int, deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант high_api
+        :param product: ключевое слово, по которому будут искаться игры
+        :type product: str
+        :param number: Количество игр с наибольшими ценами
+        :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Список игр
+        :rtype: str
+        """
+        return self.render(await self.__aget_games(
+            product=product,
+            query=PriceQuery(number, descending=True),
+            deadline=deadline
+        ))
+
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    async def acustom_api(self, product: str, custom_range: tuple[float, float], number: int,
+                          deadline: Optional[Deadline] = None) -> str:
+        """
+        Асинхронный вариант custom_api
+        :param product: ключевое слово, по которому будут искаться игры
+        :type product: str
+        :param custom_range: Ценовой диапазон
+        :type custom_range: tuple[float, float]
+        :param number: Количество игр
+        :type number: int
+        :param deadline: Крайний срок поиска
+        :type deadline: Optional[Deadline]
+        :return: Список игр
+        :rtype: str
+        """
+        return self.render(await self.__aget_games(
+            product=product,
+            query=PriceQuery(number, custom_range=custom_range),
+            deadline=deadline
+        ))
+
+    @info_logger(log_level='DEBUG', message='Поиск игр')
+    async def afind_games(self, command: Literal['low', 'high', 'custom'], product: str, number: int,
+                          custom_range: Optional[tuple[float, float]] = None,
+                          deadline: Optional[Deadline] = None) -> Optional[list[Game]]:
+        """
+        Функция ищет игры по ключевому слову product и отбирает их по команде (как alow_api, ahigh_api
+        и acustom_api), но возвращает не строку, а список игр
+        :param command: Команда
+        :type command: Literal['low', 'high', 'custom']
+        :param product: ключевое слово, по которому будут искаться игры
+        :type product: str
+        :param number: Количество игр
+        :type number: int
+        :param custom_range: Ценовой диапазон (только для custom)
+        :type custom_range: Optional[tuple[float, float]]
+        :param deadline: Крайний срок поиска (None - ограничены только попытки запроса, см. RetryPolicy)
+        :type deadline: Optional[Deadline]
+        :return: Список игр или None, если игры не найдены
+        :rtype: Optional[list[Game]]
+        """
+        return await self.__aget_games(
             product=product,
-            number=number,
-            func_sort=lambda game: game['price']['totalPrice']['discountPrice'],
-            func_filter=lambda game:
-            custom_range[0] <= game['price']['totalPrice']['discountPrice'] / 100 <= custom_range[1]
+            query=self.__price_query(command, number, custom_range),
+            deadline=deadline
         )
 
 
@@ -0,0 +1,38 @@
+"""Модуль с исключениями, возникающими при работе со сторонним API"""
+from typing import Optional
+
+
+class APIRequestError(Exception):
+    """
+    Запрос к стороннему API не удался (сервер недоступен, вернул ошибку или исчерпан лимит попыток).
+    Хэндлеры перехватывают это исключение и сообщают пользователю, что сервис временно недоступен
+
+    Args:
+        message (str): Описание ошибки
+        status (Optional[int]): Код статуса последнего ответа (None, если ответа не было)
+        attempts (int): Количество сделанных попыток
+    """
+    def __init__(self, message: str, status: Optional[int] = None, attempts: int = 0) -> None:
+        super().__init__(message)
+        self.status: Optional[int] = status
+        self.attempts: int = attempts
+
+
+class ExecutorBusyError(Exception):
+    """
+    Очередь запросов к стороннему API заполнена. Хэндлеры сразу просят пользователя повторить запрос позже,
+    вместо того чтобы копить ожидающие запросы
+    """
+
+
+class InFlightLimitError(Exception):
+    """
+    У пользователя уже выполняется поиск. Следующий поиск можно начать после того, как придет результат предыдущего
+    """
+
+
+class DeadlineExceededError(APIRequestError):
+    """
+    Время, отведенное на поиск, истекло. Работа по поиску отменяется, а пользователь получает сообщение о том,
+    что поиск занял слишком много времени
+    """
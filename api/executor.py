@@ -0,0 +1,188 @@
+"""Модуль с ограниченным исполнителем запросов к стороннему API. Медленные запросы не должны занимать бота целиком:
+одновременно выполняется не больше workers запросов, остальные ждут в очереди ограниченной длины, а когда и она
+заполнена, запрос сразу отклоняется. У одного чата одновременно выполняется не больше per_key запросов"""
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from api.exceptions import DeadlineExceededError, ExecutorBusyError, InFlightLimitError
+from metrics import Histogram
+
+
+class BoundedExecutor:
+    """
+    Исполнитель запросов. Корутины выполняются в цикле событий (run), синхронные функции - в пуле из workers потоков
+    (run_in_thread). Очередь честная: освободившееся место получает запрос, который ждет дольше всех
+
+    Args:
+        workers (int): Количество одновременно выполняющихся запросов
+        max_queue (int): Сколько запросов может ждать свободного места
+        per_key (int): Сколько запросов одного ключа (чата) может выполняться и ждать одновременно
+
+    Attributes:
+        queue_wait (Histogram): Время ожидания в очереди (секунды)
+        execution (Histogram): Время выполнения запроса (секунды)
+        rejected_busy (int): Количество запросов, отклоненных из-за заполненной очереди
+        rejected_in_flight (int): Количество запросов, отклоненных из-за уже выполняющегося запроса того же чата
+    """
+    def __init__(self, workers: int, max_queue: int, per_key: int = 1) -> None:
+        self.__workers: int = workers
+        self.__max_queue: int = max_queue
+        self.__per_key: int = per_key
+        self.__running: int = 0
+        self.__waiters: deque[asyncio.Future] = deque()
+        self.__in_flight: dict[Hashable, int] = dict()
+        self.__threads: Optional[ThreadPoolExecutor] = None
+
+        self.queue_wait: Histogram = Histogram()
+        self.execution: Histogram = Histogram()
+        self.rejected_busy: int = 0
+        self.rejected_in_flight: int = 0
+
+    @property
+    def running(self) -> int:
+        """Количество выполняющихся запросов"""
+        return self.__running
+
+    @property
+    def queued(self) -> int:
+        """Количество запросов в очереди"""
+        return len(self.__waiters)
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args: Any,
+                  queue_timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        Метод выполняет корутину func(*args, **kwargs) от имени ключа key, когда освободится место
+        :param key: Ключ (id чата)
+        :type key: Hashable
+        :param func: Функция, возвращающая awaitable
+        :type func: Callable[..., Awaitable[Any]]
+        :param queue_timeout: Сколько секунд можно ждать места (None - без ограничения)
+        :type queue_timeout: Optional[float]
+        :return: Результат func
+        :rtype: Any
+        :raises InFlightLimitError: У ключа уже выполняется per_key запросов
+        :raises ExecutorBusyError: Все места заняты и очередь заполнена
+        :raises DeadlineExceededError: Место не освободилось за queue_timeout
+        """
+        return await self.__submit(key, lambda: func(*args, **kwargs), queue_timeout)
+
+    async def run_in_thread(self, key: Hashable, func: Callable[..., Any], *args: Any,
+                            queue_timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        Метод выполняет синхронную func(*args, **kwargs) в пуле потоков от имени ключа key, когда освободится место.
+        Поток нельзя прервать, поэтому func должна сама укладываться во время (например, получив крайний срок)
+        :param key: Ключ (id чата)
+        :type key: Hashable
+        :param func: Синхронная функция
+        :type func: Callable[..., Any]
+        :param queue_timeout: Сколько секунд можно ждать места (None - без ограничения)
+        :type queue_timeout: Optional[float]
+        :return: Результат func
+        :rtype: Any
+        :raises InFlightLimitError: У ключа уже выполняется per_key запросов
+        :raises ExecutorBusyError: Все места заняты и очередь заполнена
+        :raises DeadlineExceededError: Место не освободилось за queue_timeout
+        """
+        if self.__threads is None:
+            self.__threads = ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix='api')
+        threads: ThreadPoolExecutor = self.__threads
+        return await self.__submit(key, lambda: asyncio.get_running_loop().run_in_executor(
+            threads, functools.partial(func, *args, **kwargs)), queue_timeout)
+
+    async def __submit(self, key: Hashable, start: Callable[[], Awaitable[Any]],
+                       queue_timeout: Optional[float]) -> Any:
+        """
+        Метод проверяет ограничения, ждет места в очереди и выполняет запрос
+        :param key: Ключ (id чата)
+        :type key: Hashable
+        :param start: Функция, запускающая запрос
+        :type start: Callable[[], Awaitable[Any]]
+        :param queue_timeout: Сколько секунд можно ждать места
+        :type queue_timeout: Optional[float]
+        :return: Результат запроса
+        :rtype: Any
+        """
+        if self.__in_flight.get(key, 0) >= self.__per_key:
+            self.rejected_in_flight += 1
+            raise InFlightLimitError(f'У {key} уже выполняется запрос')
+        if self.__running >= self.__workers and len(self.__waiters) >= self.__max_queue:
+            self.rejected_busy += 1
+            raise ExecutorBusyError('Очередь запросов к API заполнена')
+
+        self.__in_flight[key] = self.__in_flight.get(key, 0) + 1
+        try:
+            queued: float = time.perf_counter()
+            await self.__acquire(queue_timeout)
+            started: float = time.perf_counter()
+            self.queue_wait.observe(started - queued)
+            try:
+                return await start()
+            finally:
+                self.execution.observe(time.perf_counter() - started)
+                self.__release()
+        finally:
+            self.__in_flight[key] -= 1
+            if self.__in_flight[key] == 0:
+                del self.__in_flight[key]
+
+    async def __acquire(self, timeout: Optional[float]) -> None:
+        """
+        Метод занимает место для запроса или ставит запрос в очередь до освобождения места
+        :param timeout: Сколько секунд можно ждать (None - без ограничения)
+        :type timeout: Optional[float]
+        :return: None
+        :raises DeadlineExceededError: Место не освободилось за timeout
+        """
+        if self.__running < self.__workers and not self.__waiters:
+            self.__running += 1
+            return
+
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__waiters.append(waiter)
+        try:
+            # Освободившееся место передается напрямую, счетчик выполняющихся при этом не меняется
+            await asyncio.wait([waiter], timeout=timeout)
+        except asyncio.CancelledError:
+            self.__leave(waiter)
+            raise
+        if not waiter.done():
+            self.__leave(waiter)
+            raise DeadlineExceededError('Время на поиск истекло: ожидание в очереди')
+
+    def __leave(self, waiter: asyncio.Future) -> None:
+        """
+        Метод убирает запрос из очереди. Если место ему уже передали, то оно передается следующему
+        :param waiter: Ожидание запроса
+        :type waiter: asyncio.Future
+        :return: None
+        """
+        if waiter.done():
+            self.__release()
+        else:
+            waiter.cancel()
+            self.__waiters.remove(waiter)
+
+    def __release(self) -> None:
+        """
+        Метод освобождает место: передает его первому запросу в очереди или уменьшает счетчик выполняющихся
+        :return: None
+        """
+        while self.__waiters:
+            waiter: asyncio.Future = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.__running -= 1
+
+    def shutdown(self) -> None:
+        """
+        Метод останавливает пул потоков (выполняющиеся синхронные запросы дорабатывают)
+        :return: None
+        """
+        if self.__threads is not None:
+            self.__threads.shutdown(wait=False)
+        self.__threads = None
@@ -0,0 +1,88 @@
+"""Модуль с компактной записью об игре, в которую один раз разбирается ответ EGS API"""
+from typing import Any, Iterable, Iterator, Optional
+from loguru import logger
+
+from my_logging import payload
+
+
+class Game:
+    """
+    Запись об игре. Хранит только то, что нужно для сортировки, фильтрации и вывода
+
+    Args:
+        title (str): Название игры
+        url (str): Ссылка на игру в магазине
+        price (int): Цена со скидкой в копейках
+    """
+    __slots__ = ('title', 'url', 'price')
+
+    def __init__(self, title: str, url: str, price: int) -> None:
+        self.title: str = title
+        self.url: str = url
+        self.price: int = price
+
+    def __repr__(self) -> str:
+        return f'Game(title={self.title!r}, url={self.url!r}, price={self.price!r})'
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Game):
+            return NotImplemented
+        return (self.title, self.url, self.price) == (other.title, other.url, other.price)
+
+    @property
+    def rubles(self) -> float:
+        """Цена со скидкой в рублях"""
+        return round(self.price / 100, 2)
+
+    @classmethod
+    def from_raw(cls, raw: dict) -> 'Game':
+        """
+        Метод создает запись из элемента ответа /onSale
+        :param raw: Элемент ответа сервера
+        :type raw: dict
+        :return: Запись об игре
+        :rtype: Game
+        """
+        return cls(title=raw['title'], url=raw['url'], price=int(raw['price']['totalPrice']['discountPrice']))
+
+
+def to_game(raw: Any) -> Optional[Game]:
+    """
+    Функция разбирает элемент ответа /onSale в запись
+    :param raw: Элемент ответа сервера
+    :type raw: Any
+    :return: Запись об игре или None, если у элемента нет нужных полей
+    :rtype: Optional[Game]
+    """
+    try:
+        return Game.from_raw(raw)
+    except (KeyError, TypeError, ValueError):
+        logger.warning('Пропущен элемент ответа неизвестного формата: {}', payload(raw))
+        return None
+
+
+def iter_games(response: Iterable[Any]) -> Iterator[Game]:
+    """
+    Функция лениво разбирает поток элементов ответа /onSale в записи. Элементы без нужных полей пропускаются
+    :param response: Элементы ответа сервера
+    :type response: Iterable[Any]
+    :return: Записи об играх
+    :rtype: Iterator[Game]
+    """
+    for raw in response:
+        game: Optional[Game] = to_game(raw)
+        if game is not None:
+            yield game
+
+
+def parse_games(response: list[dict] | dict) -> Optional[list[Game]]:
+    """
+    Функция разбирает ответ /onSale в список записей. Элементы без нужных полей пропускаются
+    :param response: Ответ сервера
+    :type response: list[dict] | dict
+    :return: Список игр или None, если сервер вернул не список игр, а сообщение
+    :rtype: Optional[list[Game]]
+    """
+    if not isinstance(response, list):
+        return None
+    return list(iter_games(response))
@@ -0,0 +1,67 @@
+"""Модуль с общими HTTP-клиентами (с пулом соединений и keep-alive) для запросов к стороннему API"""
+import asyncio
+from typing import Optional
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+
+POOL_SIZE: int = 100  # Максимальное количество одновременно открытых соединений
+KEEPALIVE_TIMEOUT: float = 30  # Сколько секунд держать простаивающее соединение открытым
+
+__async_session: Optional[aiohttp.ClientSession] = None
+__async_session_loop: Optional[asyncio.AbstractEventLoop] = None
+__sync_session: Optional[requests.Session] = None
+
+
+async def get_async_session() -> aiohttp.ClientSession:
+    """
+    Функция возвращает общую для всего процесса асинхронную сессию aiohttp. Сессия создается лениво
+    и привязывается к текущему циклу событий (если цикл сменился, например, после asyncio.run, сессия пересоздается)
+    :return: Асинхронная сессия
+    :rtype: aiohttp.ClientSession
+    """
+    global __async_session, __async_session_loop
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    if __async_session is None or __async_session.closed or __async_session_loop is not loop:
+        connector: aiohttp.TCPConnector = aiohttp.TCPConnector(limit=POOL_SIZE,
+                                                               keepalive_timeout=KEEPALIVE_TIMEOUT)
+        __async_session = aiohttp.ClientSession(connector=connector)
+        __async_session_loop = loop
+
+    return __async_session
+
+
+def get_sync_session() -> requests.Session:
+    """
+    Функция возвращает общую для всего процесса синхронную сессию requests с пулом соединений
+    :return: Синхронная сессия
+    :rtype: requests.Session
+    """
+    global __sync_session
+
+    if __sync_session is None:
+        adapter: HTTPAdapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        __sync_session = requests.Session()
+        __sync_session.mount('https://', adapter)
+        __sync_session.mount('http://', adapter)
+
+    return __sync_session
+
+
+async def close_sessions() -> None:
+    """
+    Функция закрывает общие HTTP-сессии. Вызывается при остановке бота
+    :return: None
+    """
+    global __async_session, __async_session_loop, __sync_session
+
+    if __async_session is not None and not __async_session.closed:
+        await __async_session.close()
+    __async_session = None
+    __async_session_loop = None
+
+    if __sync_session is not None:
+        __sync_session.close()
+    __sync_session = None
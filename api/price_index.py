@@ -0,0 +1,84 @@
+"""Модуль с ценовым индексом каталога игр: запросы /low, /high и /custom отвечаются срезами за O(log n + k)"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+from api.game import Game
+from api.selection import PriceQuery
+
+
+class PriceIndex:
+    """
+    Отсортированный по цене каталог игр с параллельным массивом цен для бинарного поиска.
+    Строится один раз на закэшированный список. При равных ценах игры идут в исходном порядке ("первые попавшиеся")
+
+    Args:
+        games (list[Game]): Список игр в порядке ответа сервера
+    """
+    __slots__ = ('_prices', '_games')
+
+    def __init__(self, games: list[Game]) -> None:
+        # sorted устойчива, поэтому равные цены сохраняют исходный порядок
+        self._games: list[Game] = sorted(games, key=lambda game: game.price)
+        self._prices: array = array('q', (game.price for game in self._games))
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def lowest(self, number: int) -> list[Game]:
+        """
+        Метод возвращает number самых дешевых игр
+        :param number: Количество игр
+        :type number: int
+        :return: Список игр по возрастанию цены
+        :rtype: list[Game]
+        """
+        return self._games[:max(number, 0)]
+
+    def highest(self, number: int) -> list[Game]:
+        """
+        Метод возвращает number самых дорогих игр. Индекс идет группами равных цен с конца,
+        внутри группы порядок исходный
+        :param number: Количество игр
+        :type number: int
+        :return: Список игр по убыванию цены
+        :rtype: list[Game]
+        """
+        result: list[Game] = list()
+        end: int = len(self._prices)
+
+        while end > 0 and len(result) < number:
+            start: int = bisect_left(self._prices, self._prices[end - 1], 0, end)
+            result.extend(self._games[start:min(end, start + number - len(result))])
+            end = start
+
+        return result
+
+    def in_range(self, bounds: tuple[int, int], number: int) -> list[Game]:
+        """
+        Метод возвращает number самых дешевых игр, цена которых (в копейках) лежит в диапазоне bounds
+        :param bounds: Ценовой диапазон в копейках (границы включаются)
+        :type bounds: tuple[int, int]
+        :param number: Количество игр
+        :type number: int
+        :return: Список игр по возрастанию цены
+        :rtype: list[Game]
+        """
+        start: int = bisect_left(self._prices, bounds[0])
+        end: int = bisect_right(self._prices, bounds[1])
+        return self._games[start:min(end, start + max(number, 0))]
+
+    def select(self, query: PriceQuery) -> list[Game]:
+        """
+        Метод отвечает на запрос срезом индекса
+        :param query: Запрос
+        :type query: PriceQuery
+        :return: Отобранные игры
+        :rtype: list[Game]
+        """
+        bounds: Optional[tuple[int, int]] = query.bounds
+        if bounds is not None:
+            return self.in_range(bounds, query.number)
+        if query.descending:
+            return self.highest(query.number)
+        return self.lowest(query.number)
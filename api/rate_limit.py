@@ -0,0 +1,131 @@
+"""Модуль с ограничителем частоты запросов к стороннему API (token bucket)"""
+from threading import Lock
+import asyncio
+import time
+from typing import Optional
+
+from api.exceptions import DeadlineExceededError
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов по алгоритму token bucket. Токены пополняются со скоростью rate в секунду,
+    но их не может быть больше capacity. Каждый запрос забирает один токен; если токенов нет,
+    то запрос резервирует будущий токен и ждет его появления. Работает и для потоков, и для корутин
+
+    Args:
+        rate (float): Количество запросов в секунду
+        capacity (int): Максимальный размер всплеска запросов
+
+    Raises:
+        ValueError: Если rate не больше нуля или capacity меньше одного (токен никогда бы не появился)
+    """
+    def __init__(self, rate: float, capacity: int) -> None:
+        if not rate > 0:
+            raise ValueError(f'Скорость ограничителя должна быть больше нуля, получено {rate}')
+        if capacity < 1:
+            raise ValueError(f'Всплеск ограничителя должен быть не меньше одного запроса, получено {capacity}')
+        self.__rate: float = rate
+        self.__capacity: float = float(capacity)
+        self.__tokens: float = float(capacity)
+        self.__updated: float = time.monotonic()
+        self.__blocked_until: float = 0.0
+        self.__lock: Lock = Lock()
+
+    @property
+    def rate(self) -> float:
+        """Геттер для rate"""
+        return self.__rate
+
+    def reserve(self, timeout: Optional[float] = None) -> float:
+        """
+        Метод забирает токен (возможно, еще не появившийся) и возвращает, сколько секунд нужно подождать
+        :param timeout: Сколько секунд можно ждать (None - без ограничения)
+        :type timeout: Optional[float]
+        :return: Время ожидания в секундах
+        :rtype: float
+        :raises DeadlineExceededError: Если токен появится позже timeout (токен при этом не забирается)
+        """
+        with self.__lock:
+            now: float = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+            self.__tokens -= 1
+
+            wait: float = max(-self.__tokens / self.__rate if self.__tokens < 0 else 0.0, self.__blocked_until - now)
+            if timeout is not None and wait > timeout:
+                self.__tokens += 1
+                raise DeadlineExceededError(f'Ограничитель частоты запросов выдаст токен через {wait:.1f} с, '
+                                            f'а ждать можно {max(timeout, 0.0):.1f} с')
+            return wait
+
+    def block(self, seconds: float) -> None:
+        """
+        Метод приостанавливает выдачу токенов на seconds секунд (например, если сервер ответил, что лимит исчерпан)
+        :param seconds: Время паузы в секундах
+        :type seconds: float
+        :return: None
+        """
+        with self.__lock:
+            self.__blocked_until = max(self.__blocked_until, time.monotonic() + seconds)
+
+    def refill_time(self) -> float:
+        """
+        Метод возвращает, через сколько секунд ограничитель снова наполнится (с учетом паузы после block)
+        :return: Время в секундах
+        :rtype: float
+        """
+        with self.__lock:
+            now: float = time.monotonic()
+            tokens: float = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+            return max((self.__capacity - tokens) / self.__rate, self.__blocked_until - now, 0.0)
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Метод блокирует поток, пока не появится токен
+        :param timeout: Сколько секунд можно ждать (None - без ограничения)
+        :type timeout: Optional[float]
+        :return: Время ожидания в секундах
+        :rtype: float
+        :raises DeadlineExceededError: Если токен не появится за timeout
+        """
+        wait: float = self.reserve(timeout)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Метод ждет появления токена, не блокируя цикл событий
+        :param timeout: Сколько секунд можно ждать (None - без ограничения)
+        :type timeout: Optional[float]
+        :return: Время ожидания в секундах
+        :rtype: float
+        :raises DeadlineExceededError: Если токен не появится за timeout
+        """
+        wait: float = self.reserve(timeout)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+__limiters: dict[str, TokenBucket] = dict()
+__limiters_lock: Lock = Lock()
+
+
+def get_rate_limiter(host: str, rate: float, capacity: int) -> TokenBucket:
+    """
+    Функция возвращает общий для процесса ограничитель для хоста (создает его при первом обращении)
+    :param host: Хост API (например, rapid_api_host)
+    :type host: str
+    :param rate: Количество запросов в секунду, разрешенное тарифом
+    :type rate: float
+    :param capacity: Максимальный размер всплеска запросов
+    :type capacity: int
+    :return: Ограничитель
+    :rtype: TokenBucket
+    """
+    with __limiters_lock:
+        if host not in __limiters:
+            __limiters[host] = TokenBucket(rate=rate, capacity=capacity)
+        return __limiters[host]
@@ -0,0 +1,81 @@
+"""Модуль с политикой повторных запросов к стороннему API"""
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import random
+from typing import Mapping, Optional
+
+
+# Коды статуса, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES: frozenset[int] = frozenset({408, 429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Политика повторных запросов: экспоненциальная задержка с полным джиттером,
+    ограниченная количеством попыток и общим временем на запрос
+
+    Attributes:
+        max_attempts (int): Максимальное количество попыток
+        base_delay (float): Задержка перед второй попыткой в секундах (далее удваивается)
+        max_delay (float): Максимальная задержка между попытками в секундах
+        deadline (float): Общее время на все попытки в секундах
+        timeout (float): Таймаут одного HTTP-запроса в секундах
+    """
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    deadline: float = 30.0
+    timeout: float = 10.0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Метод вычисляет задержку перед следующей попыткой. Если сервер указал, сколько ждать, то ждем не меньше
+        :param attempt: Номер неудавшейся попытки (начиная с 1)
+        :type attempt: int
+        :param retry_after: Время ожидания, указанное сервером
+        :type retry_after: Optional[float]
+        :return: Задержка в секундах
+        :rtype: float
+        """
+        delay: float = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Функция достает из заголовков ответа, через сколько секунд можно повторить запрос. Учитываются
+    стандартный заголовок Retry-After (секунды или HTTP-дата). Исчерпанную квоту rapidAPI проверяет quota_exhausted
+    :param headers: Заголовки ответа (регистронезависимый словарь)
+    :type headers: Mapping[str, str]
+    :return: Время ожидания в секундах или None, если сервер его не указал
+    :rtype: Optional[float]
+    """
+    retry_after: Optional[str] = headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                moment: datetime = parsedate_to_datetime(retry_after)
+                return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    return None
+
+
+def quota_exhausted(headers: Mapping[str, str]) -> bool:
+    """
+    Функция проверяет по заголовкам rapidAPI, исчерпана ли квота запросов тарифа. Квота обновляется только
+    в начале следующего периода (X-RateLimit-Requests-Reset - это время до него, часы или дни), поэтому
+    повторять запрос бессмысленно
+    :param headers: Заголовки ответа (регистронезависимый словарь)
+    :type headers: Mapping[str, str]
+    :return: True, если запросов по тарифу не осталось
+    :rtype: bool
+    """
+    return headers.get('X-RateLimit-Requests-Remaining') == '0'
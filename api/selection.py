@@ -0,0 +1,126 @@
+"""Модуль с потоковым отбором первых number элементов без полной сортировки"""
+from itertools import chain
+import heapq
+import math
+from typing import Any, AsyncIterable, Callable, Iterable, NamedTuple, Optional, TypeVar
+
+from api.game import Game
+
+
+T = TypeVar('T')
+
+BATCH_SIZE: int = 1024  # Сколько элементов асинхронного потока накапливается перед очередным отбором
+
+
+class PriceQuery(NamedTuple):
+    """
+    Запрос на отбор игр по цене
+
+    Attributes:
+        number (int): Количество игр
+        descending (bool): Отбирать самые дорогие (иначе самые дешевые)
+        custom_range (Optional[tuple[float, float]]): Ценовой диапазон в рублях (границы включаются)
+    """
+    number: int
+    descending: bool = False
+    custom_range: Optional[tuple[float, float]] = None
+
+    @property
+    def bounds(self) -> Optional[tuple[int, int]]:
+        """Ценовой диапазон в копейках (границы округляются внутрь диапазона)"""
+        if self.custom_range is None:
+            return None
+        return math.ceil(self.custom_range[0] * 100), math.floor(self.custom_range[1] * 100)
+
+    def key(self) -> Callable[[Game], int]:
+        """Ключ сортировки игр для этого запроса"""
+        if self.descending:
+            return lambda game: -game.price
+        return lambda game: game.price
+
+    def predicate(self) -> Optional[Callable[[Game], bool]]:
+        """Фильтр игр для этого запроса (None, если фильтровать не нужно)"""
+        bounds: Optional[tuple[int, int]] = self.bounds
+        if bounds is None:
+            return None
+        low, high = bounds
+        return lambda game: low <= game.price <= high
+
+
+def top_n(items: Iterable[T], number: int, key: Callable[[T], Any],
+          predicate: Optional[Callable[[T], bool]] = None) -> list[T]:
+    """
+    Функция за один проход фильтрует элементы и отбирает number наименьших по ключу за O(n log number).
+    Результат совпадает с sorted(filter(predicate, items), key=key)[:number]: при равных ключах элементы
+    идут в исходном порядке ("первые попавшиеся")
+    :param items: Элементы (может быть генератором - в памяти держится не больше number элементов)
+    :type items: Iterable[T]
+    :param number: Количество элементов
+    :type number: int
+    :param key: Ключ сортировки
+    :type key: Callable[[T], Any]
+    :param predicate: Фильтр (если None, то элементы не фильтруются)
+    :type predicate: Optional[Callable[[T], bool]]
+    :return: Отобранные элементы по возрастанию ключа
+    :rtype: list[T]
+    """
+    if predicate is not None:
+        items = filter(predicate, items)
+    # heapq.nsmallest при равных ключах сохраняет исходный порядок элементов
+    return heapq.nsmallest(number, items, key=key)
+
+
+async def atop_n(items: AsyncIterable[T], number: int, key: Callable[[T], Any],
+                 predicate: Optional[Callable[[T], bool]] = None) -> list[T]:
+    """
+    Асинхронный вариант top_n. Элементы копятся пачками по BATCH_SIZE, и после каждой пачки остаются только
+    number лучших, поэтому в памяти держится не больше number + BATCH_SIZE элементов
+    :param items: Асинхронный поток элементов
+    :type items: AsyncIterable[T]
+    :param number: Количество элементов
+    :type number: int
+    :param key: Ключ сортировки
+    :type key: Callable[[T], Any]
+    :param predicate: Фильтр (если None, то элементы не фильтруются)
+    :type predicate: Optional[Callable[[T], bool]]
+    :return: Отобранные элементы по возрастанию ключа
+    :rtype: list[T]
+    """
+    best: list[T] = list()
+    batch: list[T] = list()
+
+    async for item in items:
+        if predicate is None or predicate(item):
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                # Лучшие идут раньше пачки, поэтому при равных ключах порядок остается исходным
+                best = heapq.nsmallest(number, chain(best, batch), key=key)
+                batch = list()
+
+    return heapq.nsmallest(number, chain(best, batch), key=key)
+
+
+def select_games(games: Iterable[Game], query: PriceQuery) -> list[Game]:
+    """
+    Функция отбирает игры из потока по запросу
+    :param games: Поток игр
+    :type games: Iterable[Game]
+    :param query: Запрос
+    :type query: PriceQuery
+    :return: Отобранные игры
+    :rtype: list[Game]
+    """
+    return top_n(games, query.number, key=query.key(), predicate=query.predicate())
+
+
+async def aselect_games(games: AsyncIterable[Game], query: PriceQuery) -> list[Game]:
+    """
+    Асинхронный вариант select_games
+    :param games: Асинхронный поток игр
+    :type games: AsyncIterable[Game]
+    :param query: Запрос
+    :type query: PriceQuery
+    :return: Отобранные игры
+    :rtype: list[Game]
+    """
+    return await atop_n(games, query.number, key=query.key(), predicate=query.predicate())
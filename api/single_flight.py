@@ -0,0 +1,120 @@
+"""Модуль с объединением одинаковых одновременных запросов (single-flight): пока запрос выполняется,
+все остальные вызовы с тем же ключом ждут его результата, а не отправляют свой запрос"""
+import asyncio
+from threading import Event, Lock
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from api.exceptions import DeadlineExceededError
+
+
+class _Call:
+    """Выполняющийся синхронный вызов, результат которого ждут остальные потоки"""
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.event: Event = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Класс, объединяющий одновременные вызовы с одинаковым ключом в один. Работает как для потоков (метод do),
+    так и для корутин (метод ado). Результат разделяется между всеми ожидающими, поэтому изменять его нельзя
+
+    Attributes:
+        calls (int): Общее количество вызовов
+        coalesced (int): Количество вызовов, которые дождались чужого результата вместо своего запроса
+    """
+    def __init__(self) -> None:
+        self.__lock: Lock = Lock()
+        self.__sync_calls: dict[Hashable, _Call] = dict()
+        self.__async_calls: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = dict()
+
+        self.calls: int = 0
+        self.coalesced: int = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся в данный момент запросов"""
+        return len(self.__sync_calls) + len(self.__async_calls)
+
+    def do(self, key: Hashable, func: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Метод выполняет func или, если вызов с таким же ключом уже выполняется в другом потоке, ждет его результата.
+        Вызов мог начать поток со своим сроком, поэтому ожидающий поток ждет не дольше своего timeout
+        :param key: Ключ вызова
+        :type key: Hashable
+        :param func: Функция без аргументов
+        :type func: Callable[[], Any]
+        :param timeout: Сколько секунд ждать чужой вызов (None - без ограничения)
+        :type timeout: Optional[float]
+        :return: Результат func
+        :rtype: Any
+        :raises DeadlineExceededError: Если чужой вызов не завершился за timeout
+        """
+        with self.__lock:
+            self.calls += 1
+            call: Optional[_Call] = self.__sync_calls.get(key)
+            leader: bool = call is None
+            if leader:
+                call = _Call()
+                self.__sync_calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise DeadlineExceededError(f'Общий вызов не завершился за {timeout:.1f} с')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self.__lock:
+                del self.__sync_calls[key]
+            call.event.set()
+
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Метод выполняет корутину func() или, если вызов с таким же ключом уже выполняется, ждет его результата.
+        Запрос выполняется отдельной задачей, поэтому отмена одного из ожидающих не отменяет запрос для остальных
+        :param key: Ключ вызова
+        :type key: Hashable
+        :param func: Функция без аргументов, возвращающая awaitable
+        :type func: Callable[[], Awaitable[Any]]
+        :return: Результат func
+        :rtype: Any
+        """
+        loop_key: tuple[asyncio.AbstractEventLoop, Hashable] = (asyncio.get_running_loop(), key)
+        self.calls += 1
+        task: Optional[asyncio.Task] = self.__async_calls.get(loop_key)
+
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.__async_calls[loop_key] = task
+            task.add_done_callback(lambda done_task: self.__forget(loop_key, done_task))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def __forget(self, loop_key: tuple[asyncio.AbstractEventLoop, Hashable], task: asyncio.Task) -> None:
+        """
+        Метод убирает завершившийся запрос из списка выполняющихся
+        :param loop_key: Цикл событий и ключ вызова
+        :type loop_key: tuple[asyncio.AbstractEventLoop, Hashable]
+        :param task: Завершившаяся задача
+        :type task: asyncio.Task
+        :return: None
+        """
+        self.__async_calls.pop(loop_key, None)
+        if not task.cancelled():
+            # Помечаем исключение полученным, даже если все ожидающие были отменены
+            task.exception()
@@ -0,0 +1,110 @@
+"""Модуль с потоковым разбором JSON-массива: элементы ответа сервера разбираются по мере получения кусков тела,
+поэтому весь ответ целиком в памяти не хранится"""
+import codecs
+import json
+import re
+from typing import Any, Optional
+
+
+CHUNK_SIZE: int = 64 * 1024  # Размер куска тела ответа, который читается за один раз
+
+_WHITESPACE: re.Pattern = re.compile(r'[ \t\n\r]*')
+_NUMBER_TAIL: re.Pattern = re.compile(r'[0-9.eE+-]*')
+
+
+class JSONArrayParser:
+    """
+    Инкрементальный парсер JSON-документа, который является массивом. Метод feed принимает очередной кусок байтов
+    и возвращает элементы массива, которые удалось разобрать целиком. Если документ оказался не массивом
+    (например, сервер вернул сообщение об ошибке), то он разбирается целиком и после close доступен в document
+    """
+    def __init__(self) -> None:
+        self.__decoder: json.JSONDecoder = json.JSONDecoder()
+        self.__text_decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder('utf-8')()
+        self.__buffer: str = ''
+        self.__pos: int = 0
+        # start - ждем начала документа, value - ждем элемент, first - ждем элемент или конец пустого массива,
+        # separator - ждем запятую или конец массива, done - массив закончился, document - документ не массив
+        self.__state: str = 'start'
+        self.document: Optional[Any] = None
+
+    @property
+    def is_array(self) -> bool:
+        """Является ли документ массивом (известно после получения первого значащего символа)"""
+        return self.__state not in ('start', 'document')
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """
+        Метод принимает очередной кусок тела ответа
+        :param chunk: Кусок тела ответа
+        :type chunk: bytes
+        :return: Элементы массива, разобранные целиком
+        :rtype: list[Any]
+        """
+        # Уже разобранную часть буфера отбрасываем, чтобы буфер не рос вместе с ответом
+        self.__buffer = self.__buffer[self.__pos:] + self.__text_decoder.decode(chunk)
+        self.__pos = 0
+        return self.__parse(final=False)
+
+    def close(self) -> list[Any]:
+        """
+        Метод завершает разбор после получения последнего куска
+        :return: Оставшиеся элементы массива
+        :rtype: list[Any]
+        :raises ValueError: Если документ оборвался или не является корректным JSON
+        """
+        self.__buffer = self.__buffer[self.__pos:] + self.__text_decoder.decode(b'', final=True)
+        self.__pos = 0
+        items: list[Any] = self.__parse(final=True)
+
+        if self.__state == 'document':
+            self.document = json.loads(self.__buffer)
+        elif self.__state != 'done':
+            raise ValueError('JSON-документ оборвался или содержит ошибку')
+        return items
+
+    def __parse(self, final: bool) -> list[Any]:
+        """
+        Метод разбирает буфер, пока в нем есть целые элементы
+        :param final: Больше кусков не будет
+        :type final: bool
+        :return: Разобранные элементы
+        :rtype: list[Any]
+        """
+        items: list[Any] = list()
+        buffer: str = self.__buffer
+        pos: int = self.__pos
+
+        while self.__state != 'document':
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char: str = buffer[pos]
+
+            if self.__state == 'start':
+                self.__state = 'first' if char == '[' else 'document'
+                pos += char == '['
+            elif self.__state == 'first' and char == ']':
+                self.__state = 'done'
+                pos += 1
+            elif self.__state in ('first', 'value'):
+                try:
+                    value, end = self.__decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Элемент еще не пришел целиком (ошибка в самом JSON обнаружится в close)
+                    break
+                if (not final and isinstance(value, (int, float))
+                        and _NUMBER_TAIL.match(buffer, end).end() == len(buffer)):
+                    # Число в конце буфера могло прийти не полностью - дождемся следующего куска
+                    break
+                items.append(value)
+                pos = end
+                self.__state = 'separator'
+            elif self.__state == 'separator' and char in ',]':
+                self.__state = 'value' if char == ',' else 'done'
+                pos += 1
+            else:
+                raise ValueError(f'Неожиданный символ {char!r} в JSON-документе')
+
+        self.__pos = pos
+        return items
@@ -0,0 +1 @@
+"""Пакет с бенчмарками. Каждый модуль запускается отдельно: python -m benchmarks.<имя модуля>"""
@@ -0,0 +1,67 @@
+"""Бенчмарк разбиения длинных ответов на сообщения: пропускная способность split_message
+и adjusting_length_message на ответах в несколько мегабайт с вложенными тегами и сущностями по сравнению со старым
+разбиением срезами, и сколько сообщений получилось с некорректной разметкой. Свойства разбиения проверяются
+в tests/test_chunker.py
+
+Запуск: python -m benchmarks.bench_chunker"""
+import random
+import time
+
+from service import MAX_MSG_LENGTH, adjusting_length_message, split_message
+from tests.test_chunker import check_message, random_html
+
+
+SIZES_MB: tuple[int, ...] = (1, 4, 16)
+
+
+def old_adjusting_length_message(response_list: list[str]) -> list[str]:
+    """Старое разбиение: строка длиннее предела режется срезами string = string[MAX_MSG_LENGTH:]"""
+    result_messages: list[str] = list()
+    current_message: list[str] = list()
+    line_breaker_number: int = 0
+    current_length: int = 0
+    for string in response_list:
+        if current_length + len(string) + line_breaker_number < MAX_MSG_LENGTH:
+            current_length += len(string) + 1
+            line_breaker_number += 1
+            current_message.append(string)
+        else:
+            if len(current_message) != 0:
+                result_messages.append('\n'.join(current_message))
+            if len(string) > MAX_MSG_LENGTH:
+                while len(string) > 0:
+                    result_messages.append(string[:MAX_MSG_LENGTH])
+                    string = string[MAX_MSG_LENGTH:]
+                line_breaker_number = 0
+                current_message = list()
+                current_length = 0
+            else:
+                line_breaker_number = 1
+                current_message = [string]
+                current_length = len(string) + 1
+    if len(current_message) != 0:
+        result_messages.append('\n'.join(current_message))
+    return result_messages
+
+
+def throughput() -> None:
+    """Пропускная способность на больших ответах: одной строкой и списком записей"""
+    rng: random.Random = random.Random(0)
+    for size_mb in SIZES_MB:
+        text: str = random_html(rng, size_mb * 1024 * 1024)
+        # Записи как в истории: каждая со своей закрытой разметкой
+        records: list[str] = [random_html(rng, rng.randint(50, 750)) for _ in range(size_mb * 1024 * 1024 // 400)]
+        for name, func, argument in (('старое, одна строка', old_adjusting_length_message, [text]),
+                                     ('split_message', split_message, text),
+                                     ('старое, записи', old_adjusting_length_message, records),
+                                     ('adjusting_length_message, записи', adjusting_length_message, records)):
+            started: float = time.perf_counter()
+            messages: list[str] = func(argument)
+            elapsed: float = time.perf_counter() - started
+            print(f'{size_mb:3} МБ, {name:34}: {elapsed * 1000:8.1f} мс, {size_mb / elapsed:7.1f} МБ/с, '
+                  f'сообщений {len(messages)}, некорректных '
+                  f'{sum(check_message(message, MAX_MSG_LENGTH) is not None for message in messages)}')
+
+
+if __name__ == '__main__':
+    throughput()
@@ -0,0 +1,33 @@
+"""Бенчмарк накладных расходов на конфиг в каждом запросе к API: чтение .env на каждый запрос
+(как было раньше) против заранее собранных заголовков из общего конфига"""
+import os
+import timeit
+
+from api import EGSAPIModule
+from config_data.config import Config, get_config, load_config
+
+
+NUMBER: int = 10_000
+
+
+def headers_per_request() -> dict[str, str]:
+    """Старый путь: load_config() и сборка заголовков на каждый запрос"""
+    config: Config = load_config()
+    return {"X-RapidAPI-Key": config.api.rapidAPI_key, "X-RapidAPI-Host": 'epic-store-games.p.rapidapi.com'}
+
+
+def main() -> None:
+    os.environ.setdefault('BOT_TOKEN', '1111111111:aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa')
+    os.environ.setdefault('X-RapidAPI-Key', '111111111111111122222222223333333333333333333')
+
+    api: EGSAPIModule = EGSAPIModule(config=get_config())
+
+    before: float = timeit.timeit(headers_per_request, number=NUMBER) / NUMBER
+    after: float = timeit.timeit(lambda: api._headers, number=NUMBER) / NUMBER
+    print(f'load_config() на каждый запрос: {before * 1e6:.2f} мкс/запрос')
+    print(f'заранее собранные заголовки:    {after * 1e6:.3f} мкс/запрос')
+    print(f'ускорение: x{before / after:.0f}')
+
+
+if __name__ == '__main__':
+    main()
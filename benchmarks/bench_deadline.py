@@ -0,0 +1,84 @@
+"""Проверка крайнего срока поиска на "зависшем" сервере API: сервер принимает запрос и не отвечает. Измеряется,
+через сколько поиск возвращает управление и через сколько сервер видит, что соединение закрыто (то есть сокет
+освобожден), без крайнего срока и с ним - для асинхронного поиска и для синхронного в потоке
+
+Запуск: python -m benchmarks.bench_deadline"""
+import asyncio
+import time
+from typing import Optional
+
+from aiohttp import web
+from loguru import logger
+
+from api import APIRequestError, Deadline, DeadlineExceededError, EGSAPIModule
+from api.http_client import close_sessions
+from benchmarks.bench_webhook import free_port
+from config_data.config import API, Config, TgBot
+
+
+SEARCH_TIMEOUT: float = 2
+
+
+class StalledAPI:
+    """Сервер, который не отвечает на запросы и запоминает, когда клиент закрыл соединение"""
+    def __init__(self) -> None:
+        self.closed_at: list[float] = list()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            while request.transport is not None and not request.transport.is_closing():
+                await asyncio.sleep(0.05)
+            return web.Response()
+        finally:
+            # Сюда попадаем и при отмене обработчика из-за закрытого клиентом соединения
+            self.closed_at.append(time.perf_counter())
+
+
+async def measure(name: str, api: EGSAPIModule, server: StalledAPI, deadline: Optional[Deadline],
+                  in_thread: bool) -> None:
+    server.closed_at.clear()
+    started: float = time.perf_counter()
+    try:
+        if in_thread:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: api.low_api('red dead', 5, deadline))
+        else:
+            await api.afind_games('low', 'red dead', 5, deadline=deadline)
+        outcome: str = 'ответ'
+    except DeadlineExceededError:
+        outcome = 'истек срок'
+    except APIRequestError:
+        outcome = 'ошибка api'
+    returned: float = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    released: str = f'{server.closed_at[-1] - started:5.1f} с' if server.closed_at else 'не освобождено'
+    print(f'{name:40}: {outcome:10}, управление вернулось через {returned:5.1f} с, '
+          f'последнее соединение освобождено через {released}, запросов к серверу {len(server.closed_at)}')
+
+
+async def main() -> None:
+    logger.remove()
+    server: StalledAPI = StalledAPI()
+    app: web.Application = web.Application()
+    app.router.add_get('/onSale', server.handle)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None, handler_cancellation=True)
+    await runner.setup()
+    port: int = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+
+    # Без крайнего срока поиск ограничен только политикой повторов: 4 попытки по 10 секунд, не больше 30 секунд
+    api: EGSAPIModule = EGSAPIModule(config=Config(tg_bot=TgBot(token=''),
+                                                   api=API(rapidAPI_key='', rate_limit=100, rate_burst=100)))
+    api._base_url = f'http://127.0.0.1:{port}/onSale'
+
+    await measure('асинхронный поиск без крайнего срока', api, server, None, in_thread=False)
+    await measure(f'асинхронный поиск, срок {SEARCH_TIMEOUT:.0f} с', api, server, Deadline(SEARCH_TIMEOUT),
+                  in_thread=False)
+    await measure(f'синхронный поиск в потоке, срок {SEARCH_TIMEOUT:.0f} с', api, server, Deadline(SEARCH_TIMEOUT),
+                  in_thread=True)
+
+    await close_sessions()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
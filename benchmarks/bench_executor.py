@@ -0,0 +1,99 @@
+"""Бенчмарк ограниченного исполнителя поисков: всплеск медленных поисков от многих чатов. Сравнивается задержка
+цикла событий (насколько бот успевает отвечать на остальные апдейты) и что происходит с поисками: без исполнителя
+синхронный поиск блокирует цикл, а асинхронные копятся без ограничения; с исполнителем лишние поиски сразу получают
+ответ "занят", а вторые поиски того же чата - "дождитесь результата"
+
+Запуск: python -m benchmarks.bench_executor"""
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from api import BoundedExecutor, ExecutorBusyError, InFlightLimitError
+
+
+SEARCHES: int = 600
+CHATS: int = 400
+SEARCH_TIME: float = 0.05  # Длительность одного поиска в секундах
+WORKERS: int = 8
+MAX_QUEUE: int = 100
+PROBE_INTERVAL: float = 0.01
+
+
+def slow_search() -> None:
+    """Синхронный поиск (как старые методы *_api на requests)"""
+    time.sleep(SEARCH_TIME)
+
+
+async def aslow_search() -> None:
+    """Асинхронный поиск"""
+    await asyncio.sleep(SEARCH_TIME)
+
+
+async def probe(stop: asyncio.Event, lags: list[float]) -> None:
+    """Задача измеряет, насколько позже запланированного просыпается цикл событий"""
+    while not stop.is_set():
+        planned: float = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - planned)
+
+
+async def burst(search: Callable[[int], Awaitable[None]]) -> dict[str, float]:
+    """Функция запускает всплеск поисков (chat_id по кругу) и возвращает итоги"""
+    lags: list[float] = list()
+    stop: asyncio.Event = asyncio.Event()
+    probe_task: asyncio.Task = asyncio.create_task(probe(stop, lags))
+    outcomes: dict[str, float] = {'ok': 0, 'busy': 0, 'in flight': 0}
+
+    async def one(number: int) -> None:
+        try:
+            await search(number % CHATS)
+            outcomes['ok'] += 1
+        except ExecutorBusyError:
+            outcomes['busy'] += 1
+        except InFlightLimitError:
+            outcomes['in flight'] += 1
+
+    started: float = time.perf_counter()
+    await asyncio.sleep(0)
+    await asyncio.gather(*[one(number) for number in range(SEARCHES)])
+    outcomes['time'] = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    lags.sort()
+    outcomes['lag p99'] = lags[int(len(lags) * 0.99)] if lags else 0.0
+    outcomes['lag max'] = lags[-1] if lags else 0.0
+    return outcomes
+
+
+def report(name: str, outcomes: dict[str, float]) -> None:
+    print(f'{name:42}: выполнено {outcomes["ok"]:4.0f}, занят {outcomes["busy"]:4.0f}, '
+          f'ждите {outcomes["in flight"]:4.0f}, за {outcomes["time"]:6.2f} с, '
+          f'задержка цикла p99 {outcomes["lag p99"] * 1000:7.1f} мс, max {outcomes["lag max"] * 1000:7.1f} мс')
+
+
+async def main() -> None:
+    async def direct_sync(chat_id: int) -> None:
+        slow_search()
+
+    async def direct_async(chat_id: int) -> None:
+        await aslow_search()
+
+    report('синхронный поиск прямо в хэндлере', await burst(direct_sync))
+    report('асинхронный поиск без ограничений', await burst(direct_async))
+
+    for name, in_thread in (('синхронный поиск через исполнитель', True),
+                            ('асинхронный поиск через исполнитель', False)):
+        executor: BoundedExecutor = BoundedExecutor(workers=WORKERS, max_queue=MAX_QUEUE)
+        if in_thread:
+            report(name, await burst(lambda chat_id: executor.run_in_thread(chat_id, slow_search)))
+        else:
+            report(name, await burst(lambda chat_id: executor.run(chat_id, aslow_search)))
+        executor.shutdown()
+        print(f'    ожидание в очереди p50 {executor.queue_wait.quantile(0.5) * 1000:.0f} мс, '
+              f'p99 {executor.queue_wait.quantile(0.99) * 1000:.0f} мс; '
+              f'выполнение p50 {executor.execution.quantile(0.5) * 1000:.0f} мс, '
+              f'p99 {executor.execution.quantile(0.99) * 1000:.0f} мс')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""Бенчмарк конкурентной записи истории запросов: как было раньше (одна общая сессия на все хэндлеры,
+настройки SQLite по умолчанию) против профиля WAL/NORMAL с сессией на каждую операцию и пулом соединений"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+from threading import Lock
+import time
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from config_data.config import Database
+from database.crud import CRUD
+from database.orm import Requests, get_session, init_engine, start_database
+
+
+THREADS: int = 8
+WRITES_PER_THREAD: int = 200
+DEFAULT_PROFILE: Database = Database(journal_mode='DELETE', synchronous='FULL', mmap_size=0,
+                                     cache_size=-2000, busy_timeout=5000)
+
+
+def legacy_writer() -> Callable[[int], None]:
+    """
+    Функция воспроизводит старую запись: одна сессия на всех (доступ к ней приходится сериализовать),
+    подсчет записей, поиск самой старой и ее удаление на каждую вставку
+    """
+    session: Session = get_session()
+    lock: Lock = Lock()
+
+    def write(user_id: int) -> None:
+        with lock:
+            if session.query(Requests).filter(Requests.user_id == user_id).count() >= 10:
+                min_id: int = session.query(func.min(Requests.id)).filter(Requests.user_id == user_id).scalar()
+                session.delete(session.query(Requests).filter(Requests.id == min_id).one())
+                session.commit()
+            session.add(Requests(user_id=user_id, command='low', product='red dead', number=5, result='x' * 500))
+            session.commit()
+    return write
+
+
+def run(title: str, profile: Database, make_writer: Callable[[], Callable[[int], None]]) -> None:
+    """
+    Функция запускает THREADS потоков, каждый из которых пишет WRITES_PER_THREAD запросов своего пользователя
+    """
+    path: str = os.path.join(tempfile.mkdtemp(), 'history.db')
+    init_engine(Database(**{**profile.__dict__, 'url': f'sqlite:///{path}'}))
+    start_database()
+    write: Callable[[int], None] = make_writer()
+    errors: list[Exception] = list()
+
+    def worker(user_id: int) -> None:
+        for _ in range(WRITES_PER_THREAD):
+            try:
+                write(user_id)
+            except Exception as exc:
+                errors.append(exc)
+
+    started: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(worker, range(THREADS)))
+    elapsed: float = time.perf_counter() - started
+    total: int = THREADS * WRITES_PER_THREAD
+    print(f'{title}: {total / elapsed:8.0f} записей/с, ошибок {len(errors)}')
+
+
+def main() -> None:
+    logger.remove()
+    crud: CRUD = CRUD()
+    run('было (общая сессия, настройки по умолчанию)', DEFAULT_PROFILE, legacy_writer)
+    run('стало (WAL/NORMAL, сессия на операцию)      ', Database(),
+        lambda: lambda user_id: crud.create(user_id, 'low', 'red dead', 5, None, 'x' * 500))
+
+
+if __name__ == '__main__':
+    main()
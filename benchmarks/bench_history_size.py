@@ -0,0 +1,109 @@
+"""Бенчмарк хранения результатов в истории: как было раньше (готовый текст ответа в колонке TEXT) против сжатого
+списка игр. Сравниваются размер файла бд и время чтения истории одного пользователя (с учетом сборки текста)"""
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import zlib
+
+from loguru import logger
+
+from api import EGSAPIModule, Game
+from config_data.config import API, Config, Database, TgBot
+from database.codec import decode_result, encode_result
+from database.crud import CRUD
+from database.orm import init_engine, start_database
+
+
+USERS: int = 1000
+ROWS_PER_USER: int = 10
+READS: int = 2000
+WORDS: list[str] = ['Red', 'Dead', 'Redemption', 'Star', 'Wars', 'Battlefront', 'Dark', 'Souls', 'Edition',
+                    'Deluxe', 'Ultimate', 'Far', 'Cry', 'Assassin\'s', 'Creed', 'Legends', 'of', 'the', 'Sky', 'II']
+
+
+def make_games(rnd: random.Random) -> list[Game]:
+    """Функция создает результат одного запроса: от 5 до 40 игр со случайными названиями и ценами"""
+    games: list[Game] = list()
+    for _ in range(rnd.randint(5, 40)):
+        title: str = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(2, 5)))
+        slug: str = '-'.join(title.lower().replace('\'', '').split())
+        games.append(Game(title=title, url=f'https://store.epicgames.com/ru/p/{slug}', price=rnd.randint(0, 9_999_99)))
+    return games
+
+
+def file_size(path: str) -> int:
+    """Функция возвращает размер файла бд после VACUUM (без свободных страниц и журнала)"""
+    connection: sqlite3.Connection = sqlite3.connect(path)
+    connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    connection.execute('VACUUM')
+    connection.close()
+    return os.path.getsize(path)
+
+
+def measure_reads(path: str, render) -> float:
+    """Функция возвращает среднее время чтения истории случайного пользователя с обработкой результатов (мс)"""
+    connection: sqlite3.Connection = sqlite3.connect(path)
+    rnd: random.Random = random.Random(1)
+    started: float = time.perf_counter()
+    for _ in range(READS):
+        rows: list = connection.execute('SELECT result FROM requests WHERE user_id = ? ORDER BY id',
+                                        (rnd.randrange(USERS),)).fetchall()
+        for row in rows:
+            render(row[0])
+    elapsed: float = time.perf_counter() - started
+    connection.close()
+    return elapsed / READS * 1000
+
+
+def main() -> None:
+    logger.remove()
+    api: EGSAPIModule = EGSAPIModule(config=Config(tg_bot=TgBot(token=''), api=API(rapidAPI_key='')))
+    rnd: random.Random = random.Random(0)
+    results: list[list[Game]] = [make_games(rnd) for _ in range(USERS * ROWS_PER_USER)]
+    directory: str = tempfile.mkdtemp()
+
+    # Было: в колонке TEXT лежит готовый текст ответа
+    legacy_path: str = os.path.join(directory, 'legacy.db')
+    connection: sqlite3.Connection = sqlite3.connect(legacy_path)
+    connection.execute('CREATE TABLE requests (id INTEGER PRIMARY KEY, user_id BIGINT, command TEXT, product TEXT, '
+                       'number INTEGER, cus_range TEXT, result TEXT)')
+    connection.execute('CREATE INDEX ix_requests_user_id_id ON requests (user_id, id)')
+    connection.executemany('INSERT INTO requests (user_id, command, product, number, result) VALUES (?, ?, ?, ?, ?)',
+                           [(i % USERS, 'low', 'red dead', len(games), api.render(games))
+                            for i, games in enumerate(results)])
+    connection.commit()
+    connection.close()
+
+    # Стало: сжатый список игр
+    path: str = os.path.join(directory, 'history.db')
+    init_engine(Database(url=f'sqlite:///{path}'))
+    start_database()
+    CRUD().create_many([dict(user_id=i % USERS, command='low', product='red dead', number=len(games),
+                             cus_range=None, result=games)
+                        for i, games in enumerate(results)],
+                       limit_requests=ROWS_PER_USER)
+
+    texts: list[bytes] = [api.render(games).encode('utf-8') for games in results]
+    raw_bytes: int = sum(map(len, texts))
+    no_dictionary_bytes: int = sum(len(zlib.compress(text, 9)) for text in texts)
+    packed_bytes: int = sum(len(encode_result(games)) for games in results)
+    print(f'результаты: текст {raw_bytes / 1024:9.0f} КБ, текст + zlib {no_dictionary_bytes / 1024:7.0f} КБ, '
+          f'игры + zlib со словарем {packed_bytes / 1024:7.0f} КБ')
+
+    legacy_size: int = file_size(legacy_path)
+    size: int = file_size(path)
+    print(f'размер бд: было {legacy_size / 1024:7.0f} КБ, стало {size / 1024:7.0f} КБ '
+          f'({legacy_size / size:.1f}x меньше)')
+
+    legacy_fetch: float = measure_reads(legacy_path, lambda value: None)
+    fetch: float = measure_reads(path, lambda value: None)
+    print(f'чтение истории пользователя из бд: было {legacy_fetch:.3f} мс, стало {fetch:.3f} мс')
+    legacy_latency: float = measure_reads(legacy_path, lambda value: value)
+    latency: float = measure_reads(path, lambda value: api.render(decode_result(value)))
+    print(f'/history целиком (чтение и сборка текста): было {legacy_latency:.3f} мс, стало {latency:.3f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Бенчмарк декоратора info_logger: накладные расходы на вызов декорированной функции (синхронной и async def)
+по сравнению с функцией без декоратора и со старым декоратором, при включенном и отключенном уровне
+
+Запуск: python -m benchmarks.bench_info_logger"""
+import asyncio
+import dataclasses
+import functools
+import os
+import tempfile
+import time
+from typing import Any, Callable
+
+from loguru import logger
+
+from config_data import LOGGING_PRESETS, Logging
+from my_logging import info_logger, setup_logging
+
+
+CALLS: int = 20000
+
+
+def old_info_logger(log_level: str, message: str) -> Callable:
+    """Старый декоратор: цепочка if/elif на каждый вызов, функция вызывается только на уровне DEBUG"""
+    def log_wrapper(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if log_level == 'INFO':
+                logger.info('{name} - {message}'.format(name=func.__name__, message=message))
+            elif log_level == 'DEBUG':
+                logger.debug('{name} - {message}'.format(name=func.__name__, message=message))
+                return func(*args, **kwargs)
+        return wrapper
+    return log_wrapper
+
+
+def search(number: int) -> int:
+    return number + 1
+
+
+async def asearch(number: int) -> int:
+    return number + 1
+
+
+def measure(name: str, func: Callable[[int], Any]) -> None:
+    started: float = time.perf_counter()
+    for number in range(CALLS):
+        func(number)
+    print(f'{name:42}: {(time.perf_counter() - started) / CALLS * 1e6:7.2f} мкс на вызов')
+
+
+async def ameasure(name: str, func: Callable[[int], Any]) -> None:
+    started: float = time.perf_counter()
+    for number in range(CALLS):
+        await func(number)
+    print(f'{name:42}: {(time.perf_counter() - started) / CALLS * 1e6:7.2f} мкс на вызов')
+
+
+def main() -> None:
+    directory: str = tempfile.mkdtemp()
+    development: Logging = dataclasses.replace(LOGGING_PRESETS['development'],
+                                               path=os.path.join(directory, 'development.log'))
+    production: Logging = dataclasses.replace(LOGGING_PRESETS['production'], enqueue=False,
+                                              path=os.path.join(directory, 'production.log'))
+
+    setup_logging(development)
+    measure('без декоратора', search)
+    measure('старый декоратор, DEBUG включен', old_info_logger('DEBUG', 'Поиск игр')(search))
+    measure('новый декоратор, DEBUG включен', info_logger('DEBUG', 'Поиск игр')(search))
+    asyncio.run(ameasure('новый декоратор, async def, DEBUG включен', info_logger('DEBUG', 'Поиск игр')(asearch)))
+
+    # Уровень проверяется при декорировании, поэтому функции декорируются после настройки логгирования
+    setup_logging(production)
+    measure('старый декоратор, DEBUG отключен', old_info_logger('DEBUG', 'Поиск игр')(search))
+    print(f'    старый декоратор с уровнем INFO вернул {old_info_logger("INFO", "Поиск игр")(search)(1)!r}, '
+          f'новый - {info_logger("INFO", "Поиск игр")(search)(1)!r}')
+    measure('новый декоратор, DEBUG отключен', info_logger('DEBUG', 'Поиск игр')(search))
+    asyncio.run(ameasure('без декоратора, async def', asearch))
+    asyncio.run(ameasure('новый декоратор, async def, DEBUG отключен', info_logger('DEBUG', 'Поиск игр')(asearch)))
+    logger.remove()
+
+
+if __name__ == '__main__':
+    main()
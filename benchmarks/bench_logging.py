@@ -0,0 +1,82 @@
+"""Бенчмарк стоимости логгирования одного поиска: вызовы логгера на пути поиска выполняются в цикле и измеряется
+время на поиск с точки зрения вызывающего кода (сколько логгирование добавляет к обработке апдейта). Сравниваются
+старый вариант (уровень DEBUG, f-строки, полный список игр в сообщении WARNING, запись в файл в вызывающем потоке)
+и пресеты development и production с ленивым форматированием
+
+Запуск: python -m benchmarks.bench_logging"""
+import dataclasses
+import os
+import tempfile
+import time
+from typing import Callable
+
+from loguru import logger
+
+from config_data import LOGGING_PRESETS, Logging
+from my_logging import payload, sampled, setup_logging
+
+
+SEARCHES: int = 2000
+GAMES: int = 300  # Размер ответа API
+
+
+def make_games() -> list[dict]:
+    """Функция создает ответ API: список игр в том виде, в каком его возвращает сервер"""
+    return [{'title': f'Game {number}', 'id': f'{number:032x}', 'namespace': f'{number:032x}',
+             'description': 'Описание игры ' * 10, 'seller': {'id': f'o-{number}', 'name': 'Publisher'},
+             'price': {'totalPrice': {'discountPrice': number * 100, 'originalPrice': number * 200,
+                                      'currencyCode': 'RUB'}}}
+            for number in range(GAMES)]
+
+
+def old_search(games: list[dict]) -> None:
+    """Вызовы логгера одного поиска в старом виде: сообщения форматируются всегда, ответ пишется целиком"""
+    logger.debug('{name} - {message}'.format(name='afind_games', message='Запускается метод'))
+    logger.success('Запрос успешно выполнен')
+    logger.debug(f'Кэш ответов: попаданий {10}, промахов {5}')
+    logger.warning(f'Метод __get_response пытается отфильтровать это\n{games}')
+    logger.debug(f'Кэш результатов: попаданий {10}, промахов {5} (поиск {0.123:.2f} мс)')
+    logger.debug(f'В историю записано {1} запросов за {1.5:.1f} мс, в очереди {0}')
+
+
+def new_search(games: list[dict]) -> None:
+    """Вызовы логгера одного поиска в новом виде: аргументы передаются отдельно, частые сообщения - через sampled"""
+    logger.debug('{} - {}', 'afind_games', 'Запускается метод')
+    sampled.success('Запрос успешно выполнен')
+    sampled.debug('Кэш ответов: попаданий {}, промахов {}', 10, 5)
+    logger.debug('Игры выбираются из индекса по {} играм', len(games))
+    sampled.debug('Кэш результатов: попаданий {}, промахов {} (поиск {:.2f} мс)', 10, 5, 0.123)
+    logger.debug('В историю записано {} запросов за {:.1f} мс, в очереди {}', 1, 1.5, 0)
+
+
+def measure(name: str, settings: Logging, search: Callable[[list[dict]], None]) -> None:
+    directory: str = tempfile.mkdtemp()
+    setup_logging(dataclasses.replace(settings, path=os.path.join(directory, 'application.log')))
+    games: list[dict] = make_games()
+    # Пример большого объекта в сообщении: его представление ограничено
+    logger.warning('Пропущен элемент ответа неизвестного формата: {}', payload(games))
+
+    started: float = time.perf_counter()
+    for _ in range(SEARCHES):
+        search(games)
+    elapsed: float = time.perf_counter() - started
+    logger.complete()
+    flushed: float = time.perf_counter() - started
+    logger.remove()
+
+    size: int = sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory))
+    print(f'{name:34}: {elapsed / SEARCHES * 1e6:8.1f} мкс на поиск в вызывающем потоке, '
+          f'{flushed / SEARCHES * 1e6:8.1f} мкс с записью на диск, лог {size / 1024:8.0f} КБ')
+
+
+def main() -> None:
+    development: Logging = LOGGING_PRESETS['development']
+    measure('старый вариант', development, old_search)
+    measure('development', development, new_search)
+    measure('production', LOGGING_PRESETS['production'], new_search)
+    measure('production без выборки', dataclasses.replace(LOGGING_PRESETS['production'], sample_rate=1.0),
+            new_search)
+
+
+if __name__ == '__main__':
+    main()
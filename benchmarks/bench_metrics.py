@@ -0,0 +1,140 @@
+"""Бенчмарк метрик: стоимость обновления метрик на горячем пути и вывода страницы /metrics, затем проверка под
+нагрузкой - бот запускается в режиме вебхука (как в bench_webhook), получает апдейты /help и /history, после чего
+страница /metrics сверяется с количеством отправленных апдейтов
+
+Запуск: python -m benchmarks.bench_metrics"""
+import asyncio
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.bench_webhook import ROOT, SECRET, TOKEN, FakeBotAPI, free_port, make_update, wait_workers
+from metrics import Counter, Family, Histogram, Registry
+
+
+OPERATIONS: int = 200_000
+UPDATES: int = 1000
+CONCURRENCY: int = 50
+
+
+def micro() -> None:
+    """Стоимость одного обновления метрик и вывода реестра размером с реестр бота"""
+    registry: Registry = Registry()
+    counter: Counter = registry.counter('bench_total', 'Счетчик')
+    family: Family[Histogram] = registry.histogram('bench_seconds', 'Гистограмма', labels=('command',))
+    histogram: Histogram = family.labels('/low')
+
+    for name, operation in (('Counter.inc', lambda: counter.inc()),
+                            ('Histogram.observe', lambda: histogram.observe(0.042)),
+                            ('Family.labels(...).observe', lambda: family.labels('/low').observe(0.042))):
+        started: float = time.perf_counter()
+        for _ in range(OPERATIONS):
+            operation()
+        print(f'{name:28}: {(time.perf_counter() - started) / OPERATIONS * 1e9:6.0f} нс')
+
+    # Примерно столько серий у бота: ~10 семейств гистограмм по нескольку меток и ~20 счетчиков
+    for number in range(10):
+        for label in ('/low', '/high', '/custom', '/history', 'FSMQuery:fill_number'):
+            family.labels(f'{label}-{number}').observe(0.1)
+    for number in range(20):
+        registry.counter(f'bench_{number}_total', 'Счетчик').inc()
+    started = time.perf_counter()
+    text: str = registry.render()
+    print(f'{"вывод реестра":28}: {(time.perf_counter() - started) * 1000:6.2f} мс, '
+          f'{len(text.splitlines())} строк, {len(text) / 1024:.0f} КБ')
+
+
+def sample(text: str, name: str, labels: str = '') -> float:
+    """Функция находит значение серии в выводе /metrics (0, если серии нет)"""
+    match = re.search(rf'^{re.escape(name)}{re.escape(labels)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+async def load() -> None:
+    """Нагрузка на бота в режиме вебхука (один процесс: у каждого процесса свои метрики) и сверка метрик
+    с отправленными апдейтами"""
+    api: FakeBotAPI = FakeBotAPI()
+    app: web.Application = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    api_port: int = free_port()
+    await web.TCPSite(runner, '127.0.0.1', api_port).start()
+
+    port: int = free_port()
+    directory: str = tempfile.mkdtemp()
+    env: dict[str, str] = {**os.environ,
+                           'PYTHONPATH': ROOT,
+                           'BOT_TOKEN': TOKEN,
+                           'X-RapidAPI-Key': 'bench',
+                           'BOT_API_SERVER': f'http://127.0.0.1:{api_port}',
+                           'WEBHOOK_ENABLED': 'true',
+                           'WEBHOOK_HOST': '127.0.0.1',
+                           'WEBHOOK_PORT': str(port),
+                           'WEBHOOK_SECRET': SECRET,
+                           'LOG_PRESET': 'production',
+                           'DB_URL': f'sqlite:///{directory}/history.db',
+                           'FSM_URL': f'{directory}/fsm.db'}
+    bot: subprocess.Popen = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=directory, env=env)
+
+    try:
+        await wait_workers(os.path.join(directory, 'logs', 'application.log'), 1)
+        async with aiohttp.ClientSession() as session:
+            queue: asyncio.Queue = asyncio.Queue()
+            for number in range(1, UPDATES + 1):
+                queue.put_nowait(number)
+
+            async def sender() -> None:
+                while not queue.empty():
+                    number: int = queue.get_nowait()
+                    update: dict = make_update(number)
+                    if number % 2:
+                        update['message']['text'] = '/history'
+                        update['message']['entities'][0]['length'] = 8
+                    async with session.post(f'http://127.0.0.1:{port}/webhook', json=update,
+                                            headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}) as response:
+                        assert response.status == 200
+
+            started: float = time.perf_counter()
+            await asyncio.gather(*[sender() for _ in range(CONCURRENCY)])
+            # Апдейты обрабатываются в фоне после ответа телеграму - подождем, пока метрики сойдутся
+            while True:
+                scrape_started: float = time.perf_counter()
+                async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                    text: str = await response.text()
+                scrape_time: float = time.perf_counter() - scrape_started
+                handled: float = (sample(text, 'bot_handler_duration_seconds_count', '{command="/help"}')
+                                  + sample(text, 'bot_handler_duration_seconds_count', '{command="/history"}'))
+                if handled >= UPDATES or time.perf_counter() - started > 60:
+                    break
+                await asyncio.sleep(0.5)
+
+        reads: float = sample(text, 'bot_db_operation_duration_seconds_count', '{operation="read_all"}')
+        read_time: float = sample(text, 'bot_db_operation_duration_seconds_sum', '{operation="read_all"}')
+        handler_time: float = sample(text, 'bot_handler_duration_seconds_sum', '{command="/history"}')
+        print(f'отправлено {UPDATES} апдейтов, по метрикам обработано {handled:.0f}, '
+              f'чтений истории {reads:.0f} (среднее {read_time / max(reads, 1) * 1000:.2f} мс), '
+              f'/history в среднем {handler_time / max(reads, 1) * 1000:.2f} мс; '
+              f'страница /metrics за {scrape_time * 1000:.1f} мс')
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        code: int = await asyncio.get_running_loop().run_in_executor(None, bot.wait, 60)
+        if code != 0:
+            print(f'бот завершился с кодом {code}')
+        await runner.cleanup()
+
+
+def main() -> None:
+    micro()
+    asyncio.run(load())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Бенчмарк отправки длинных ответов под нагрузкой, похожей на рассылку: многим чатам одновременно уходит по
+несколько сообщений. Вместо api.telegram.org - заглушка Bot API с контролем флуда, как у телеграма: больше
+GLOBAL_RATE сообщений в секунду на бота или CHAT_RATE в один чат - ответ 429 с retry_after. Сравнивается отправка
+частей прямо из хэндлеров (message.answer в цикле, без повторов и с повтором через retry_after) и через
+MessageSender: сколько сообщений дошло, сколько раз сработал контроль флуда, за сколько и в правильном ли порядке.
+Настоящий телеграм за повторяющийся флуд увеличивает retry_after, поэтому важно не только время, но и число 429
+
+Запуск: python -m benchmarks.bench_sender"""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+from loguru import logger
+
+from benchmarks.bench_webhook import TOKEN, free_port
+from service import MessageSender
+
+
+CHATS: int = 100
+PARTS: int = 5  # Сколько сообщений в одном ответе
+GLOBAL_RATE: float = 30  # Лимиты заглушки (как у телеграма): сообщений в секунду на бота
+GLOBAL_BURST: int = 30
+CHAT_RATE: float = 1  # и в один чат
+CHAT_BURST: int = 3
+
+
+class Limit:
+    """Лимит заглушки: token bucket, который не резервирует будущие токены, а отказывает"""
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate: float = rate
+        self.capacity: float = float(capacity)
+        self.tokens: float = float(capacity)
+        self.updated: float = time.monotonic()
+
+    def take(self) -> float:
+        """Метод забирает токен и возвращает 0 или, если токена нет, сколько секунд его ждать"""
+        now: float = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        return 0.0
+
+
+class FloodControlAPI:
+    """Заглушка Bot API: принимает sendMessage в пределах лимитов, остальным отвечает 429, и записывает сообщения"""
+    def __init__(self) -> None:
+        self.limit: Limit = Limit(GLOBAL_RATE, GLOBAL_BURST)
+        self.chats: dict[int, Limit] = dict()
+        self.messages: dict[int, list[str]] = dict()
+        self.rejected: int = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        chat_id: int = int(form['chat_id'])
+        chat: Limit = self.chats.setdefault(chat_id, Limit(CHAT_RATE, CHAT_BURST))
+        # Отказ по лимиту чата не расходует общий лимит
+        wait: float = chat.take() or self.limit.take()
+        if wait > 0:
+            self.rejected += 1
+            retry_after: int = math.ceil(wait)
+            return web.json_response({'ok': False, 'error_code': 429,
+                                      'description': f'Too Many Requests: retry after {retry_after}',
+                                      'parameters': {'retry_after': retry_after}}, status=429)
+        self.messages.setdefault(chat_id, list()).append(form['text'])
+        return web.json_response({'ok': True, 'result': {'message_id': 1, 'date': 0, 'text': form['text'],
+                                                         'chat': {'id': chat_id, 'type': 'private'}}})
+
+
+def answers() -> dict[int, list[str]]:
+    return {chat_id: [f'часть {part}' for part in range(PARTS)] for chat_id in range(1, CHATS + 1)}
+
+
+async def run(name: str, send: Callable[[Bot, int, list[str]], Awaitable[None]]) -> None:
+    api: FloodControlAPI = FloodControlAPI()
+    app: web.Application = web.Application()
+    app.router.add_post('/bot{token}/sendMessage', api.handle)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    port: int = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    bot: Bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(f'http://127.0.0.1:{port}')))
+
+    expected: dict[int, list[str]] = answers()
+    started: float = time.perf_counter()
+    await asyncio.gather(*[send(bot, chat_id, texts) for chat_id, texts in expected.items()])
+    elapsed: float = time.perf_counter() - started
+    await bot.session.close()
+    await runner.cleanup()
+
+    delivered: int = sum(len(texts) for texts in api.messages.values())
+    disordered: int = sum(api.messages.get(chat_id, list()) != texts[:len(api.messages.get(chat_id, list()))]
+                          for chat_id, texts in expected.items())
+    print(f'{name:36}: доставлено {delivered:4} из {CHATS * PARTS}, ответов 429 {api.rejected:5}, '
+          f'за {elapsed:5.1f} с ({delivered / elapsed:5.1f} сообщ./с), чатов с нарушенным порядком {disordered}')
+
+
+async def main() -> None:
+    logger.remove()
+    print(f'{CHATS} чатов по {PARTS} сообщений, лимиты: {GLOBAL_RATE:.0f} сообщ./с на бота, '
+          f'{CHAT_RATE:.0f} сообщ./с в чат (всплеск {CHAT_BURST}); минимальное время '
+          f'{max((CHATS * PARTS - GLOBAL_BURST) / GLOBAL_RATE, (PARTS - CHAT_BURST) / CHAT_RATE):.1f} с')
+
+    async def direct(bot: Bot, chat_id: int, texts: list[str]) -> None:
+        # Как раньше в хэндлерах: ошибка 429 прерывает отправку остальных частей ответа
+        try:
+            for text in texts:
+                await bot.send_message(chat_id=chat_id, text=text)
+        except TelegramRetryAfter:
+            pass
+
+    async def direct_retry(bot: Bot, chat_id: int, texts: list[str]) -> None:
+        # Каждый хэндлер сам ждет retry_after и повторяет отправку
+        for text in texts:
+            while True:
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                    break
+                except TelegramRetryAfter as exc:
+                    await asyncio.sleep(exc.retry_after)
+
+    await run('message.answer в цикле', direct)
+    await run('message.answer с повтором', direct_retry)
+
+    sender: MessageSender = MessageSender(rate=GLOBAL_RATE, burst=GLOBAL_BURST, chat_rate=CHAT_RATE,
+                                          chat_burst=CHAT_BURST)
+
+    async def queued(bot: Bot, chat_id: int, texts: list[str]) -> None:
+        await sender.send_many(bot, chat_id, texts)
+
+    await run('MessageSender', queued)
+    await sender.stop()
+    print(f'    повторов после 429: {sender.retried}, не отправлено: {sender.failed}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
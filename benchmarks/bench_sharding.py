@@ -0,0 +1,148 @@
+"""Нагрузочный тест long polling в нескольких процессах: бот запускается как обычно (main.py с BOT_WORKERS), вместо
+api.telegram.org - заглушка Bot API в этом же процессе. Заглушка отдает через getUpdates синтетические апдейты
+(в каждом чате по очереди /start и /help) и записывает ответы бота. Проверяется, что ответы в каждом чате пришли
+в порядке апдейтов, и считается пропускная способность
+
+Запуск: python -m benchmarks.bench_sharding [количество процессов ...]"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+from benchmarks.bench_webhook import ROOT, TOKEN, free_port
+from lexicon import LEXICON_RU
+
+
+CHATS: int = 500
+UPDATES_PER_CHAT: int = 6
+BATCH: int = 100  # Столько апдейтов телеграм отдает за один getUpdates
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: отдает апдейты через getUpdates (после open) и записывает ответы бота по чатам"""
+    def __init__(self, updates: list[dict]) -> None:
+        self.updates: list[dict] = updates
+        self.replies: dict[int, list[str]] = dict()
+        self.opened: asyncio.Event = asyncio.Event()
+        self.finished: asyncio.Event = asyncio.Event()
+        self.started: float = 0.0
+        self.received: int = 0
+
+    def open(self) -> None:
+        self.started = time.perf_counter()
+        self.opened.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method: str = request.match_info['method'].lower()
+        if method == 'getupdates':
+            # Супервизор отправляет параметры в JSON, а aiogram - формой
+            params = await request.json() if request.content_type == 'application/json' else await request.post()
+            offset: int = int(params.get('offset', 0))
+            timeout: int = int(params.get('timeout', 0))
+            if timeout and not self.opened.is_set():
+                await asyncio.wait([asyncio.create_task(self.opened.wait())], timeout=1)
+            batch: list[dict] = self.updates[max(offset - 1, 0):][:BATCH] if self.opened.is_set() else list()
+            if not batch and timeout:
+                await asyncio.sleep(1)  # Долгий опрос укорочен, чтобы заглушка быстро останавливалась
+            return web.json_response({'ok': True, 'result': batch})
+
+        if method == 'getme':
+            return web.json_response({'ok': True, 'result': {'id': 123456, 'is_bot': True, 'first_name': 'bench'}})
+
+        form = await request.post()
+        if method == 'sendmessage':
+            chat_id: int = int(form['chat_id'])
+            self.replies.setdefault(chat_id, list()).append(form['text'])
+            self.received += 1
+            if self.received == len(self.updates):
+                self.finished.set()
+            return web.json_response({'ok': True, 'result': {'message_id': 1, 'date': 0, 'text': 'ok',
+                                                             'chat': {'id': chat_id, 'type': 'private'}}})
+        return web.json_response({'ok': True, 'result': True})
+
+
+def make_updates() -> list[dict]:
+    """Функция создает апдейты: чаты чередуются, в каждом чате команды /start и /help идут по очереди"""
+    updates: list[dict] = list()
+    for step in range(UPDATES_PER_CHAT):
+        command: str = '/start' if step % 2 == 0 else '/help'
+        for chat_id in range(1, CHATS + 1):
+            number: int = len(updates) + 1
+            updates.append({'update_id': number,
+                            'message': {'message_id': number, 'date': int(time.time()), 'text': command,
+                                        'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+                                        'chat': {'id': chat_id, 'type': 'private'},
+                                        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'bench'}}})
+    return updates
+
+
+async def wait_workers(log_path: str, workers: int, timeout: float = 300) -> None:
+    """Функция ждет, пока все процессы-обработчики запустятся (каждый пишет об этом в лог)"""
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(log_path):
+            with open(log_path, encoding='utf-8') as log:
+                if log.read().count('Процесс-обработчик запущен') >= workers:
+                    return
+        await asyncio.sleep(0.5)
+    raise TimeoutError('Процессы бота не запустились')
+
+
+async def run(workers: int) -> float:
+    """Функция запускает бота с workers процессами, прогоняет через него апдейты и возвращает апдейтов в секунду"""
+    api: FakeBotAPI = FakeBotAPI(make_updates())
+    app: web.Application = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    api_port: int = free_port()
+    await web.TCPSite(runner, '127.0.0.1', api_port).start()
+
+    directory: str = tempfile.mkdtemp()
+    env: dict[str, str] = {**os.environ,
+                           'PYTHONPATH': ROOT,
+                           'BOT_TOKEN': TOKEN,
+                           'X-RapidAPI-Key': 'bench',
+                           'BOT_API_SERVER': f'http://127.0.0.1:{api_port}',
+                           'BOT_WORKERS': str(workers),
+                           'DB_URL': f'sqlite:///{directory}/history.db',
+                           'FSM_URL': f'{directory}/fsm.db'}
+    bot: subprocess.Popen = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=directory, env=env)
+
+    try:
+        # Один процесс работает в обычном режиме long polling, без супервизора
+        if workers > 1:
+            await wait_workers(os.path.join(directory, 'logs', 'application.log'), workers)
+        api.open()
+        await asyncio.wait_for(api.finished.wait(), timeout=300)
+        elapsed: float = time.perf_counter() - api.started
+
+        expected: list[str] = [LEXICON_RU['start'] if step % 2 == 0 else LEXICON_RU['help']
+                               for step in range(UPDATES_PER_CHAT)]
+        disordered: int = sum(replies != expected for replies in api.replies.values())
+        print(f'процессов {workers}: {len(api.updates) / elapsed:7.0f} апдейтов/с, '
+              f'чатов с нарушенным порядком ответов: {disordered} из {len(api.replies)}')
+        return len(api.updates) / elapsed
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        code: int = await asyncio.get_running_loop().run_in_executor(None, bot.wait, 120)
+        if code != 0:
+            print(f'бот завершился с кодом {code}')
+        await runner.cleanup()
+
+
+def main() -> None:
+    results: dict[int, float] = dict()
+    for workers in [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]:
+        results[workers] = asyncio.run(run(workers))
+    base: float = results[min(results)]
+    print('ускорение: ' + ', '.join(f'{workers} - {rate / base:.2f}x' for workers, rate in results.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Бенчмарк пиковой памяти при обработке большого ответа /onSale: разбор всего ответа целиком (json + индекс)
+против потокового разбора с отбором только запрошенных игр.
+
+Запуск: python -m benchmarks.bench_streaming [путь до записанного ответа /onSale]
+Если путь не передан, то генерируется синтетический ответ того же формата"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+from api.game import Game, iter_games, parse_games
+from api.price_index import PriceIndex
+from api.selection import PriceQuery, select_games
+from api.streaming import CHUNK_SIZE, JSONArrayParser
+
+
+GAMES: int = 50_000
+NUMBER: int = 10
+
+
+def write_fixture(path: str, size: int) -> None:
+    """
+    Функция записывает синтетический ответ /onSale с полями, которые есть в настоящем ответе
+    :param path: Путь до файла
+    :type path: str
+    :param size: Количество игр
+    :type size: int
+    :return: None
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for i in range(size):
+            if i:
+                file.write(',')
+            json.dump({'title': f'Игра номер {i}',
+                       'id': f'{i:032x}',
+                       'namespace': f'{i * 7:032x}',
+                       'description': 'Описание игры ' * 10,
+                       'keyImages': [{'type': kind, 'url': f'https://cdn1.epicgames.com/{i}/{kind}.jpg'}
+                                     for kind in ('OfferImageWide', 'OfferImageTall', 'Thumbnail')],
+                       'seller': {'id': f'o-{i % 500}', 'name': f'Издатель {i % 500}'},
+                       'url': f'https://store.epicgames.com/ru/p/game-{i}',
+                       'price': {'totalPrice': {'discountPrice': (i * 7919) % 500_000,
+                                                'originalPrice': (i * 7919) % 500_000 + 10_000,
+                                                'currencyCode': 'RUB'}}},
+                      file, ensure_ascii=False)
+        file.write(']')
+
+
+def read_chunks(path: str) -> Iterator[bytes]:
+    """Функция читает файл кусками, как тело HTTP-ответа"""
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def whole(path: str) -> list[Game]:
+    """Разбор ответа целиком, как в режиме с кэшем"""
+    with open(path, 'rb') as file:
+        games: list[Game] = parse_games(json.loads(file.read()))
+    return PriceIndex(games).select(PriceQuery(NUMBER))
+
+
+def streaming(path: str) -> list[Game]:
+    """Потоковый разбор, как в режиме API_STREAMING"""
+    parser: JSONArrayParser = JSONArrayParser()
+
+    def raw_items() -> Iterator:
+        for chunk in read_chunks(path):
+            yield from parser.feed(chunk)
+        yield from parser.close()
+
+    return select_games(iter_games(raw_items()), PriceQuery(NUMBER))
+
+
+def measure(func: Callable[[str], list[Game]], path: str) -> tuple[list[Game], float, float]:
+    """
+    Функция измеряет время и пиковую память функции
+    :return: Результат, время в секундах и пиковая память в мегабайтах
+    :rtype: tuple[list[Game], float, float]
+    """
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    result: list[Game] = func(path)
+    elapsed: float = time.perf_counter() - started
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        path: str = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'on_sale.json')
+        write_fixture(path, GAMES)
+    print(f'Ответ: {path}, {os.path.getsize(path) / 1024 / 1024:.1f} МБ, отбираются {NUMBER} самых дешевых игр')
+
+    expected, elapsed, peak = measure(whole, path)
+    print(f'целиком:  {elapsed:6.2f} с, пик памяти {peak:8.1f} МБ')
+    result, elapsed, peak = measure(streaming, path)
+    print(f'потоково: {elapsed:6.2f} с, пик памяти {peak:8.1f} МБ')
+    assert result == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Бенчмарк отбора игр: полная сортировка со срезом (как было раньше) против потокового отбора через кучу
+на синтетических списках из 10 000 и 100 000 игр"""
+import random
+import timeit
+from typing import Callable, Optional
+
+from api.selection import top_n
+
+
+REPEAT: int = 5
+
+
+def make_games(size: int) -> list[dict]:
+    """
+    Функция генерирует список игр в формате ответа /onSale
+    :param size: Количество игр
+    :type size: int
+    :return: Список игр
+    :rtype: list[dict]
+    """
+    rnd: random.Random = random.Random(size)
+    return [{'title': f'Game {i}',
+             'url': f'https://store.epicgames.com/ru/p/game-{i}',
+             'price': {'totalPrice': {'discountPrice': rnd.randrange(0, 500_000, 100)}}}
+            for i in range(size)]
+
+
+def price(game: dict) -> int:
+    return game['price']['totalPrice']['discountPrice']
+
+
+def sort_and_slice(games: list[dict], number: int,
+                   predicate: Optional[Callable[[dict], bool]] = None) -> list[dict]:
+    """Старый путь: отфильтрованная копия, полная сортировка и срез"""
+    if predicate is not None:
+        games = [game for game in games if predicate(game)]
+    return sorted(games, key=price)[:number]
+
+
+def main() -> None:
+    in_range: Callable[[dict], bool] = lambda game: 500 <= price(game) / 100 <= 2000
+    for size in (10_000, 100_000):
+        games: list[dict] = make_games(size)
+        for number in (5, 40, 100):
+            assert sort_and_slice(games, number) == top_n(games, number, key=price)
+            old: float = min(timeit.repeat(lambda: sort_and_slice(games, number), number=1, repeat=REPEAT))
+            new: float = min(timeit.repeat(lambda: top_n(games, number, key=price), number=1, repeat=REPEAT))
+            old_custom: float = min(timeit.repeat(lambda: sort_and_slice(games, number, in_range),
+                                                  number=1, repeat=REPEAT))
+            new_custom: float = min(timeit.repeat(lambda: top_n(games, number, key=price, predicate=in_range),
+                                                  number=1, repeat=REPEAT))
+            print(f'{size:>7} игр, number={number:<3} | /low: сортировка {old * 1e3:7.2f} мс, '
+                  f'куча {new * 1e3:7.2f} мс | /custom: сортировка {old_custom * 1e3:7.2f} мс, '
+                  f'куча {new_custom * 1e3:7.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
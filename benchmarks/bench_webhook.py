@@ -0,0 +1,145 @@
+"""Нагрузочный тест режима вебхука: бот запускается как обычно (main.py с WEBHOOK_ENABLED) с несколькими
+процессами, вместо api.telegram.org - заглушка Bot API в этом же процессе. На вебхук отправляются синтетические
+апдейты /help, задержка апдейта - время от отправки апдейта до получения заглушкой ответа бота (sendMessage)
+
+Запуск: python -m benchmarks.bench_webhook [количество процессов ...]"""
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPDATES: int = 3000
+CONCURRENCY: int = 100
+SECRET: str = 'bench-secret'
+TOKEN: str = '123456:bench'
+
+
+def free_port() -> int:
+    """Функция возвращает свободный порт"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: на sendMessage запоминает момент ответа бота в чат, на остальные методы отвечает true"""
+    def __init__(self) -> None:
+        self.replies: dict[int, asyncio.Future] = dict()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if request.match_info['method'].lower() == 'sendmessage':
+            chat_id: int = int(form['chat_id'])
+            future: Optional[asyncio.Future] = self.replies.get(chat_id)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+            return web.json_response({'ok': True, 'result': {'message_id': 1, 'date': 0, 'text': 'ok',
+                                                             'chat': {'id': chat_id, 'type': 'private'}}})
+        return web.json_response({'ok': True, 'result': True})
+
+
+def make_update(number: int) -> dict:
+    """Функция создает апдейт с командой /help от отдельного пользователя"""
+    return {'update_id': number,
+            'message': {'message_id': number, 'date': int(time.time()), 'text': '/help',
+                        'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}],
+                        'chat': {'id': number, 'type': 'private'},
+                        'from': {'id': number, 'is_bot': False, 'first_name': 'bench'}}}
+
+
+async def wait_workers(log_path: str, workers: int, timeout: float = 300) -> None:
+    """Функция ждет, пока все процессы бота начнут слушать порт (каждый пишет об этом в лог)"""
+    deadline: float = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(log_path):
+            with open(log_path, encoding='utf-8') as log:
+                if log.read().count('Вебхук слушает') >= workers:
+                    return
+        await asyncio.sleep(0.5)
+    raise TimeoutError('Процессы бота не запустились')
+
+
+async def run(workers: int) -> None:
+    """Функция запускает бота с workers процессами и прогоняет через него UPDATES апдейтов"""
+    api: FakeBotAPI = FakeBotAPI()
+    app: web.Application = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    api_port: int = free_port()
+    await web.TCPSite(runner, '127.0.0.1', api_port).start()
+
+    port: int = free_port()
+    directory: str = tempfile.mkdtemp()
+    env: dict[str, str] = {**os.environ,
+                           'PYTHONPATH': ROOT,
+                           'BOT_TOKEN': TOKEN,
+                           'X-RapidAPI-Key': 'bench',
+                           'BOT_API_SERVER': f'http://127.0.0.1:{api_port}',
+                           'WEBHOOK_ENABLED': 'true',
+                           'WEBHOOK_HOST': '127.0.0.1',
+                           'WEBHOOK_PORT': str(port),
+                           'WEBHOOK_SECRET': SECRET,
+                           'WEBHOOK_WORKERS': str(workers),
+                           'DB_URL': f'sqlite:///{directory}/history.db',
+                           'FSM_URL': f'{directory}/fsm.db'}
+    bot: subprocess.Popen = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=directory, env=env)
+    url: str = f'http://127.0.0.1:{port}/webhook'
+
+    try:
+        await wait_workers(os.path.join(directory, 'logs', 'application.log'), workers)
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=make_update(0)) as response:
+                assert response.status == 401, 'Апдейт без секретного токена должен отклоняться'
+
+            latencies: list[float] = list()
+            queue: asyncio.Queue = asyncio.Queue()
+            for number in range(1, UPDATES + 1):
+                queue.put_nowait(number)
+
+            async def sender() -> None:
+                loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+                while not queue.empty():
+                    number: int = queue.get_nowait()
+                    reply: asyncio.Future = loop.create_future()
+                    api.replies[number] = reply
+                    sent: float = time.perf_counter()
+                    async with session.post(url, json=make_update(number),
+                                            headers={'X-Telegram-Bot-Api-Secret-Token': SECRET}) as response:
+                        assert response.status == 200
+                    latencies.append(await asyncio.wait_for(reply, timeout=30) - sent)
+
+            started: float = time.perf_counter()
+            await asyncio.gather(*[sender() for _ in range(CONCURRENCY)])
+            elapsed: float = time.perf_counter() - started
+
+        latencies.sort()
+        print(f'процессов {workers}: {UPDATES / elapsed:7.0f} апдейтов/с, '
+              f'p50 {latencies[len(latencies) // 2] * 1000:6.1f} мс, '
+              f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f} мс')
+    finally:
+        # Штатная остановка: процессы дорабатывают принятые апдейты и закрывают хранилища
+        bot.send_signal(signal.SIGTERM)
+        code: int = await asyncio.get_running_loop().run_in_executor(None, bot.wait, 60)
+        if code != 0:
+            print(f'бот завершился с кодом {code}')
+        await runner.cleanup()
+
+
+def main() -> None:
+    for workers in [int(arg) for arg in sys.argv[1:]] or [1, 4]:
+        asyncio.run(run(workers))
+
+
+if __name__ == '__main__':
+    main()
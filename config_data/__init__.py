@@ -1,4 +1,5 @@
 """
 Пакет для хранения файлов с конфигурационными данными
 """
-from .config import Config, load_config, LOG_LEVEL
+from .config import (Config, TgBot, API, Database, FSM, Webhook, Logging, Metrics, Sender, load_config,
+                     get_config, reload_config, add_reload_listener, reload_on_sighup, LOG_LEVEL, LOGGING_PRESETS)
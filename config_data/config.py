@@ -1,32 +1,138 @@
+import asyncio
 from dataclasses import dataclass
 from environs import Env
-from typing import Optional
+from threading import Lock
+from typing import Callable, Optional
+import signal
 
+from loguru import logger
 
-@dataclass
+
+@dataclass(frozen=True)
 class TgBot:
     """Класс для хранения токена бота"""
     token: str  # Токен для доступа к телеграм-боту
+    api_server: str = ''  # Адрес сервера Bot API (пусто - https://api.telegram.org)
+    workers: int = 1  # Количество процессов, между которыми апдейты long polling распределяются по chat_id
 
 
-@dataclass
+@dataclass(frozen=True)
 class API:
+    """Класс для хранения настроек работы со сторонним API"""
     rapidAPI_key: str
+    rate_limit: float = 5  # Количество запросов в секунду, разрешенное тарифом rapidAPI
+    rate_burst: int = 5  # Максимальный всплеск запросов
+    max_attempts: int = 4  # Максимальное количество попыток одного запроса
+    deadline: float = 30  # Общее время на все попытки одного запроса в секундах
+    cache_ttl: float = 300  # Время жизни ответа в кэше в секундах (0 - не кэшировать)
+    cache_max_entries: int = 256  # Максимальное количество ключевых слов в кэше
+    cache_max_bytes: int = 64 * 1024 * 1024  # Максимальный объем кэша в байтах
+    streaming: bool = False  # Разбирать ответы потоково, без кэша (память ограничена количеством запрошенных игр)
+    workers: int = 8  # Сколько поисков выполняется одновременно
+    max_queue: int = 100  # Сколько поисков может ждать своей очереди (остальным бот отвечает, что занят)
+    per_chat: int = 1  # Сколько поисков одного чата может выполняться одновременно
+    search_timeout: float = 25  # Сколько секунд пользователь ждет результата поиска, дальше поиск отменяется
+    lookup_timeout: float = 2  # Часть search_timeout на поиск готового результата в истории
+    queue_timeout: float = 10  # Часть search_timeout на ожидание своей очереди
+
+
+@dataclass(frozen=True)
+class Database:
+    """Класс для хранения настроек базы данных с историей запросов"""
+    url: str = 'sqlite:///request_history.db'
+    backend: str = 'async'  # Реализация хранилища истории: async (asyncio-драйвер), sync (поток с сессиями) или memory
+    journal_mode: str = 'WAL'  # WAL позволяет читать историю, пока идет запись
+    synchronous: str = 'NORMAL'  # В режиме WAL NORMAL не теряет целостность, но не ждет fsync на каждый коммит
+    mmap_size: int = 256 * 1024 * 1024  # Объем файла бд, который читается через отображение в память
+    cache_size: int = -64 * 1024  # Размер кэша страниц (отрицательное значение - в килобайтах)
+    busy_timeout: int = 5000  # Сколько миллисекунд ждать блокировку вместо ошибки "database is locked"
+    pool_size: int = 5  # Количество соединений в пуле
+    result_max_age: float = 300  # Сколько секунд результат из истории отдается на повторный запрос (0 - никогда)
+
+
+@dataclass(frozen=True)
+class FSM:
+    """Класс для хранения настроек хранилища состояний диалогов"""
+    backend: str = 'sqlite'  # sqlite (файл, общий для процессов одной машины), redis или memory (без сохранения)
+    url: str = 'fsm_states.db'  # Путь к файлу SQLite или адрес redis://...
+    ttl: int = 24 * 60 * 60  # Через сколько секунд без действий брошенный диалог удаляется (0 - не удалять)
+
+
+@dataclass(frozen=True)
+class Webhook:
+    """Класс для хранения настроек получения апдейтов через вебхук (вместо long polling)"""
+    enabled: bool = False
+    host: str = '0.0.0.0'  # Адрес, на котором слушает сервер
+    port: int = 8080
+    path: str = '/webhook'
+    url: str = ''  # Внешний адрес сервера (https://...), на который телеграм отправляет апдейты (к нему добавится path)
+    secret: str = ''  # Секретный токен: запросы без заголовка X-Telegram-Bot-Api-Secret-Token с ним отклоняются
+    workers: int = 1  # Количество процессов, принимающих апдейты на одном порту
+
+
+@dataclass(frozen=True)
+class Logging:
+    """Класс для хранения настроек логгирования (значения по умолчанию задает пресет, см. LOGGING_PRESETS)"""
+    preset: str = 'development'
+    level: str = 'DEBUG'
+    path: str = 'logs/application.log'
+    enqueue: bool = False  # Писать в файл из фонового потока (вызов логгера не ждет диска)
+    diagnose: bool = True  # Показывать значения переменных в трейсбеках (медленно и может раскрыть данные)
+    payload_limit: int = 1000  # Максимальная длина представления больших объектов в сообщениях (см. my_logging.payload)
+    sample_rate: float = 1.0  # Доля записываемых частых сообщений (см. my_logging.sampled)
+
 
+@dataclass(frozen=True)
+class Metrics:
+    """Класс для хранения настроек метрик"""
+    enabled: bool = True
+    path: str = '/metrics'  # Страница с метриками на сервере вебхука
+    file: str = 'logs/metrics-{process}.prom'  # Файл с метриками в режиме long polling ({process} - имя процесса)
+    interval: float = 15  # Как часто (в секундах) записывать метрики в файл
 
-@dataclass
+
+@dataclass(frozen=True)
+class Sender:
+    """Класс для хранения настроек отправки сообщений бота (лимиты телеграма на весь бот, делятся между процессами)"""
+    rate: float = 30  # Сообщений в секунду во все чаты
+    burst: int = 30  # Максимальный всплеск сообщений во все чаты
+    chat_rate: float = 1  # Сообщений в секунду в один чат
+    chat_burst: int = 3  # Сколько сообщений подряд можно отправить в один чат без паузы
+    max_attempts: int = 4  # Сколько раз отправлять сообщение, если телеграм ответил 429
+
+
+@dataclass(frozen=True)
 class Config:
     """Класс - конфиг"""
     tg_bot: TgBot
     api: API
+    database: Database = Database()
+    fsm: FSM = FSM()
+    webhook: Webhook = Webhook()
+    logging: Logging = Logging()
+    metrics: Metrics = Metrics()
+    sender: Sender = Sender()
 
 
 LOG_LEVEL: str = 'DEBUG'
+# Пресеты логгирования: для разработки - все сообщения сразу в файл, для работы бота - фоновая запись,
+# только INFO и выше, короткие представления объектов и 1% частых сообщений
+LOGGING_PRESETS: dict[str, Logging] = {
+    'development': Logging(),
+    'production': Logging(preset='production', level='INFO', enqueue=True, diagnose=False, payload_limit=200,
+                          sample_rate=0.01)
+}
+
+__config: Optional[Config] = None
+__config_path: Optional[str] = None
+__config_lock: Lock = Lock()
+__reload_listeners: list[Callable[[Config], None]] = list()
 
 
 def load_config(path: Optional[str] = None) -> Config:
     """
-    Функция для загрузки данных из переменных окружения
+    Функция для загрузки данных из переменных окружения. Каждый вызов заново читает .env,
+    поэтому в рабочем коде нужно использовать get_config
     :param path: Путь до .env файла
     :type path: Optional[str]
     :return: объект Config с данными из окружения
@@ -35,5 +141,128 @@ def load_config(path: Optional[str] = None) -> Config:
     env: Env = Env()
     env.read_env(path)
 
-    return Config(tg_bot=TgBot(token=env('BOT_TOKEN')),
-                  api=API(rapidAPI_key=env('X-RapidAPI-Key')))
+    return Config(tg_bot=TgBot(token=env('BOT_TOKEN'),
+                               api_server=env('BOT_API_SERVER', ''),
+                               workers=env.int('BOT_WORKERS', 1)),
+                  api=API(rapidAPI_key=env('X-RapidAPI-Key'),
+                          rate_limit=env.float('API_RATE_LIMIT', 5),
+                          rate_burst=env.int('API_RATE_BURST', 5),
+                          max_attempts=env.int('API_MAX_ATTEMPTS', 4),
+                          deadline=env.float('API_DEADLINE', 30),
+                          cache_ttl=env.float('API_CACHE_TTL', 300),
+                          cache_max_entries=env.int('API_CACHE_MAX_ENTRIES', 256),
+                          cache_max_bytes=env.int('API_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                          streaming=env.bool('API_STREAMING', False),
+                          workers=env.int('API_WORKERS', 8),
+                          max_queue=env.int('API_MAX_QUEUE', 100),
+                          per_chat=env.int('API_PER_CHAT', 1),
+                          search_timeout=env.float('API_SEARCH_TIMEOUT', 25),
+                          lookup_timeout=env.float('API_LOOKUP_TIMEOUT', 2),
+                          queue_timeout=env.float('API_QUEUE_TIMEOUT', 10)),
+                  database=Database(url=env('DB_URL', 'sqlite:///request_history.db'),
+                                    backend=env('DB_BACKEND', 'async'),
+                                    journal_mode=env('DB_JOURNAL_MODE', 'WAL'),
+                                    synchronous=env('DB_SYNCHRONOUS', 'NORMAL'),
+                                    mmap_size=env.int('DB_MMAP_SIZE', 256 * 1024 * 1024),
+                                    cache_size=env.int('DB_CACHE_SIZE', -64 * 1024),
+                                    busy_timeout=env.int('DB_BUSY_TIMEOUT', 5000),
+                                    pool_size=env.int('DB_POOL_SIZE', 5),
+                                    result_max_age=env.float('DB_RESULT_MAX_AGE', 300)),
+                  fsm=FSM(backend=env('FSM_BACKEND', 'sqlite'),
+                          url=env('FSM_URL', 'fsm_states.db'),
+                          ttl=env.int('FSM_TTL', 24 * 60 * 60)),
+                  webhook=Webhook(enabled=env.bool('WEBHOOK_ENABLED', False),
+                                  host=env('WEBHOOK_HOST', '0.0.0.0'),
+                                  port=env.int('WEBHOOK_PORT', 8080),
+                                  path=env('WEBHOOK_PATH', '/webhook'),
+                                  url=env('WEBHOOK_URL', ''),
+                                  secret=env('WEBHOOK_SECRET', ''),
+                                  workers=env.int('WEBHOOK_WORKERS', 1)),
+                  logging=load_logging(env),
+                  metrics=Metrics(enabled=env.bool('METRICS_ENABLED', True),
+                                  path=env('METRICS_PATH', '/metrics'),
+                                  file=env('METRICS_FILE', 'logs/metrics-{process}.prom'),
+                                  interval=env.float('METRICS_INTERVAL', 15)),
+                  sender=Sender(rate=env.float('SENDER_RATE', 30),
+                                burst=env.int('SENDER_BURST', 30),
+                                chat_rate=env.float('SENDER_CHAT_RATE', 1),
+                                chat_burst=env.int('SENDER_CHAT_BURST', 3),
+                                max_attempts=env.int('SENDER_MAX_ATTEMPTS', 4)))
+
+
+def load_logging(env: Env) -> Logging:
+    """
+    Функция собирает настройки логгирования: берет пресет LOG_PRESET и заменяет в нем заданные в окружении значения
+    :param env: Окружение
+    :type env: Env
+    :return: Настройки логгирования
+    :rtype: Logging
+    """
+    preset: Logging = LOGGING_PRESETS[env('LOG_PRESET', 'development')]
+    return Logging(preset=preset.preset,
+                   level=env('LOG_LEVEL', preset.level),
+                   path=env('LOG_PATH', preset.path),
+                   enqueue=env.bool('LOG_ENQUEUE', preset.enqueue),
+                   diagnose=env.bool('LOG_DIAGNOSE', preset.diagnose),
+                   payload_limit=env.int('LOG_PAYLOAD_LIMIT', preset.payload_limit),
+                   sample_rate=env.float('LOG_SAMPLE_RATE', preset.sample_rate))
+
+
+def get_config(path: Optional[str] = None) -> Config:
+    """
+    Функция возвращает общий для процесса неизменяемый конфиг. Конфиг загружается при первом обращении,
+    дальше возвращается уже загруженный объект
+    :param path: Путь до .env файла (учитывается только при первой загрузке)
+    :type path: Optional[str]
+    :return: объект Config
+    :rtype: Config
+    """
+    global __config, __config_path
+
+    if __config is None:
+        with __config_lock:
+            if __config is None:
+                __config_path = path
+                __config = load_config(path)
+    return __config
+
+
+def reload_config() -> Config:
+    """
+    Функция заново загружает конфиг и оповещает подписчиков (например, модули api, которые заранее собрали заголовки)
+    :return: Новый объект Config
+    :rtype: Config
+    """
+    global __config
+
+    with __config_lock:
+        __config = load_config(__config_path)
+        listeners: list[Callable[[Config], None]] = list(__reload_listeners)
+
+    for listener in listeners:
+        listener(__config)
+    logger.info('Конфиг перезагружен')
+    return __config
+
+
+def add_reload_listener(listener: Callable[[Config], None]) -> None:
+    """
+    Функция подписывает listener на перезагрузку конфига (повторная подписка того же listener ничего не меняет)
+    :param listener: Функция, принимающая новый конфиг
+    :type listener: Callable[[Config], None]
+    :return: None
+    """
+    with __config_lock:
+        if listener not in __reload_listeners:
+            __reload_listeners.append(listener)
+
+
+def reload_on_sighup() -> None:
+    """
+    Функция включает перезагрузку конфига по сигналу SIGHUP (на платформах, где он есть). Вызывается в работающем
+    цикле событий: конфиг перезагружается в цикле, а не в самом обработчике сигнала, иначе сигнал, пришедший, пока
+    поток держит блокировку конфига, привел бы к взаимоблокировке
+    :return: None
+    """
+    if hasattr(signal, 'SIGHUP'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_config)
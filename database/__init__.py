@@ -1,3 +1,7 @@
 """Пакет для работы с базой данных"""
-from database.orm import start_database
+from database.orm import start_database, init_engine, session_scope
 from database.crud import CRUD
+from database.storage import (HistoryStorage, AsyncSQLStorage, SyncSQLStorage, MemoryHistoryStorage,
+                              create_storage)
+from database.writer import HistoryWriter
+from database.result_cache import ResultCache, CachedResult
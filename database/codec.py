@@ -0,0 +1,85 @@
+"""Модуль со сжатым хранением результатов запросов. Вместо отформатированного текста ответа в бд хранится
+список игр, сжатый zlib с общим словарем (словарь содержит то, что повторяется от записи к записи: разметку списка
+и начало ссылок на магазин), а текст собирается только при выводе"""
+import json
+import zlib
+from typing import Optional
+
+from api.game import Game
+
+
+# Общий словарь сжатия. Самые частые подстроки должны стоять в конце словаря.
+# Словарь нельзя менять: уже записанные результаты распаковываются только тем же словарем.
+# Если формат понадобится изменить, то нужно завести новый тег и оставить старый словарь для чтения
+RESULT_DICTIONARY: bytes = (
+    'По вашему ключевому слову игры не найдены( руб\nurl: https://store.epicgames.com/ru/bundles/'
+    ' Edition Deluxe Edition Ultimate Edition Complete Edition '
+    '[["","https://store.epicgames.com/ru/p/",99],["","https://store.epicgames.com/ru/p/",9900],["'
+).encode('utf-8')
+
+# Первый байт упакованного значения - его формат (текст, записанный в бд до сжатия, ни с одного из них не начинается)
+TAG_TEXT: bytes = b'\x01'  # Сжатый текст
+TAG_GAMES: bytes = b'\x02'  # Сжатый список игр
+
+COMPRESSION_LEVEL: int = 9
+
+
+def _compress(data: bytes) -> bytes:
+    """
+    Функция сжимает данные с общим словарем
+    :param data: Данные
+    :type data: bytes
+    :return: Сжатые данные
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level=COMPRESSION_LEVEL, zdict=RESULT_DICTIONARY)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data: bytes) -> bytes:
+    """
+    Функция распаковывает данные, сжатые с общим словарем
+    :param data: Сжатые данные
+    :type data: bytes
+    :return: Данные
+    :rtype: bytes
+    """
+    decompressor = zlib.decompressobj(zdict=RESULT_DICTIONARY)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def encode_result(result: Optional[list[Game] | str]) -> Optional[bytes]:
+    """
+    Функция упаковывает результат запроса для записи в бд
+    :param result: Список игр, текст ответа или None (игр не найдено)
+    :type result: Optional[list[Game] | str]
+    :return: Упакованный результат
+    :rtype: Optional[bytes]
+    """
+    if result is None:
+        return None
+    if isinstance(result, str):
+        return TAG_TEXT + _compress(result.encode('utf-8'))
+
+    rows: list[list] = [[game.title, game.url, game.price] for game in result]
+    return TAG_GAMES + _compress(json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_result(value: Optional[bytes | str]) -> Optional[list[Game] | str]:
+    """
+    Функция распаковывает результат запроса, прочитанный из бд
+    :param value: Упакованный результат (или текст, записанный до появления сжатия)
+    :type value: Optional[bytes | str]
+    :return: Список игр, текст ответа или None
+    :rtype: Optional[list[Game] | str]
+    """
+    if value is None or isinstance(value, str):
+        return value
+
+    value = bytes(value)
+    if value.startswith(TAG_GAMES):
+        return [Game(title, url, price) for title, url, price in json.loads(_decompress(value[1:]))]
+    if value.startswith(TAG_TEXT):
+        return _decompress(value[1:]).decode('utf-8')
+    # Текст, который был записан до сжатия и перенесен в двоичную колонку
+    return value.decode('utf-8')
@@ -1,39 +1,103 @@
 """Модуль с CRUD операциями над бд"""
-from sqlalchemy.sql import func
-from sqlalchemy.orm import Session
+from datetime import timedelta
 from typing import Optional, Literal
+import sqlalchemy as db
+from sqlalchemy.sql import Delete, Select
 from my_logging import info_logger
 
-from database.orm import get_session, Requests
+from database.orm import session_scope, utc_now, Requests
+
+
+def history_statement(user_id: int) -> Select:
+    """
+    Функция собирает запрос истории пользователя (от старых к новым). Благодаря индексу (user_id, id)
+    это просмотр диапазона индекса, а не всей таблицы
+    :param user_id: id пользователя
+    :type user_id: int
+    :return: Запрос
+    :rtype: Select
+    """
+    return db.select(Requests.command,
+                     Requests.product,
+                     Requests.number,
+                     Requests.cus_range,
+                     Requests.result).where(Requests.user_id == user_id).order_by(Requests.id)
+
+
+def result_statement(command: str, product: str, number: int, cus_range: Optional[str] = None,
+                     max_age: Optional[float] = None) -> Select:
+    """
+    Функция собирает запрос сохраненных результатов команды (от новых к старым). Отбор и сортировка идут
+    по индексу (command, product, number, cus_range, created_at)
+    :param command: Команда
+    :type command: str
+    :param product: Продукт
+    :type product: str
+    :param number: Количество продукта
+    :type number: int
+    :param cus_range: Пользовательский диапазон
+    :type cus_range: Optional[str]
+    :param max_age: Максимальный возраст результата в секундах (None - любой)
+    :type max_age: Optional[float]
+    :return: Запрос
+    :rtype: Select
+    """
+    statement: Select = db.select(Requests.result, Requests.created_at).where(
+        Requests.command == command,
+        Requests.product == product,
+        Requests.number == number,
+        Requests.cus_range == cus_range
+    ).order_by(Requests.created_at.desc())
+    if max_age is not None:
+        statement = statement.where(Requests.created_at >= utc_now() - timedelta(seconds=max_age))
+    return statement
+
+
+def trim_statement(user_id: int, limit_requests: int) -> Delete:
+    """
+    Функция собирает запрос, который оставляет у пользователя только limit_requests самых новых записей
+    (у них наибольшие первичные ключи). Оба подзапроса идут по индексу (user_id, id)
+    :param user_id: id пользователя
+    :type user_id: int
+    :param limit_requests: Сколько записей оставить
+    :type limit_requests: int
+    :return: Запрос
+    :rtype: Delete
+    """
+    newest_ids: Select = db.select(Requests.id).where(
+        Requests.user_id == user_id
+    ).order_by(Requests.id.desc()).limit(limit_requests)
+    return db.delete(Requests).where(
+        Requests.user_id == user_id,
+        Requests.id.not_in(newest_ids.scalar_subquery())
+    ).execution_options(synchronize_session=False)
 
 
 class CRUD:
     """
-    Класс для исполнения RUD операций над базой данных
+    Класс для исполнения RUD операций над базой данных. Каждая операция берет свою сессию из пула
+    (см. session_scope), поэтому один объект можно использовать из нескольких хэндлеров и потоков
     """
-    def __init__(self):
-        self.__session: Session = get_session()  # Объект сессии
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
-    def read_all(self) -> Optional[list]:
+    @info_logger(log_level='DEBUG', message='Запрос к бд')
+    def read_all(self, user_id: int) -> Optional[list]:
         """
-        Метод возвращает всю бд
-        :return: бд
+        Метод возвращает историю запросов пользователя (от старых к новым)
+        :param user_id: id пользователя
+        :type user_id: int
+        :return: история запросов пользователя
         :rtype: Optional[list[tuple]]
         """
-        return self.__session.query(Requests.command,
-                                    Requests.product,
-                                    Requests.number,
-                                    Requests.cus_range,
-                                    Requests.result).all()
+        with session_scope() as session:
+            return session.execute(history_statement(user_id)).all()
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
+    @info_logger(log_level='DEBUG', message='Запрос к бд')
     def read(self, command: Literal['low', 'high', 'custom'],
-             product: str, number: int, cus_range: Optional[str] = None
-             ) -> Optional[list]:
+             product: str, number: int, cus_range: Optional[str] = None,
+             max_age: Optional[float] = None) -> Optional[list]:
         """
         Метод ищет все строки в бд по введенной команде, продукту и его количеству (а также диапазону)
-        и возвращает результат
+        и возвращает результаты от новых к старым
         :param command: Команда
         :type command: Literal['low', 'high', 'custom']
         :param product: Продукт
@@ -42,27 +106,28 @@ class CRUD:
         :type number: int
         :param cus_range: Пользовательский диапазон
         :type cus_range: Optional[str]
-        :return: Сохраненный результат этой команды. Если такой команды нет в бд, то None
-        :rtype: Optional[str]
+        :param max_age: Максимальный возраст результата в секундах (None - любой)
+        :type max_age: Optional[float]
+        :return: Строки (result, created_at). Если такой команды нет в бд, то None
+        :rtype: Optional[list[tuple]]
         """
-        result_list: Optional[list] = self.__session.query(Requests.result).filter(
-            Requests.command == command,
-            Requests.product == product,
-            Requests.number == number,
-            Requests.cus_range == cus_range
-        ).all()
+        with session_scope() as session:
+            result_list: Optional[list] = session.execute(
+                result_statement(command, product, number, cus_range, max_age)).all()
 
         if len(result_list) == 0:
             return None
         else:
             return result_list
 
-    @info_logger(log_level='DEBUG', message='Запускается метод')
-    def create(self, command: Literal['low', 'high', 'custom'],
+    @info_logger(log_level='DEBUG', message='Запрос к бд')
+    def create(self, user_id: int, command: Literal['low', 'high', 'custom'],
                product: str, number: int, cus_range: Optional[str],
                result: Optional[str], limit_requests: int = 10) -> None:
         """
-        Метод добавляет в бд новый запрос и его результат
+        Метод добавляет в бд новый запрос пользователя и его результат
+        :param user_id: id пользователя
+        :type user_id: int
         :param command: Команда
         :type command: Literal['low', 'high', 'custom']
         :param product: Продукт
@@ -73,32 +138,43 @@ class CRUD:
         :type cus_range: Optional[str]
         :param result: Результат запроса
         :type result: Optional[str]
-        :param limit_requests: Максимальное количество запросов, которые нужно хранить в бд.
+        :param limit_requests: Максимальное количество запросов пользователя, которые нужно хранить в бд.
+        Согласно тз, лимит равен 10
+        :param limit_requests: int
+        :return: None
+        """
+        self.create_many([dict(user_id=user_id,
+                               command=command,
+                               product=product,
+                               number=number,
+                               cus_range=cus_range,
+                               result=result)],
+                         limit_requests=limit_requests)
+
+    @info_logger(log_level='DEBUG', message='Запрос к бд')
+    def create_many(self, records: list[dict], limit_requests: int = 10) -> None:
+        """
+        Метод добавляет в бд пачку запросов одной транзакцией и у каждого затронутого пользователя
+        удаляет самые старые запросы сверх лимита
+        :param records: Запросы - словари с ключами user_id, command, product, number, cus_range, result (как у create)
+        и необязательным created_at (время получения результата, по умолчанию - текущее)
+        :type records: list[dict]
+        :param limit_requests: Максимальное количество запросов пользователя, которые нужно хранить в бд.
         Согласно тз, лимит равен 10
         :param limit_requests: int
         :return: None
         """
-        # Проверим количество сохраненных запросов в бд. Оно не должно превышать лимит
-        num_requests: int = self.__session.query(Requests).count()
-        if num_requests >= limit_requests:
-            # Если бд уже заполнена, удалим старую запись, у нее наименьший первичный ключ
-            min_prim_key: int = self.__session.query(func.min(Requests.id)).scalar()
-            self.delete(min_prim_key)
-
-        # Создадим запрос на добавление новой записи
-        new_request: Requests = Requests(
-            command=command,
-            product=product,
-            number=number,
-            cus_range=cus_range,
-            result=result
-        )
-        # Сделаем запрос
-        self.__session.add(new_request)
-        # Закоммитим
-        self.__session.commit()
-
-    @info_logger(log_level='DEBUG', message='Запускается метод')
+        with session_scope() as session:
+            # Создадим запросы на добавление новых записей
+            session.add_all([Requests(**record) for record in records])
+            session.flush()
+
+            # У каждого пользователя оставим только limit_requests самых новых записей
+            for user_id in {record['user_id'] for record in records}:
+                session.execute(trim_statement(user_id, limit_requests))
+            # Коммит делает session_scope
+
+    @info_logger(log_level='DEBUG', message='Запрос к бд')
     def delete(self, prim_key: int) -> None:
         """
         Метод удаляет по первичному ключу запрос из бд
@@ -106,12 +182,11 @@ class CRUD:
         :type prim_key: int
         :return: None
         """
-        # Создадим запрос
-        delete_query = self.__session.query(Requests).filter(Requests.id == prim_key).one()
-        # Сделаем запрос
-        self.__session.delete(delete_query)
-        # Закоммитим запрос
-        self.__session.commit()
+        with session_scope() as session:
+            # Создадим запрос
+            delete_query = session.query(Requests).filter(Requests.id == prim_key).one()
+            # Сделаем запрос (коммит делает session_scope)
+            session.delete(delete_query)
 
 
 if __name__ == '__main__':
@@ -121,12 +196,14 @@ if __name__ == '__main__':
     crud: CRUD = CRUD()
 
     # Проверка CRUD.create и CRUD.read
-    crud.create('low', 'red', 10, None, '123')
+    crud.create(1, 'low', 'red', 10, None, '123')
     print(crud.read('low', 'red', 10, None))
 
-    # Проверка переполнения CRUD.create
+    # Проверка переполнения CRUD.create (у каждого пользователя своя история)
     for _ in range(11):
-        crud.create('low', 'red', 10, None, '123')
+        crud.create(1, 'low', 'red', 10, None, '123')
+        crud.create(2, 'high', 'red', 10, None, '321')
 
     # Проверка read_all
-    print(crud.read_all())
+    print(crud.read_all(1))
+    print(crud.read_all(2))
@@ -1,45 +1,216 @@
 """Модуль с ORM"""
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
 import sqlalchemy as db
-from sqlalchemy import Column
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import Column, event
+from sqlalchemy.engine import URL, Connection, Engine, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
+from config_data.config import Database, get_config
+from database.codec import decode_result, encode_result
 
-# Укажем, какую СУБД будем использовать
-__engine = db.create_engine('sqlite:///request_history.db')
+
+# Движок и фабрика сессий создаются по настройкам бд при первом обращении (см. init_engine)
+__engine: Optional[Engine] = None
+__session_factory: Optional[sessionmaker] = None
 # Создаем декларативный класс, от которого будут наследоваться все модели
 __Base = declarative_base()
+# Сколько раз пытаться создать схему: процессы бота, одновременно запущенные на пустой бд, создают ее наперегонки,
+# и проигравший видит уже созданную схему со второй попытки
+SCHEMA_ATTEMPTS: int = 3
+
+
+def utc_now() -> datetime:
+    """
+    Функция возвращает текущее время UTC без часового пояса (в таком виде время хранится в бд)
+    :return: Текущее время
+    :rtype: datetime
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CompressedResult(db.TypeDecorator):
+    """
+    Тип колонки с результатом запроса: в бд лежит сжатый список игр (или сжатый текст), а в коде - список игр,
+    текст или None. Текст, записанный до появления сжатия, читается как есть
+    """
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[list | str], dialect) -> Optional[bytes]:
+        return encode_result(value)
+
+    def process_result_value(self, value: Optional[bytes | str], dialect) -> Optional[list | str]:
+        return decode_result(value)
 
 
 class Requests(__Base):
     """
     Класс - модель, представляющая таблицу запросов,
-    где хранится информация о запросах пользователя. Согласно ТЗ, в ней можно хранить не более 10 записей
+    где хранится информация о запросах пользователей. Согласно ТЗ, для каждого пользователя в ней можно хранить
+    не более 10 записей. Составной индекс (user_id, id) позволяет читать и чистить историю пользователя
+    без просмотра всей таблицы, а индекс по запросу и времени - находить свежий результат такого же запроса,
+    не читая строк таблицы, кроме найденной
     """
     __tablename__ = 'requests'
     id = Column(db.Integer, autoincrement='auto')
+    user_id = Column(db.BigInteger, nullable=True)  # Пользователь (у записей, сделанных до разделения истории, пусто)
     command = Column(db.Text, nullable=False)  # Команда
     product = Column(db.Text, nullable=False)  # Продукт
     number = Column(db.Integer, nullable=False)  # Количество продукта
     cus_range = Column(db.Text, nullable=True)  # Пользовательский диапазон
-    result = Column(db.Text, nullable=True)
+    result = Column(CompressedResult, nullable=True)  # Найденные игры (None - игр не найдено)
+    # Время получения результата от api (у записей, сделанных до появления колонки, пусто)
+    created_at = Column(db.DateTime, nullable=True, default=utc_now)
 
     __table_args__: tuple = (
         db.PrimaryKeyConstraint('id', name='request_id'),
+        db.Index('ix_requests_user_id_id', 'user_id', 'id'),
+        db.Index('ix_requests_lookup', 'command', 'product', 'number', 'cus_range', 'created_at'),
     )
 
 
+def init_engine(settings: Optional[Database] = None) -> Engine:
+    """
+    Метод создает движок бд с пулом соединений. Для SQLite на каждое новое соединение применяется профиль настроек
+    (режим журнала, синхронизация, mmap, кэш страниц, ожидание блокировки)
+    :param settings: Настройки бд (если не переданы, то берутся из общего конфига)
+    :type settings: Optional[Database]
+    :return: Движок бд
+    :rtype: Engine
+    """
+    global __engine, __session_factory
+
+    if settings is None:
+        settings = get_config().database
+    if __engine is not None:
+        __engine.dispose()
+
+    engine: Engine = db.create_engine(settings.url, **engine_options(settings.url, settings))
+    apply_sqlite_profile(engine, settings)
+
+    __engine = engine
+    __session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    return engine
+
+
+def engine_options(url: str | URL, settings: Database) -> dict:
+    """
+    Функция возвращает параметры пула для create_engine. SQLite в памяти работает через SingletonThreadPool или
+    StaticPool, у которых нет pool_size, поэтому размер пула передается только остальным бд
+    :param url: Адрес бд
+    :type url: str | URL
+    :param settings: Настройки бд
+    :type settings: Database
+    :return: Именованные аргументы для create_engine
+    :rtype: dict
+    """
+    parsed: URL = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return dict()
+    return {'pool_size': settings.pool_size}
+
+
+def get_engine() -> Engine:
+    """
+    Метод возвращает движок бд (создает его по общему конфигу при первом обращении)
+    :return: Движок бд
+    :rtype: Engine
+    """
+    if __engine is None:
+        init_engine()
+    return __engine
+
+
+def apply_sqlite_profile(engine: Engine, settings: Database) -> None:
+    """
+    Метод подписывает движок SQLite на применение профиля настроек к каждому новому соединению
+    (для остальных СУБД ничего не делает)
+    :param engine: Движок бд (для асинхронного движка - его sync_engine)
+    :type engine: Engine
+    :param settings: Настройки бд
+    :type settings: Database
+    :return: None
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={settings.journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={settings.synchronous}')
+        cursor.execute(f'PRAGMA mmap_size={int(settings.mmap_size)}')
+        cursor.execute(f'PRAGMA cache_size={int(settings.cache_size)}')
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.busy_timeout)}')
+        cursor.close()
+
+
 def start_database() -> None:
     """
     Метод запускает базу данных
     :return: None
     """
-    __Base.metadata.create_all(__engine)
+    for attempt in range(1, SCHEMA_ATTEMPTS + 1):
+        try:
+            with get_engine().begin() as connection:
+                create_schema(connection)
+            return
+        except db.exc.DBAPIError:
+            if attempt == SCHEMA_ATTEMPTS:
+                raise
+
+
+def create_schema(connection: Connection) -> None:
+    """
+    Метод создает таблицы и дополняет таблицу, созданную старой версией бота, колонками и индексами новой версии.
+    Принимает соединение, поэтому подходит и для асинхронного движка (через run_sync)
+    :param connection: Соединение с бд
+    :type connection: Connection
+    :return: None
+    """
+    __Base.metadata.create_all(connection)
+    columns: dict[str, db.types.TypeEngine] = {
+        column['name']: column['type'] for column in db.inspect(connection).get_columns(Requests.__tablename__)
+    }
+    if 'user_id' not in columns:
+        connection.execute(db.text(f'ALTER TABLE {Requests.__tablename__} ADD COLUMN user_id BIGINT'))
+    if 'created_at' not in columns:
+        connection.execute(db.text(f'ALTER TABLE {Requests.__tablename__} ADD COLUMN created_at TIMESTAMP'))
+    if connection.dialect.name == 'postgresql' and not isinstance(columns['result'], db.LargeBinary):
+        # В PostgreSQL тип колонки строгий, поэтому текстовые результаты переносим в двоичную колонку
+        connection.execute(db.text(f'ALTER TABLE {Requests.__tablename__} ALTER COLUMN result TYPE BYTEA '
+                                   f"USING convert_to(result, 'UTF8')"))
+    for index in Requests.__table__.indexes:
+        index.create(connection, checkfirst=True)
 
 
 def get_session() -> Session:
     """
-    Метод возвращает объект сессии
+    Метод возвращает объект сессии из фабрики сессий. Сессию нужно закрыть после использования,
+    поэтому лучше использовать session_scope
     :return: объект сессии
     :rtype: Session
     """
-    return Session(bind=__engine)
+    get_engine()
+    return __session_factory()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Метод выдает сессию на одну единицу работы: при успехе изменения коммитятся, при ошибке откатываются,
+    а соединение в любом случае возвращается в пул. Так одновременные хэндлеры не делят одну сессию
+    :return: объект сессии
+    :rtype: Iterator[Session]
+    """
+    session: Session = get_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
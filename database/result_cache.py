@@ -0,0 +1,78 @@
+"""Модуль со вторым уровнем кэша: если такой же запрос недавно уже выполнялся, то его результат берется
+из истории запросов, а не запрашивается у api заново"""
+import time
+from datetime import datetime
+from typing import Literal, NamedTuple, Optional
+
+from config_data import get_config
+from my_logging import sampled
+from database.storage import HistoryStorage
+
+
+class CachedResult(NamedTuple):
+    """Результат запроса, найденный в истории"""
+    result: Optional[str]  # Результат (None, если игр не нашлось)
+    created_at: datetime  # Время получения результата от api
+
+
+class ResultCache:
+    """
+    Кэш результатов запросов поверх хранилища истории. Ключ - нормализованный запрос
+    (команда, ключевое слово, количество, диапазон), поэтому ключевое слово нужно нормализовать
+    и при поиске, и при записи в историю
+
+    Args:
+        storage (HistoryStorage): Хранилище истории
+        max_age (Optional[float]): Сколько секунд результат считается свежим (если не передано, то берется
+        из общего конфига). 0 - кэш выключен
+
+    Attributes:
+        hits (int): Количество запросов, обслуженных из истории
+        misses (int): Количество запросов, для которых свежего результата не нашлось
+        last_lookup_latency (float): Время последнего поиска в секундах
+    """
+    def __init__(self, storage: HistoryStorage, max_age: Optional[float] = None) -> None:
+        self.__storage: HistoryStorage = storage
+        self.__max_age: float = get_config().database.result_max_age if max_age is None else max_age
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.last_lookup_latency: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Доля запросов, обслуженных из истории"""
+        total: int = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get(self, command: Literal['low', 'high', 'custom'],
+                  product: str, number: int, cus_range: Optional[str] = None) -> Optional[CachedResult]:
+        """
+        Метод ищет в истории самый новый результат такого же запроса, полученный не раньше max_age секунд назад
+        :param command: Команда
+        :type command: Literal['low', 'high', 'custom']
+        :param product: Нормализованное ключевое слово
+        :type product: str
+        :param number: Количество игр
+        :type number: int
+        :param cus_range: Пользовательский диапазон
+        :type cus_range: Optional[str]
+        :return: Найденный результат или None
+        :rtype: Optional[CachedResult]
+        """
+        if self.__max_age <= 0:
+            return None
+
+        started: float = time.perf_counter()
+        rows: Optional[list] = await self.__storage.read(command, product, number, cus_range, max_age=self.__max_age)
+        self.last_lookup_latency = time.perf_counter() - started
+
+        if rows is None:
+            self.misses += 1
+            cached: Optional[CachedResult] = None
+        else:
+            self.hits += 1
+            cached = CachedResult(*rows[0])
+        sampled.debug('Кэш результатов: попаданий {}, промахов {} (поиск {:.2f} мс)',
+                      self.hits, self.misses, self.last_lookup_latency * 1000)
+        return cached
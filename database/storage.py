@@ -0,0 +1,327 @@
+"""Модуль с хранилищами истории запросов. Все хранилища имеют один асинхронный интерфейс (HistoryStorage),
+поэтому хэндлеры работают с историей через await и не блокируют цикл событий, а реализацию можно сменить в конфиге"""
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Any, Iterator, Literal, Optional
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from config_data import Database, get_config
+from database.crud import CRUD, history_statement, result_statement, trim_statement
+from database.orm import (SCHEMA_ATTEMPTS, Requests, apply_sqlite_profile, create_schema, engine_options, get_engine,
+                          init_engine, start_database, utc_now)
+from metrics import REGISTRY, Family, Histogram, timed
+
+
+# Длительность операций с историей по операциям (read_all, read, create_many) - одна метрика для всех хранилищ
+DB_OPERATION_SECONDS: Family[Histogram] = REGISTRY.histogram('bot_db_operation_duration_seconds',
+                                                             'Длительность операций с историей запросов',
+                                                             labels=('operation',))
+
+# Асинхронные драйверы, которые подставляются в DB_URL без явно указанного драйвера
+ASYNC_DRIVERS: dict[str, str] = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+
+class HistoryStorage(ABC):
+    """
+    Абстрактный класс хранилища истории запросов. Запрос - словарь с ключами
+    user_id, command, product, number, cus_range, result и необязательным created_at
+    """
+    @abstractmethod
+    async def start(self, settings: Optional[Database] = None) -> None:
+        """
+        Метод подключается к хранилищу и при необходимости создает схему
+        :param settings: Настройки бд (если не переданы, то берутся из общего конфига)
+        :type settings: Optional[Database]
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Метод закрывает соединения с хранилищем
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    async def read_all(self, user_id: int) -> list:
+        """
+        Метод возвращает историю запросов пользователя (от старых к новым)
+        :param user_id: id пользователя
+        :type user_id: int
+        :return: Строки (command, product, number, cus_range, result)
+        :rtype: list[tuple]
+        """
+        pass
+
+    @abstractmethod
+    async def read(self, command: Literal['low', 'high', 'custom'],
+                   product: str, number: int, cus_range: Optional[str] = None,
+                   max_age: Optional[float] = None) -> Optional[list]:
+        """
+        Метод ищет сохраненные результаты команды (от новых к старым)
+        :param command: Команда
+        :type command: Literal['low', 'high', 'custom']
+        :param product: Продукт
+        :type product: str
+        :param number: Количество продукта
+        :type number: int
+        :param cus_range: Пользовательский диапазон
+        :type cus_range: Optional[str]
+        :param max_age: Максимальный возраст результата в секундах (None - любой)
+        :type max_age: Optional[float]
+        :return: Строки (result, created_at). Если такой команды нет, то None
+        :rtype: Optional[list[tuple]]
+        """
+        pass
+
+    @abstractmethod
+    async def create_many(self, records: list[dict], limit_requests: int = 10) -> None:
+        """
+        Метод добавляет пачку запросов и у каждого затронутого пользователя удаляет самые старые запросы сверх лимита
+        :param records: Запросы
+        :type records: list[dict]
+        :param limit_requests: Максимальное количество запросов одного пользователя
+        :type limit_requests: int
+        :return: None
+        """
+        pass
+
+    async def create(self, user_id: int, command: Literal['low', 'high', 'custom'],
+                     product: str, number: int, cus_range: Optional[str],
+                     result: Optional[str], limit_requests: int = 10) -> None:
+        """
+        Метод добавляет один запрос (параметры как у CRUD.create)
+        :return: None
+        """
+        await self.create_many([dict(user_id=user_id,
+                                     command=command,
+                                     product=product,
+                                     number=number,
+                                     cus_range=cus_range,
+                                     result=result)],
+                               limit_requests=limit_requests)
+
+
+class SyncSQLStorage(HistoryStorage):
+    """
+    Хранилище поверх синхронного CRUD. Запросы к бд выполняются в отдельном потоке (одном, чтобы записи шли по порядку)
+    """
+    def __init__(self) -> None:
+        self.__crud: CRUD = CRUD()
+        self.__executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self, settings: Optional[Database] = None) -> None:
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-storage')
+        await self.__call(init_engine, settings)
+        await self.__call(start_database)
+
+    async def close(self) -> None:
+        if self.__executor is None:
+            return
+        await self.__call(lambda: get_engine().dispose())
+        self.__executor.shutdown(wait=True)
+        self.__executor = None
+
+    @timed(DB_OPERATION_SECONDS.labels('read_all'))
+    async def read_all(self, user_id: int) -> list:
+        return await self.__call(self.__crud.read_all, user_id)
+
+    @timed(DB_OPERATION_SECONDS.labels('read'))
+    async def read(self, command: Literal['low', 'high', 'custom'],
+                   product: str, number: int, cus_range: Optional[str] = None,
+                   max_age: Optional[float] = None) -> Optional[list]:
+        return await self.__call(self.__crud.read, command, product, number, cus_range, max_age)
+
+    @timed(DB_OPERATION_SECONDS.labels('create_many'))
+    async def create_many(self, records: list[dict], limit_requests: int = 10) -> None:
+        await self.__call(self.__crud.create_many, records, limit_requests)
+
+    async def __call(self, func, *args: Any) -> Any:
+        """
+        Метод выполняет синхронную функцию в потоке хранилища
+        :param func: Функция
+        :param args: Аргументы функции
+        :return: Результат функции
+        :rtype: Any
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, func, *args)
+
+
+class AsyncSQLStorage(HistoryStorage):
+    """
+    Хранилище на асинхронном движке SQLAlchemy (aiosqlite для SQLite, asyncpg для PostgreSQL)
+    """
+    def __init__(self) -> None:
+        self.__engine: Optional[AsyncEngine] = None
+        self.__session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
+    async def start(self, settings: Optional[Database] = None) -> None:
+        if settings is None:
+            settings = get_config().database
+        await self.close()
+
+        url: URL = async_url(settings.url)
+        self.__engine = create_async_engine(url, **engine_options(url, settings))
+        apply_sqlite_profile(self.__engine.sync_engine, settings)
+        self.__session_factory = async_sessionmaker(self.__engine, expire_on_commit=False)
+
+        for attempt in range(1, SCHEMA_ATTEMPTS + 1):
+            try:
+                async with self.__engine.begin() as connection:
+                    await connection.run_sync(create_schema)
+                return
+            except DBAPIError:
+                if attempt == SCHEMA_ATTEMPTS:
+                    raise
+
+    async def close(self) -> None:
+        if self.__engine is not None:
+            await self.__engine.dispose()
+        self.__engine = None
+        self.__session_factory = None
+
+    @timed(DB_OPERATION_SECONDS.labels('read_all'))
+    async def read_all(self, user_id: int) -> list:
+        async with self.__session_factory() as session:
+            return list((await session.execute(history_statement(user_id))).all())
+
+    @timed(DB_OPERATION_SECONDS.labels('read'))
+    async def read(self, command: Literal['low', 'high', 'custom'],
+                   product: str, number: int, cus_range: Optional[str] = None,
+                   max_age: Optional[float] = None) -> Optional[list]:
+        async with self.__session_factory() as session:
+            result_list: list = list(
+                (await session.execute(result_statement(command, product, number, cus_range, max_age))).all())
+        return result_list or None
+
+    @timed(DB_OPERATION_SECONDS.labels('create_many'))
+    async def create_many(self, records: list[dict], limit_requests: int = 10) -> None:
+        async with self.__session_factory.begin() as session:
+            session.add_all([Requests(**record) for record in records])
+            await session.flush()
+            for user_id in {record['user_id'] for record in records}:
+                await session.execute(trim_statement(user_id, limit_requests))
+
+
+class MemoryHistoryStorage(HistoryStorage):
+    """
+    Хранилище в памяти процесса (история теряется при перезапуске). Подходит для проверок и запуска без бд
+    """
+    def __init__(self) -> None:
+        self.__ids: Iterator[int] = count(1)
+        # id пользователя -> строки (id, command, product, number, cus_range, result, created_at) от старых к новым
+        self.__rows: dict[int, list[tuple]] = dict()
+
+    async def start(self, settings: Optional[Database] = None) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @timed(DB_OPERATION_SECONDS.labels('read_all'))
+    async def read_all(self, user_id: int) -> list:
+        return [row[1:6] for row in self.__rows.get(user_id, list())]
+
+    @timed(DB_OPERATION_SECONDS.labels('read'))
+    async def read(self, command: Literal['low', 'high', 'custom'],
+                   product: str, number: int, cus_range: Optional[str] = None,
+                   max_age: Optional[float] = None) -> Optional[list]:
+        oldest: datetime = datetime.min if max_age is None else utc_now() - timedelta(seconds=max_age)
+        result_list: list = [row[5:]
+                             for rows in self.__rows.values() for row in rows
+                             if row[1:5] == (command, product, number, cus_range) and row[6] >= oldest]
+        result_list.sort(key=lambda row: row[1], reverse=True)
+        return result_list or None
+
+    @timed(DB_OPERATION_SECONDS.labels('create_many'))
+    async def create_many(self, records: list[dict], limit_requests: int = 10) -> None:
+        for record in records:
+            rows: list[tuple] = self.__rows.setdefault(record['user_id'], list())
+            rows.append((next(self.__ids), record['command'], record['product'], record['number'],
+                         record['cus_range'], record['result'], record.get('created_at') or utc_now()))
+        for user_id in {record['user_id'] for record in records}:
+            rows = self.__rows[user_id]
+            del rows[:max(0, len(rows) - limit_requests)]
+
+
+def async_url(url: str) -> URL:
+    """
+    Функция подставляет в адрес бд асинхронный драйвер, если драйвер не указан явно
+    (sqlite:///... -> sqlite+aiosqlite:///..., postgresql://... -> postgresql+asyncpg://...)
+    :param url: Адрес бд
+    :type url: str
+    :return: Адрес бд с асинхронным драйвером
+    :rtype: URL
+    """
+    parsed: URL = make_url(url)
+    backend: str = parsed.get_backend_name()
+    if '+' not in parsed.drivername and backend in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+    return parsed
+
+
+def create_storage(settings: Optional[Database] = None) -> HistoryStorage:
+    """
+    Функция создает хранилище истории, выбранное в настройках бд
+    :param settings: Настройки бд (если не переданы, то берутся из общего конфига)
+    :type settings: Optional[Database]
+    :return: Хранилище истории
+    :rtype: HistoryStorage
+    """
+    if settings is None:
+        settings = get_config().database
+
+    storages: dict[str, type[HistoryStorage]] = {'async': AsyncSQLStorage,
+                                                 'sync': SyncSQLStorage,
+                                                 'memory': MemoryHistoryStorage}
+    if settings.backend not in storages:
+        raise ValueError(f'Неизвестное хранилище истории: {settings.backend}')
+    return storages[settings.backend]()
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    async def check(storage: HistoryStorage, settings: Database) -> None:
+        """Один и тот же сценарий для всех хранилищ"""
+        await storage.start(settings)
+        try:
+            await storage.create(1, 'low', 'red', 10, None, '123')
+            assert [row[0] for row in await storage.read('low', 'red', 10, None, max_age=60)] == ['123']
+            assert await storage.read('high', 'red', 10, None) is None
+
+            # Результат, полученный давно, не считается свежим
+            await storage.create(3, 'high', 'blue', 3, None, 'old')
+            await storage.create_many([dict(user_id=3, command='high', product='blue', number=3, cus_range=None,
+                                            result='older', created_at=utc_now() - timedelta(hours=1))])
+            assert [row[0] for row in await storage.read('high', 'blue', 3, None)] == ['old', 'older']
+            assert [row[0] for row in await storage.read('high', 'blue', 3, None, max_age=60)] == ['old']
+
+            # У каждого пользователя своя история и свой лимит
+            for i in range(11):
+                await storage.create_many([dict(user_id=1, command='low', product='red', number=i,
+                                                cus_range=None, result=str(i)),
+                                           dict(user_id=2, command='custom', product='red', number=i,
+                                                cus_range='1 5', result=None)])
+            history: list = await storage.read_all(1)
+            assert [tuple(row) for row in history] == [('low', 'red', i, None, str(i)) for i in range(1, 11)]
+            assert len(await storage.read_all(2)) == 10
+            assert await storage.read_all(4) == []
+        finally:
+            await storage.close()
+        print(f'{type(storage).__name__}: OK')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('async', 'sync', 'memory'):
+            path: str = os.path.join(directory, f'{name}.db')
+            db_settings: Database = Database(url=f'sqlite:///{path}', backend=name)
+            asyncio.run(check(create_storage(db_settings), db_settings))
@@ -0,0 +1,132 @@
+"""Модуль с фоновой записью истории запросов: хэндлеры кладут запросы в очередь, а фоновая задача
+записывает их в хранилище пачками, по одной транзакции на пачку"""
+import asyncio
+import time
+from typing import Any, Optional
+from loguru import logger
+
+from database.storage import HistoryStorage
+
+
+class HistoryWriter:
+    """
+    Фоновый писатель истории запросов
+
+    Args:
+        storage (HistoryStorage): Хранилище истории
+        batch_size (int): Максимальное количество запросов в одной транзакции
+        flush_interval (float): Сколько секунд ждать, пока наберется пачка, после первого запроса в ней
+        max_queue (int): Максимальная длина очереди. Если очередь переполнена, то запрос не сохраняется в историю
+
+    Attributes:
+        written (int): Количество записанных запросов
+        flushes (int): Количество записанных пачек
+        last_flush_latency (float): Время записи последней пачки в секундах
+        max_flush_latency (float): Максимальное время записи пачки в секундах
+    """
+    def __init__(self, storage: HistoryStorage, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_queue: int = 10_000) -> None:
+        self.__batch_size: int = batch_size
+        self.__flush_interval: float = flush_interval
+        self.__max_queue: int = max_queue
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__task: Optional[asyncio.Task] = None
+        self.__storage: HistoryStorage = storage
+
+        self.written: int = 0
+        self.flushes: int = 0
+        self.last_flush_latency: float = 0.0
+        self.max_flush_latency: float = 0.0
+        self.__total_flush_latency: float = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих записи"""
+        return self.__queue.qsize() if self.__queue is not None else 0
+
+    @property
+    def avg_flush_latency(self) -> float:
+        """Среднее время записи пачки в секундах"""
+        return self.__total_flush_latency / self.flushes if self.flushes else 0.0
+
+    async def start(self) -> None:
+        """
+        Метод запускает фоновую запись
+        :return: None
+        """
+        self.__queue = asyncio.Queue(maxsize=self.__max_queue)
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """
+        Метод дописывает все, что осталось в очереди, и останавливает фоновую запись
+        :return: None
+        """
+        if self.__task is None:
+            return
+        await self.__queue.put(None)
+        await self.__task
+        self.__task = None
+
+    def submit(self, **record: Any) -> None:
+        """
+        Метод ставит запрос в очередь на запись. Параметры - такие же, как у HistoryStorage.create
+        :param record: Запрос с результатом
+        :type record: Any
+        :return: None
+        """
+        try:
+            self.__queue.put_nowait(record)
+        except asyncio.QueueFull:
+            logger.error('Очередь записи истории переполнена, запрос не сохранен')
+
+    async def __run(self) -> None:
+        """
+        Метод собирает запросы из очереди в пачки и записывает их
+        :return: None
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        stopping: bool = False
+
+        while not stopping:
+            record: Optional[dict] = await self.__queue.get()
+            if record is None:
+                break
+            batch: list[dict] = [record]
+            deadline: float = loop.time() + self.__flush_interval
+
+            # Доберем пачку, пока не кончится время или место в ней
+            while len(batch) < self.__batch_size:
+                try:
+                    record = await asyncio.wait_for(self.__queue.get(), timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            await self.__flush(batch)
+
+    async def __flush(self, batch: list[dict]) -> None:
+        """
+        Метод записывает пачку одной транзакцией
+        :param batch: Пачка запросов
+        :type batch: list[dict]
+        :return: None
+        """
+        started: float = time.perf_counter()
+        try:
+            await self.__storage.create_many(batch)
+        except Exception as exc:
+            logger.exception(f'Не удалось записать в историю {len(batch)} запросов: {exc}')
+            return
+
+        latency: float = time.perf_counter() - started
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.__total_flush_latency += latency
+        logger.debug('В историю записано {} запросов за {:.1f} мс, в очереди {}',
+                     len(batch), latency * 1000, self.queue_depth)
@@ -6,14 +6,19 @@ from aiogram.filters import Command, StateFilter
 from aiogram.fsm.state import default_state
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
+import time
 from typing import Optional
+from loguru import logger
 
 from states import FSMQuery
 from filters import IsDigit, IsRange
 from lexicon import LEXICON_RU
-from api import APIModule
-from database import CRUD
-from service import adjusting_length_message
+from api import (APIModule, APIRequestError, BoundedExecutor, Deadline, DeadlineExceededError, ExecutorBusyError,
+                 InFlightLimitError)
+from config_data import API, Config, get_config
+from database import CachedResult, HistoryStorage, HistoryWriter, ResultCache, create_storage
+from metrics import REGISTRY, Counter, Family, Histogram
+from service import MessageSender, adjusting_length_message, normalize_product, split_message
 # Необходимо импортировать модуль с выбранным api
 from api import EGSAPIModule
 
@@ -25,8 +30,61 @@ if not isinstance(api_module, APIModule):
     raise SyntaxError('Импортированный модуль api не является сущностью APIModule!')
 
 router: Router = Router()
-# Подцепим класс CRUD для работы с бд
-crud: CRUD = CRUD()
+# Хранилище истории запросов выбирается в конфиге (подключается и закрывается в main)
+history_storage: HistoryStorage = create_storage()
+# Запись истории идет в фоне пачками, чтобы хэндлеры не ждали бд (запускается и останавливается в main)
+history_writer: HistoryWriter = HistoryWriter(history_storage)
+# Свежие результаты таких же запросов берутся из истории, без обращения к api
+result_cache: ResultCache = ResultCache(history_storage)
+# Поиски идут через ограниченный исполнитель: всплеск медленных поисков не займет бота целиком
+api_settings: API = get_config().api
+api_executor: BoundedExecutor = BoundedExecutor(workers=api_settings.workers,
+                                                max_queue=api_settings.max_queue,
+                                                per_key=api_settings.per_chat)
+
+
+def create_sender(config: Config) -> MessageSender:
+    """
+    Функция создает отправитель сообщений. Общий лимит телеграма действует на весь бот, поэтому делится между
+    процессами. В режиме long polling апдейты одного чата обрабатывает один процесс, и лимит чата не делится.
+    В режиме вебхука с несколькими процессами соединения распределяет ядро (SO_REUSEPORT), и сообщения одного
+    чата может отправлять любой процесс, поэтому лимит чата тоже делится между процессами
+    :param config: Конфиг
+    :type config: Config
+    :return: Отправитель сообщений
+    :rtype: MessageSender
+    """
+    processes: int = config.webhook.workers if config.webhook.enabled else config.tg_bot.workers
+    chat_processes: int = config.webhook.workers if config.webhook.enabled else 1
+    return MessageSender(rate=config.sender.rate / processes,
+                         burst=max(1, config.sender.burst // processes),
+                         chat_rate=config.sender.chat_rate / chat_processes,
+                         chat_burst=max(1, config.sender.chat_burst // chat_processes),
+                         max_attempts=config.sender.max_attempts)
+
+
+# Длинные ответы (несколько сообщений) отправляются с учетом лимитов телеграма (останавливается в main)
+message_sender: MessageSender = create_sender(get_config())
+
+# Метрики поисков по командам: исход (history - из истории, api - через api, остальные - отказы) и длительность
+SEARCHES: Family[Counter] = REGISTRY.counter('bot_searches_total', 'Поиски по командам и исходам',
+                                             labels=('command', 'outcome'))
+SEARCH_SECONDS: Family[Histogram] = REGISTRY.histogram('bot_search_duration_seconds',
+                                                       'Длительность поиска от ввода числа до ответа',
+                                                       labels=('command', 'source'))
+
+
+def render_result(result: Optional[list | str]) -> str:
+    """
+    Функция собирает текст результата, сохраненного в истории
+    :param result: Найденные игры, None или текст (так хранились результаты до сжатия истории)
+    :type result: Optional[list | str]
+    :return: Текст результата
+    :rtype: str
+    """
+    if isinstance(result, str):
+        return result
+    return api_module.render(result)
 
 
 @router.message(Command(commands=['history']), StateFilter(default_state))
@@ -37,8 +95,8 @@ async def process_history_command(message: Message) -> None:
     :type message: Message
     :return: None
     """
-    # Получим историю запросов из бд
-    history: list = crud.read_all()
+    # Получим историю запросов из бд (в ней хранятся найденные игры, текст собирается только сейчас)
+    history: list = await history_storage.read_all(user_id=message.from_user.id)
     result_strings: list[str] = [
         '<b>Команда: {command}; продукт: {product};'
         ' количество: {number}; диапазон (если его нет, то None): {range}\n'
@@ -47,14 +105,12 @@ async def process_history_command(message: Message) -> None:
             product=row[1],
             number=row[2],
             range=row[3],
-            result=row[4]
+            result=render_result(row[4])
         )
         for row in history
     ]
     # История может быть длинным сообщением, поэтому придется его разбить на несколько сообщений
-    result_strings = adjusting_length_message(result_strings)
-    for answer in result_strings:
-        await message.answer(answer)
+    await message_sender.send_many(message.bot, message.chat.id, adjusting_length_message(result_strings))
 
 
 @router.message(Command(commands=['low']), StateFilter(default_state))
@@ -153,39 +209,83 @@ async def process_input_right_number(message: Message, state: FSMContext) -> Non
     :type state: FSMContext
     :return: None
     """
+    started: float = time.perf_counter()
     await state.update_data(number=message.text)
     await state.set_state(default_state)
 
     data = await state.get_data()
-    answer: Optional[str] = None
+    result: Optional[list | str] = None
+    product: str = normalize_product(data['product'])
+    number: int = int(data['number'])
+    cus_range: Optional[str] = data['range']
+    if isinstance(cus_range, (tuple, list)):
+        cus_range = f'{cus_range[0]} {cus_range[1]}'
+
+    # Крайний срок поиска: каждый этап (история, очередь, запрос к api) получает не больше оставшегося времени
+    deadline: Deadline = Deadline(api_settings.search_timeout)
+    try:
+        cached: Optional[CachedResult] = await deadline.run(
+            result_cache.get(command=data['command'], product=product, number=number, cus_range=cus_range),
+            stage='поиск в истории', seconds=api_settings.lookup_timeout
+        )
+    except DeadlineExceededError as exc:
+        # История не ответила вовремя - найдем игры через api
+        logger.warning(exc)
+        cached = None
 
-    if data['command'] == 'low':
-        answer = api_module.low_api(product=data['product'], number=int(data['number']))
-    elif data['command'] == 'high':
-        answer = api_module.high_api(product=data['product'], number=int(data['number']))
-    elif data['command'] == 'custom':
-        answer = api_module.custom_api(product=data['product'], number=int(data['number']),
-                                       custom_range=data['range'])
+    if cached is not None:
+        result = cached.result
+    else:
+        try:
+            result = await deadline.run(
+                api_executor.run(message.chat.id, api_module.afind_games, command=data['command'],
+                                 product=product, number=number, custom_range=data['range'], deadline=deadline,
+                                 queue_timeout=deadline.budget(api_settings.queue_timeout)),
+                stage='поиск через api'
+            )
+        except InFlightLimitError:
+            SEARCHES.labels(data['command'], 'in_flight').inc()
+            await message.answer(text=LEXICON_RU['search in progress'])
+            return
+        except ExecutorBusyError:
+            SEARCHES.labels(data['command'], 'busy').inc()
+            logger.warning(f'Очередь поисков заполнена, выполняется {api_executor.running}, ждут {api_executor.queued}')
+            await message.answer(text=LEXICON_RU['busy'])
+            return
+        except DeadlineExceededError as exc:
+            # Поиск отменен, соединение с api освобождено
+            SEARCHES.labels(data['command'], 'timeout').inc()
+            logger.warning(exc)
+            await message.answer(text=LEXICON_RU['timeout'])
+            return
+        except APIRequestError as exc:
+            # Сервис недоступен - сообщим об этом пользователю и не будем сохранять запрос в историю
+            SEARCHES.labels(data['command'], 'error').inc()
+            logger.error(exc)
+            await message.answer(text=LEXICON_RU['api error'])
+            return
 
+    answer: str = render_result(result)
     if answer == '':
-        answer = None
         await message.answer(text=LEXICON_RU['empty string'])
     else:
-        await message.answer(text=answer)
-
-    if isinstance(data['range'], tuple):
-        # Сохраним запрос с результатом в бд
-        crud.create(command=data['command'],
-                    product=data['product'],
-                    cus_range=f"{data['range'][0]} {data['range'][1]}",
-                    number=data['number'],
-                    result=answer)
-    else:
-        crud.create(command=data['command'],
-                    product=data['product'],
-                    cus_range=data['range'],
-                    number=data['number'],
-                    result=answer)
+        # Длинный список игр не влезает в одно сообщение
+        await message_sender.send_many(message.bot, message.chat.id, split_message(answer))
+    source: str = 'history' if cached is not None else 'api'
+    SEARCHES.labels(data['command'], source).inc()
+    SEARCH_SECONDS.labels(data['command'], source).observe(time.perf_counter() - started)
+
+    # Поставим запрос с результатом в очередь на запись в бд (запись идет в фоне и не задерживает ответ)
+    record: dict = dict(user_id=message.from_user.id,
+                        command=data['command'],
+                        product=product,
+                        cus_range=cus_range,
+                        number=number,
+                        result=result)
+    if cached is not None:
+        # У результата из истории сохраняется время его получения, чтобы повторы не продлевали ему свежесть
+        record['created_at'] = cached.created_at
+    history_writer.submit(**record)
 
 
 @router.message(StateFilter(FSMQuery.fill_number))
@@ -43,5 +43,9 @@ LEXICON_RU: dict[str, str] = {
             'После ввода команды выводится краткая история запросов пользователя (последние'
             ' десять запросов).',
     'other': 'Извините, я вас не понимаю. Чтобы получить справку о боте, введите команду /help',
-    'empty string': 'Извините, по вашему запросу ничего не найдено:('
+    'empty string': 'Извините, по вашему запросу ничего не найдено:(',
+    'api error': 'Извините, сервис сейчас недоступен. Пожалуйста, попробуйте повторить запрос позже',
+    'busy': 'Извините, сейчас слишком много запросов. Пожалуйста, попробуйте повторить запрос чуть позже',
+    'search in progress': 'Ваш предыдущий запрос еще выполняется. Дождитесь его результата и повторите запрос',
+    'timeout': 'Извините, поиск занял слишком много времени и был остановлен. Пожалуйста, попробуйте повторить запрос'
 }
@@ -1,50 +1,273 @@
 import asyncio
+from multiprocessing.queues import Queue
+from typing import Optional
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
+from aiohttp import web
 from loguru import logger
 
-from my_logging import info_logger
-from config_data import Config, load_config, LOG_LEVEL
+from my_logging import info_logger, setup_logging
+from config_data import Config, get_config, add_reload_listener, reload_on_sighup
 from keyboards import set_main_menu
+from lexicon import LEXICON_COMMANDS_RU
+from metrics import REGISTRY, Family, Gauge, Histogram, HandlerMetricsMiddleware, MetricsFile
+from states import count_states, create_fsm_storage
 from handlers import standart_handlers, query_handlers
-from database import start_database
+from api.http_client import close_sessions
+from webhook import create_app, serve, run_workers
+from sharding import process_shard, run_shards
 
 
-logger.remove()
-logger.add("logs/application.log",
-           format="<lvl>[</lvl><c>{time:DD.MM.YYYY HH:mm:ss}</c><lvl>]</lvl> <lvl>{level}:</lvl> <lvl>{message}</lvl>",
-           level=LOG_LEVEL,
-           retention='1 days',
-           rotation='00:01',
-           compression='zip')
+# Логгирование настраивается в каждом процессе бота (процессы-обработчики тоже импортируют этот модуль)
+setup_logging(get_config().logging)
 
+# Длительность обработки сообщений по командам (и по шагам диалогов)
+HANDLER_SECONDS: Family[Histogram] = REGISTRY.histogram('bot_handler_duration_seconds',
+                                                        'Длительность обработки сообщения', labels=('command',))
 
-@info_logger(log_level='DEBUG', message='Запускается программа')
-async def main() -> None:
+
+def create_bot(config: Config) -> Bot:
     """
-    Основной скрипт телеграм бота
-    :return: None
+    Функция создает бота (если задан свой сервер Bot API, то запросы идут на него)
+    :param config: Конфиг
+    :type config: Config
+    :return: Бот
+    :rtype: Bot
     """
-    # Настройка основных параметров бота
-    config: Config = load_config()
-    bot: Bot = Bot(token=config.tg_bot.token,
-                   parse_mode='HTML')
-    storage: MemoryStorage = MemoryStorage()
-    dp: Dispatcher = Dispatcher(storage=storage)
+    session: Optional[AiohttpSession] = None
+    if config.tg_bot.api_server:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.tg_bot.api_server))
+    return Bot(token=config.tg_bot.token,
+               session=session,
+               default=DefaultBotProperties(parse_mode='HTML'))
 
-    # Запустим движок базы данных
-    start_database()
 
-    # вывод кнопки меню
-    await set_main_menu(bot)
+def create_dispatcher(config: Config) -> Dispatcher:
+    """
+    Функция создает диспетчер с роутерами. Запуск и остановка хранилищ привязаны к startup и shutdown диспетчера,
+    поэтому одинаково работают и в режиме long polling, и в режиме вебхука
+    :param config: Конфиг
+    :type config: Config
+    :return: Диспетчер
+    :rtype: Dispatcher
+    """
+    # Модуль api работает с тем же конфигом (и пересобирает заголовки при перезагрузке конфига, см. on_startup)
+    query_handlers.api_module.configure(config)
+
+    # Состояния диалогов хранятся вне процесса, поэтому переживают перезапуск и доступны всем процессам бота
+    dp: Dispatcher = Dispatcher(storage=create_fsm_storage(config.fsm), config=config)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    if config.metrics.enabled:
+        dp.message.outer_middleware(HandlerMetricsMiddleware(HANDLER_SECONDS, ['/start', *LEXICON_COMMANDS_RU]))
+        register_metrics(dp.storage)
 
     # Регистрируем роутеры
     dp.include_routers(*[standart_handlers.router, query_handlers.router])
+    return dp
+
+
+def register_metrics(fsm_storage: BaseStorage) -> None:
+    """
+    Регистрация метрик, которые считают сами объекты бота (кэши, исполнитель поисков, запись истории),
+    и подсчета диалогов по состояниям
+    :param fsm_storage: Хранилище состояний
+    :type fsm_storage: BaseStorage
+    :return: None
+    """
+    api_cache, result_cache = query_handlers.api_module.cache, query_handlers.result_cache
+    executor, writer = query_handlers.api_executor, query_handlers.history_writer
+    flight, sender = query_handlers.api_module.flight, query_handlers.message_sender
+
+    REGISTRY.function('bot_cache_hits_total', 'Попадания в кэш ответов api и в историю',
+                      lambda: {('api',): api_cache.hits, ('history',): result_cache.hits},
+                      kind='counter', labels=('cache',))
+    REGISTRY.function('bot_cache_misses_total', 'Промахи кэша ответов api и истории',
+                      lambda: {('api',): api_cache.misses, ('history',): result_cache.misses},
+                      kind='counter', labels=('cache',))
+    REGISTRY.function('bot_cache_hit_ratio', 'Доля попаданий в кэш',
+                      lambda: {('api',): api_cache.hit_ratio, ('history',): result_cache.hit_ratio},
+                      labels=('cache',))
+    REGISTRY.function('bot_api_calls_total', 'Запросы к api, включая объединенные с одинаковыми',
+                      lambda: flight.calls, kind='counter')
+    REGISTRY.function('bot_api_coalesced_total', 'Запросы к api, дождавшиеся результата одинакового запроса',
+                      lambda: flight.coalesced, kind='counter')
+    REGISTRY.register('bot_search_queue_wait_seconds', 'Ожидание поиска в очереди исполнителя',
+                      executor.queue_wait)
+    REGISTRY.register('bot_search_execution_seconds', 'Выполнение поиска в исполнителе', executor.execution)
+    REGISTRY.function('bot_search_running', 'Выполняющиеся поиски', lambda: executor.running)
+    REGISTRY.function('bot_search_queued', 'Поиски в очереди исполнителя', lambda: executor.queued)
+    REGISTRY.function('bot_search_rejected_total', 'Поиски, отклоненные исполнителем',
+                      lambda: {('busy',): executor.rejected_busy, ('in_flight',): executor.rejected_in_flight},
+                      kind='counter', labels=('reason',))
+    REGISTRY.function('bot_history_queue_depth', 'Запросы, ожидающие записи в историю', lambda: writer.queue_depth)
+    REGISTRY.function('bot_history_written_total', 'Запросы, записанные в историю', lambda: writer.written,
+                      kind='counter')
+    REGISTRY.function('bot_messages_sent_total', 'Сообщения, отправленные через очереди чатов', lambda: sender.sent,
+                      kind='counter')
+    REGISTRY.function('bot_messages_retried_total', 'Повторные отправки сообщений после ответа 429',
+                      lambda: sender.retried, kind='counter')
+    REGISTRY.function('bot_messages_failed_total', 'Сообщения, которые не удалось отправить', lambda: sender.failed,
+                      kind='counter')
+    REGISTRY.function('bot_send_queue_depth', 'Сообщения, ожидающие отправки', lambda: sender.queue_depth)
+
+    dialogs: Family[Gauge] = REGISTRY.gauge('bot_fsm_dialogs', 'Диалоги по состояниям', labels=('state',))
+
+    async def collect_dialogs() -> None:
+        counts: Optional[dict[str, int]] = await count_states(fsm_storage)
+        if counts is None:
+            return
+        # Состояния, в которых диалогов не осталось, обнуляются
+        for (state,), gauge in dialogs.children():
+            gauge.set(counts.get(state, 0))
+        for state, number in counts.items():
+            dialogs.labels(state).set(number)
+
+    REGISTRY.add_collector(collect_dialogs)
+
+
+async def on_startup(config: Config, dispatcher: Dispatcher) -> None:
+    """
+    Подключение к хранилищу истории запросов и запуск ее фоновой записи, перезагрузка конфига по SIGHUP. В режиме
+    long polling метрики процесса периодически записываются в файл (в режиме вебхука они доступны на странице сервера)
+    :param config: Конфиг
+    :type config: Config
+    :param dispatcher: Диспетчер
+    :type dispatcher: Dispatcher
+    :return: None
+    """
+    # Перезагрузка конфига по SIGHUP обрабатывается в цикле событий процесса
+    add_reload_listener(query_handlers.api_module.configure)
+    reload_on_sighup()
+    await query_handlers.history_storage.start(config.database)
+    await query_handlers.history_writer.start()
+    if config.metrics.enabled and not config.webhook.enabled:
+        metrics_file: MetricsFile = MetricsFile(config.metrics.file, config.metrics.interval)
+        await metrics_file.start()
+        dispatcher['metrics_file'] = metrics_file
+
+
+async def on_shutdown(dispatcher: Dispatcher) -> None:
+    """
+    Отправим сообщения из очередей, допишем историю запросов, закроем хранилища и общие HTTP-сессии для запросов к api
+    :param dispatcher: Диспетчер
+    :type dispatcher: Dispatcher
+    :return: None
+    """
+    await query_handlers.message_sender.stop()
+    await query_handlers.history_writer.stop()
+    await query_handlers.history_storage.close()
+    metrics_file: Optional[MetricsFile] = dispatcher.workflow_data.pop('metrics_file', None)
+    if metrics_file is not None:
+        await metrics_file.stop()
+    query_handlers.api_executor.shutdown()
+    await dispatcher.storage.close()
+    await close_sessions()
+    # Дождемся записи сообщений, которые еще в очереди фоновой записи логов
+    await logger.complete()
+
+
+@info_logger(log_level='DEBUG', message='Работа программы')
+async def main(config: Optional[Config] = None) -> None:
+    """
+    Основной скрипт телеграм бота (получение апдейтов через long polling)
+    :param config: Конфиг (если не передан, то используется общий конфиг процесса)
+    :type config: Optional[Config]
+    :return: None
+    """
+    # Настройка основных параметров бота
+    if config is None:
+        config = get_config()
+    bot: Bot = create_bot(config)
+    dp: Dispatcher = create_dispatcher(config)
+
+    # вывод кнопки меню
+    await set_main_menu(bot)
 
     # Удалим необработанные апдейты
     await bot.delete_webhook(drop_pending_updates=True)
     await dp.start_polling(bot)
 
 
+async def supervise(config: Config) -> None:
+    """
+    Супервизор long polling: получает апдейты и раздает их процессам-обработчикам по chat_id
+    :param config: Конфиг
+    :type config: Config
+    :return: None
+    """
+    bot: Bot = create_bot(config)
+    try:
+        await set_main_menu(bot)
+        await bot.delete_webhook(drop_pending_updates=True)
+    finally:
+        await bot.session.close()
+    await run_shards(shard_worker, config)
+
+
+def shard_worker(config: Config, updates: Queue) -> None:
+    """
+    Процесс, обрабатывающий апдейты своих чатов, которые ему передает супервизор
+    :param config: Конфиг
+    :type config: Config
+    :param updates: Очередь апдейтов
+    :type updates: Queue
+    :return: None
+    """
+    asyncio.run(process_shard(create_dispatcher(config), create_bot(config), updates))
+
+
+async def prepare_webhook(config: Config) -> None:
+    """
+    Установка кнопки меню и регистрация вебхука в телеграме (выполняется один раз, до запуска процессов)
+    :param config: Конфиг
+    :type config: Config
+    :return: None
+    """
+    bot: Bot = create_bot(config)
+    try:
+        await set_main_menu(bot)
+        if config.webhook.url:
+            await bot.set_webhook(url=config.webhook.url + config.webhook.path,
+                                  secret_token=config.webhook.secret or None,
+                                  drop_pending_updates=True)
+        else:
+            logger.warning('WEBHOOK_URL не задан, вебхук в телеграме не регистрируется')
+    finally:
+        await bot.session.close()
+
+
+async def serve_webhook(config: Config) -> None:
+    """
+    Прием апдейтов через вебхук в одном процессе
+    :param config: Конфиг
+    :type config: Config
+    :return: None
+    """
+    bot: Bot = create_bot(config)
+    app: web.Application = create_app(create_dispatcher(config), bot, config.webhook, config.metrics)
+    await serve(app, config.webhook)
+
+
+def webhook_worker(config: Config) -> None:
+    """
+    Процесс, принимающий апдейты через вебхук
+    :param config: Конфиг
+    :type config: Config
+    :return: None
+    """
+    asyncio.run(serve_webhook(config))
+
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    main_config: Config = get_config()
+    if main_config.webhook.enabled:
+        asyncio.run(prepare_webhook(main_config))
+        run_workers(webhook_worker, main_config, main_config.webhook.workers)
+    elif main_config.tg_bot.workers > 1:
+        asyncio.run(supervise(main_config))
+    else:
+        asyncio.run(main(main_config))
@@ -0,0 +1,5 @@
+"""Пакет с метриками бота"""
+from .histogram import Histogram
+from .registry import REGISTRY, Counter, Family, Gauge, Registry, timed
+from .exposition import CONTENT_TYPE, MetricsFile, metrics_handler, render_metrics
+from .middleware import HandlerMetricsMiddleware
@@ -0,0 +1,99 @@
+"""Модуль с выводом метрик: страница /metrics для сервера вебхука и периодическая запись метрик в файл для режима
+long polling (файл подходит для textfile collector у node_exporter). У каждого процесса бота свои метрики, поэтому
+в режиме нескольких процессов каждый процесс пишет свой файл"""
+import asyncio
+import multiprocessing
+import os
+from typing import Optional
+
+from aiohttp import web
+from loguru import logger
+
+from .registry import REGISTRY, Registry
+
+
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+async def render_metrics(registry: Registry = REGISTRY) -> str:
+    """
+    Функция обновляет асинхронно собираемые метрики и выводит все метрики в формате Prometheus
+    :param registry: Реестр метрик
+    :type registry: Registry
+    :return: Текст с метриками
+    :rtype: str
+    """
+    await registry.collect()
+    return registry.render()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """
+    Хэндлер aiohttp для страницы с метриками процесса
+    :param request: Запрос
+    :type request: web.Request
+    :return: Ответ с метриками
+    :rtype: web.Response
+    """
+    return web.Response(body=(await render_metrics()).encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+class MetricsFile:
+    """
+    Периодическая запись метрик процесса в файл. Файл заменяется целиком (через временный файл), поэтому читатель
+    никогда не видит его наполовину записанным
+
+    Args:
+        path (str): Путь к файлу. {process} заменяется именем процесса (MainProcess, shard-0, ...)
+        interval (float): Как часто (в секундах) записывать метрики
+        registry (Registry): Реестр метрик
+    """
+    def __init__(self, path: str, interval: float, registry: Registry = REGISTRY) -> None:
+        self.path: str = path.format(process=multiprocessing.current_process().name)
+        self.__interval: float = interval
+        self.__registry: Registry = registry
+        self.__task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Метод запускает фоновую запись метрик
+        :return: None
+        """
+        directory: str = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """
+        Метод останавливает фоновую запись и записывает итоговые метрики
+        :return: None
+        """
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
+        await self.dump()
+
+    async def dump(self) -> None:
+        """
+        Метод записывает текущие метрики в файл
+        :return: None
+        """
+        text: str = await render_metrics(self.__registry)
+        temporary: str = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temporary, self.path)
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(self.__interval)
+            try:
+                await self.dump()
+            except OSError as exc:
+                logger.warning(f'Не удалось записать метрики в {self.path}: {exc!r}')
@@ -0,0 +1,84 @@
+"""Модуль с гистограммой длительностей (как гистограммы Prometheus: накопительные корзины, сумма и количество)"""
+from bisect import bisect_left
+from threading import Lock
+from typing import Optional
+
+
+# Границы корзин в секундах: от быстрых ответов из кэша до долгих запросов к API с повторами
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """
+    Гистограмма наблюдаемых значений. Значение попадает в первую корзину, граница которой не меньше него,
+    значения больше последней границы - в корзину +Inf
+
+    Args:
+        buckets (tuple[float, ...]): Возрастающие границы корзин
+
+    Attributes:
+        count (int): Количество наблюдений
+        sum (float): Сумма наблюдений
+    """
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.__lock: Lock = Lock()
+        self.__bounds: tuple[float, ...] = tuple(sorted(buckets))
+        self.__counts: list[int] = [0] * (len(self.__bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    @property
+    def bounds(self) -> tuple[float, ...]:
+        return self.__bounds
+
+    def observe(self, value: float) -> None:
+        """
+        Метод добавляет наблюдение
+        :param value: Значение
+        :type value: float
+        :return: None
+        """
+        with self.__lock:
+            self.__counts[bisect_left(self.__bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """
+        Метод возвращает накопительные количества: для каждой границы - сколько наблюдений не больше нее
+        :return: Пары (граница, количество), последняя граница - inf
+        :rtype: list[tuple[float, int]]
+        """
+        with self.__lock:
+            counts: list[int] = list(self.__counts)
+        result: list[tuple[float, int]] = list()
+        total: int = 0
+        for bound, bucket_count in zip(self.__bounds + (float('inf'),), counts):
+            total += bucket_count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Метод оценивает квантиль по корзинам (линейная интерполяция внутри корзины, как histogram_quantile)
+        :param q: Квантиль от 0 до 1
+        :type q: float
+        :return: Оценка квантиля или None, если наблюдений нет
+        :rtype: Optional[float]
+        """
+        buckets: list[tuple[float, int]] = self.buckets()
+        total: int = buckets[-1][1]
+        if total == 0:
+            return None
+        rank: float = q * total
+        lower_bound: float = 0.0
+        lower_count: int = 0
+        for bound, cumulative in buckets:
+            if cumulative >= rank:
+                if bound == float('inf'):
+                    return lower_bound
+                if cumulative == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+            lower_bound, lower_count = bound, cumulative
+        return lower_bound
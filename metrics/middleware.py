@@ -0,0 +1,49 @@
+"""Модуль с middleware, которое записывает в метрики длительность обработки сообщений по командам"""
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from .histogram import Histogram
+from .registry import Family
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Middleware для сообщений: длительность обработки записывается в гистограмму с меткой command. Метка - команда
+    сообщения (/low, /history, ...), а для шагов диалога - состояние, в котором пришло сообщение (например,
+    FSMQuery:fill_number - ввод числа, после которого выполняется поиск). Так количество меток ограничено
+
+    Args:
+        durations (Family[Histogram]): Семейство гистограмм с меткой command
+        commands (Iterable[str]): Команды бота; остальные команды попадают в метку other command
+    """
+    def __init__(self, durations: Family[Histogram], commands: Iterable[str]) -> None:
+        self.__durations: Family[Histogram] = durations
+        self.__commands: frozenset[str] = frozenset(commands)
+
+    def command_of(self, message: Message, raw_state: Optional[str]) -> str:
+        """
+        Метод возвращает метку сообщения
+        :param message: Сообщение
+        :type message: Message
+        :param raw_state: Состояние диалога
+        :type raw_state: Optional[str]
+        :return: Метка
+        :rtype: str
+        """
+        text: str = message.text or ''
+        if text.startswith('/'):
+            command: str = text.split(maxsplit=1)[0].split('@', 1)[0].lower()
+            return command if command in self.__commands else 'other command'
+        return raw_state or 'other'
+
+    async def __call__(self, handler: Callable[[Message, dict[str, Any]], Awaitable[Any]], event: Message,
+                       data: dict[str, Any]) -> Any:
+        started: float = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.__durations.labels(self.command_of(event, data.get('raw_state'))).observe(
+                time.perf_counter() - started)
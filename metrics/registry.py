@@ -0,0 +1,308 @@
+"""Модуль с реестром метрик: счетчики, значения (gauge) и гистограммы с метками, которые выводятся в текстовом
+формате Prometheus. Метрики процесса регистрируются в общем реестре REGISTRY"""
+import functools
+import inspect
+import math
+from threading import Lock
+import time
+from typing import Any, Awaitable, Callable, Generic, Optional, TypeVar
+
+from loguru import logger
+
+from .histogram import DEFAULT_BUCKETS, Histogram
+
+
+class Counter:
+    """Счетчик, который только растет (количество запросов, ошибок и т.п.)"""
+    def __init__(self) -> None:
+        self.__lock: Lock = Lock()
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        with self.__lock:
+            self.value += amount
+
+
+class Gauge:
+    """Текущее значение (длина очереди, количество диалогов и т.п.)"""
+    def __init__(self) -> None:
+        self.value: float = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+T = TypeVar('T', Counter, Gauge, Histogram)
+
+
+class Family(Generic[T]):
+    """
+    Метрика с метками: для каждого набора значений меток создается своя метрика (при первом обращении)
+
+    Args:
+        labels (tuple[str, ...]): Имена меток
+        factory (Callable[[], T]): Функция, создающая метрику для нового набора значений
+    """
+    def __init__(self, labels: tuple[str, ...], factory: Callable[[], T]) -> None:
+        self.__lock: Lock = Lock()
+        self.__factory: Callable[[], T] = factory
+        self.__children: dict[tuple[str, ...], T] = dict()
+        self.label_names: tuple[str, ...] = labels
+
+    def labels(self, *values: Any) -> T:
+        """
+        Метод возвращает метрику для значений меток (в порядке имен меток)
+        :param values: Значения меток
+        :type values: Any
+        :return: Метрика
+        :rtype: T
+        """
+        key: tuple[str, ...] = tuple(str(value) for value in values)
+        child: Optional[T] = self.__children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f'Ожидались метки {self.label_names}, получено {key}')
+            with self.__lock:
+                child = self.__children.setdefault(key, self.__factory())
+        return child
+
+    def children(self) -> list[tuple[tuple[str, ...], T]]:
+        with self.__lock:
+            return list(self.__children.items())
+
+
+class Registry:
+    """
+    Реестр метрик процесса. Метрики создаются один раз (обычно на уровне модуля) и дальше только обновляются.
+    Значения, которые уже считают сами объекты (попадания в кэш, длина очереди), регистрируются функцией
+    и читаются только при выводе метрик, а значения, которые нужно получить асинхронно (например, из бд), обновляют
+    асинхронные сборщики перед выводом
+    """
+    def __init__(self) -> None:
+        self.__lock: Lock = Lock()
+        # Имя -> (тип, описание, метрика, семейство или (имена меток, функция))
+        self.__metrics: dict[str, tuple[str, str, Any]] = dict()
+        self.__collectors: list[Callable[[], Awaitable[None]]] = list()
+
+    def __add(self, name: str, kind: str, documentation: str, metric: Any) -> Any:
+        with self.__lock:
+            if name in self.__metrics:
+                raise ValueError(f'Метрика {name} уже зарегистрирована')
+            self.__metrics[name] = (kind, documentation, metric)
+        return metric
+
+    def __get_or_add(self, name: str, kind: str, documentation: str, labels: tuple[str, ...],
+                     factory: Callable[[], Any]) -> Any:
+        """
+        Метод возвращает уже зарегистрированную метрику с тем же именем, типом и метками (модуль с метриками мог
+        быть импортирован дважды, например, как __main__ и как пакет) или регистрирует новую
+        """
+        with self.__lock:
+            registered: Optional[tuple[str, str, Any]] = self.__metrics.get(name)
+            if registered is None:
+                metric: Any = factory()
+                self.__metrics[name] = (kind, documentation, metric)
+                return metric
+        registered_kind, _, metric = registered
+        registered_labels: Optional[tuple[str, ...]] = metric.label_names if isinstance(metric, Family) \
+            else (() if isinstance(metric, (Counter, Gauge, Histogram)) else None)
+        if registered_kind != kind or registered_labels != labels:
+            raise ValueError(f'Метрика {name} уже зарегистрирована с другим типом или метками')
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Counter | Family[Counter]:
+        """
+        Метод создает счетчик (с метками - семейство счетчиков). Если счетчик с тем же именем и метками уже есть,
+        то возвращается он
+        :param name: Имя метрики (для счетчиков принято окончание _total)
+        :type name: str
+        :param documentation: Описание
+        :type documentation: str
+        :param labels: Имена меток
+        :type labels: tuple[str, ...]
+        :return: Счетчик или семейство
+        :rtype: Counter | Family[Counter]
+        """
+        return self.__get_or_add(name, 'counter', documentation, labels,
+                                 lambda: Family(labels, Counter) if labels else Counter())
+
+    def gauge(self, name: str, documentation: str, labels: tuple[str, ...] = ()) -> Gauge | Family[Gauge]:
+        """
+        Метод создает значение (с метками - семейство значений). Если оно с тем же именем и метками уже есть,
+        то возвращается оно
+        :param name: Имя метрики
+        :type name: str
+        :param documentation: Описание
+        :type documentation: str
+        :param labels: Имена меток
+        :type labels: tuple[str, ...]
+        :return: Значение или семейство
+        :rtype: Gauge | Family[Gauge]
+        """
+        return self.__get_or_add(name, 'gauge', documentation, labels,
+                                 lambda: Family(labels, Gauge) if labels else Gauge())
+
+    def histogram(self, name: str, documentation: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram | Family[Histogram]:
+        """
+        Метод создает гистограмму (с метками - семейство гистограмм). Если гистограмма с тем же именем и метками
+        уже есть, то возвращается она
+        :param name: Имя метрики (для длительностей принято окончание _seconds)
+        :type name: str
+        :param documentation: Описание
+        :type documentation: str
+        :param labels: Имена меток
+        :type labels: tuple[str, ...]
+        :param buckets: Границы корзин
+        :type buckets: tuple[float, ...]
+        :return: Гистограмма или семейство
+        :rtype: Histogram | Family[Histogram]
+        """
+        return self.__get_or_add(name, 'histogram', documentation, labels,
+                                 lambda: Family(labels, lambda: Histogram(buckets)) if labels else Histogram(buckets))
+
+    def register(self, name: str, documentation: str, histogram: Histogram) -> None:
+        """
+        Метод регистрирует уже существующую гистограмму (например, гистограмму исполнителя запросов)
+        :param name: Имя метрики
+        :type name: str
+        :param documentation: Описание
+        :type documentation: str
+        :param histogram: Гистограмма
+        :type histogram: Histogram
+        :return: None
+        """
+        self.__add(name, 'histogram', documentation, histogram)
+
+    def function(self, name: str, documentation: str, func: Callable[[], float | dict[tuple[str, ...], float]],
+                 kind: str = 'gauge', labels: tuple[str, ...] = ()) -> None:
+        """
+        Метод регистрирует метрику, значение которой при выводе возвращает func. С метками func возвращает словарь
+        {значения меток: значение}
+        :param name: Имя метрики
+        :type name: str
+        :param documentation: Описание
+        :type documentation: str
+        :param func: Функция без аргументов
+        :type func: Callable[[], float | dict[tuple[str, ...], float]]
+        :param kind: Тип метрики: counter или gauge
+        :type kind: str
+        :param labels: Имена меток
+        :type labels: tuple[str, ...]
+        :return: None
+        """
+        self.__add(name, kind, documentation, (labels, func))
+
+    def add_collector(self, collector: Callable[[], Awaitable[None]]) -> None:
+        """
+        Метод добавляет асинхронный сборщик, который обновляет метрики перед выводом (см. collect)
+        :param collector: Корутинная функция без аргументов
+        :type collector: Callable[[], Awaitable[None]]
+        :return: None
+        """
+        with self.__lock:
+            self.__collectors.append(collector)
+
+    async def collect(self) -> None:
+        """
+        Метод запускает асинхронные сборщики. Ошибка сборщика не мешает выводу остальных метрик
+        :return: None
+        """
+        with self.__lock:
+            collectors: list[Callable[[], Awaitable[None]]] = list(self.__collectors)
+        for collector in collectors:
+            try:
+                await collector()
+            except Exception as exc:
+                logger.warning(f'Сборщик метрик {collector.__qualname__} завершился с ошибкой: {exc!r}')
+
+    def render(self) -> str:
+        """
+        Метод выводит метрики в текстовом формате Prometheus (версия 0.0.4)
+        :return: Текст с метриками
+        :rtype: str
+        """
+        with self.__lock:
+            metrics: list[tuple[str, tuple[str, str, Any]]] = sorted(self.__metrics.items())
+        lines: list[str] = list()
+        for name, (kind, documentation, metric) in metrics:
+            lines.append(f'# HELP {name} {_escape_help(documentation)}')
+            lines.append(f'# TYPE {name} {kind}')
+            if isinstance(metric, tuple):
+                label_names, func = metric
+                values: float | dict[tuple[str, ...], float] = func()
+                samples: list[tuple[tuple[str, ...], Any]] = list(values.items()) if label_names \
+                    else [((), values)]
+            elif isinstance(metric, Family):
+                label_names, samples = metric.label_names, metric.children()
+            else:
+                label_names, samples = (), [((), metric)]
+
+            for label_values, sample in samples:
+                labels: str = ','.join(f'{label}="{_escape_label(str(value))}"'
+                                       for label, value in zip(label_names, label_values))
+                if isinstance(sample, Histogram):
+                    for bound, cumulative in sample.buckets():
+                        bucket_labels: str = f'{labels},le="{_format(bound)}"' if labels else f'le="{_format(bound)}"'
+                        lines.append(f'{name}_bucket{{{bucket_labels}}} {cumulative}')
+                    suffix: str = f'{{{labels}}}' if labels else ''
+                    lines.append(f'{name}_sum{suffix} {_format(sample.sum)}')
+                    lines.append(f'{name}_count{suffix} {sample.count}')
+                else:
+                    value: float = sample.value if isinstance(sample, (Counter, Gauge)) else sample
+                    lines.append(f'{name}{{{labels}}} {_format(value)}' if labels else f'{name} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format(value: float) -> str:
+    """Число в формате Prometheus"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def timed(histogram: Histogram) -> Callable:
+    """
+    Декоратор, который записывает в гистограмму длительность каждого вызова функции (и синхронной, и async def),
+    в том числе завершившегося исключением
+    :param histogram: Гистограмма (для семейства - уже выбранная по меткам: family.labels(...))
+    :type histogram: Histogram
+    :return: Обернутую функцию
+    :rtype: Callable
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                started: float = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            started: float = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# Общий реестр метрик процесса
+REGISTRY: Registry = Registry()
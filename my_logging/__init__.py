@@ -1,2 +1,3 @@
 """Пакет для логгирования"""
 from .loggers import info_logger
+from .setup import setup_logging, level_enabled, payload, sampled, LOG_FORMAT
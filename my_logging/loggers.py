@@ -2,12 +2,20 @@
 from loguru import logger
 from typing import Callable, Any, Literal
 import functools
+import inspect
+import time
+
+from .setup import level_enabled
 
 
 def info_logger(log_level: Literal['CRITICAL', 'ERROR', 'SUCCESS', 'WARNING', 'INFO', 'DEBUG'],
                 message: str) -> Callable:
     """
-    Декоратор для логгирования
+    Декоратор для логгирования: после каждого вызова функции пишет в лог, сколько он длился, а если функция
+    выбросила исключение - и исключение. Уровень проверяется один раз при декорировании: если он отключен
+    настройками логгирования (LOG_PRESET, LOG_LEVEL), то функция возвращается без обертки и вызов ничего не стоит.
+    Поддерживает async def функции. Местом записи указывается декорированная функция (модуль, имя и строка
+    определения)
     :param log_level: Уровень логгирования
     :type log_level: Literal['CRITICAL', 'ERROR', 'SUCCESS', 'WARNING', 'INFO', 'DEBUG']
     :param message: Сообщение в лог
@@ -16,20 +24,44 @@ def info_logger(log_level: Literal['CRITICAL', 'ERROR', 'SUCCESS', 'WARNING', 'I
     :rtype: Callable
     """
     def log_wrapper(func: Callable) -> Callable:
+        if not level_enabled(log_level):
+            return func
+
+        name: str = func.__qualname__
+        module: str = func.__module__
+        line: int = getattr(getattr(func, '__code__', None), 'co_firstlineno', 0)
+
+        def locate(record: dict) -> None:
+            # Место записи - декорированная функция, а не обертка: место вызова для async def (цикл событий)
+            # и для функций в потоках (исполнитель) ничего не говорит
+            record.update(name=module, module=module.rpartition('.')[2], function=name, line=line)
+
+        log: Callable = logger.patch(locate).log
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                started: float = time.perf_counter()
+                try:
+                    result: Any = await func(*args, **kwargs)
+                except BaseException as error:
+                    log(log_level, '{} - {}: ошибка {!r} через {:.2f} мс',
+                        name, message, error, (time.perf_counter() - started) * 1000)
+                    raise
+                log(log_level, '{} - {}: {:.2f} мс', name, message, (time.perf_counter() - started) * 1000)
+                return result
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            if log_level == 'CRITICAL':
-                logger.critical('{name} - {message}'.format(name=func.__name__, message=message))
-            elif log_level == 'ERROR':
-                logger.error('{name} - {message}'.format(name=func.__name__, message=message))
-            elif log_level == 'SUCCESS':
-                logger.success('{name} - {message}'.format(name=func.__name__, message=message))
-            elif log_level == 'WARNING':
-                logger.warning('{name} - {message}'.format(name=func.__name__, message=message))
-            elif log_level == 'INFO':
-                logger.info('{name} - {message}'.format(name=func.__name__, message=message))
-            elif log_level == 'DEBUG':
-                logger.debug('{name} - {message}'.format(name=func.__name__, message=message))
-                return func(*args, **kwargs)
+            started: float = time.perf_counter()
+            try:
+                result: Any = func(*args, **kwargs)
+            except BaseException as error:
+                log(log_level, '{} - {}: ошибка {!r} через {:.2f} мс',
+                    name, message, error, (time.perf_counter() - started) * 1000)
+                raise
+            log(log_level, '{} - {}: {:.2f} мс', name, message, (time.perf_counter() - started) * 1000)
+            return result
         return wrapper
     return log_wrapper
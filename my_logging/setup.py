@@ -0,0 +1,120 @@
+"""Модуль с настройкой логгирования. На горячем пути (обработка каждого поиска) сообщения не должны стоить дорого:
+- запись в файл может идти из фонового потока (enqueue), и вызов логгера не ждет диска;
+- аргументы сообщения передаются отдельно (logger.debug('... {}', value)), и loguru форматирует сообщение, только если
+  его уровень включен, а дорогие значения оборачиваются в logger.opt(lazy=True) и вычисляются так же лениво;
+- большие объекты оборачиваются в payload: их представление ограничено по длине и строится только при записи;
+- частые однотипные сообщения пишутся через sampled и в файл попадает только их доля"""
+import random
+import reprlib
+from typing import Any, Optional
+
+from environs import EnvError
+from loguru import logger
+
+from config_data import Logging, get_config
+
+
+LOG_FORMAT: str = '<lvl>[</lvl><c>{time:DD.MM.YYYY HH:mm:ss}</c><lvl>]</lvl> <lvl>{level}:</lvl> <lvl>{message}</lvl>'
+
+# Представление больших объектов: не больше нескольких элементов коллекций и payload_limit символов
+_payload_repr: reprlib.Repr = reprlib.Repr()
+_payload_repr.maxlist = _payload_repr.maxtuple = _payload_repr.maxdict = _payload_repr.maxset = 5
+_payload_limit: int = Logging().payload_limit
+_sample_rate: float = Logging().sample_rate
+_level_no: Optional[int] = None  # Номер минимального записываемого уровня
+
+# Логгер для частых однотипных сообщений (успешные запросы, статистика кэшей): в файл попадает sample_rate из них
+sampled = logger.bind(sampled=True)
+
+
+class Payload:
+    """
+    Обертка для большого объекта в сообщении лога. Представление строится только при форматировании сообщения
+    (то есть если уровень сообщения включен) и ограничено по размеру, поэтому не зависит от длины объекта
+
+    Args:
+        obj (Any): Объект
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj: Any) -> None:
+        self.obj: Any = obj
+
+    def __format__(self, format_spec: str) -> str:
+        text: str = _payload_repr.repr(self.obj)
+        if len(text) > _payload_limit:
+            text = text[:_payload_limit] + '...'
+        return format(text, format_spec)
+
+    def __str__(self) -> str:
+        return self.__format__('')
+
+
+def payload(obj: Any) -> Payload:
+    """
+    Функция оборачивает объект для записи в лог (см. Payload): logger.warning('Ответ: {}', payload(response))
+    :param obj: Объект
+    :type obj: Any
+    :return: Обертка
+    :rtype: Payload
+    """
+    return Payload(obj)
+
+
+def sample_filter(record: dict) -> bool:
+    """
+    Фильтр записей: сообщения, отправленные через sampled, пропускаются с вероятностью sample_rate
+    :param record: Запись loguru
+    :type record: dict
+    :return: Писать ли запись
+    :rtype: bool
+    """
+    return not record['extra'].get('sampled') or _sample_rate >= 1 or random.random() < _sample_rate
+
+
+def level_enabled(level: str) -> bool:
+    """
+    Функция проверяет, записываются ли сообщения уровня level. До вызова setup_logging уровень берется из общего
+    конфига процесса (того же, по которому потом настраивается логгирование), поэтому проверка работает и при импорте
+    модулей. Если конфиг загрузить нельзя (скрипт запущен без настроек бота), то используется уровень по умолчанию
+    :param level: Уровень
+    :type level: str
+    :return: Записываются ли сообщения
+    :rtype: bool
+    """
+    global _level_no
+
+    if _level_no is None:
+        try:
+            _level_no = logger.level(get_config().logging.level).no
+        except EnvError:
+            # Без конфига логгирование не будет настроено по нему, поэтому уровень не запоминается
+            return logger.level(level).no >= logger.level(Logging().level).no
+    return logger.level(level).no >= _level_no
+
+
+def setup_logging(settings: Logging) -> None:
+    """
+    Функция настраивает запись логов в файл по настройкам (вызывается при запуске каждого процесса бота)
+    :param settings: Настройки логгирования
+    :type settings: Logging
+    :return: None
+    """
+    global _payload_limit, _sample_rate, _level_no
+
+    _level_no = logger.level(settings.level).no
+    _payload_limit = settings.payload_limit
+    _payload_repr.maxstring = _payload_repr.maxother = max(settings.payload_limit // 4, 20)
+    _sample_rate = settings.sample_rate
+
+    logger.remove()
+    logger.add(settings.path,
+               format=LOG_FORMAT,
+               level=settings.level,
+               filter=sample_filter,
+               enqueue=settings.enqueue,
+               backtrace=settings.diagnose,
+               diagnose=settings.diagnose,
+               retention='1 days',
+               rotation='00:01',
+               compression='zip')
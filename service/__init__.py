@@ -1,2 +1,3 @@
 """Пакет с вспомогательными функциями"""
-from .service import adjusting_length_message
+from .service import MAX_MSG_LENGTH, adjusting_length_message, normalize_product, split_message
+from .sender import MessageSender
@@ -0,0 +1,178 @@
+"""Модуль с отправкой сообщений бота с учетом лимитов телеграма: у каждого чата своя очередь и свой ограничитель,
+а все чаты вместе проходят через общий ограничитель. Сообщения одного чата уходят строго по порядку, а сообщения
+разных чатов - параллельно. Если телеграм все же ответил 429, то сообщение отправляется снова через retry_after"""
+import asyncio
+from collections import deque
+from typing import Any, Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+from loguru import logger
+
+from api.rate_limit import TokenBucket
+
+
+class _Chat:
+    """Очередь сообщений чата, его ограничитель и задача, которая отправляет сообщения из очереди"""
+    __slots__ = ('queue', 'limiter', 'task', 'forget')
+
+    def __init__(self, limiter: TokenBucket) -> None:
+        self.queue: deque[tuple[Bot, str, dict[str, Any], asyncio.Future]] = deque()
+        self.limiter: TokenBucket = limiter
+        self.task: Optional[asyncio.Task] = None
+        self.forget: Optional[asyncio.TimerHandle] = None
+
+
+class MessageSender:
+    """
+    Отправитель сообщений бота. Задача отправки чата создается при первом сообщении в очереди и завершается, когда
+    очередь пуста, а ограничитель чата хранится, пока снова не наполнится (иначе новый ограничитель разрешил бы
+    лишний всплеск)
+
+    Args:
+        rate (float): Сообщений в секунду во все чаты
+        burst (int): Максимальный всплеск сообщений во все чаты
+        chat_rate (float): Сообщений в секунду в один чат
+        chat_burst (int): Сколько сообщений подряд можно отправить в один чат без паузы
+        max_attempts (int): Сколько раз отправлять сообщение, если телеграм просит подождать
+
+    Attributes:
+        sent (int): Количество отправленных сообщений
+        retried (int): Количество повторных отправок после ответа 429
+        failed (int): Количество сообщений, которые не удалось отправить
+    """
+    def __init__(self, rate: float = 30, burst: int = 30, chat_rate: float = 1, chat_burst: int = 3,
+                 max_attempts: int = 4) -> None:
+        self.__limiter: TokenBucket = TokenBucket(rate=rate, capacity=burst)
+        self.__chat_rate: float = chat_rate
+        self.__chat_burst: int = chat_burst
+        self.__max_attempts: int = max_attempts
+        self.__chats: dict[int, _Chat] = dict()
+        self.__closed: bool = False
+
+        self.sent: int = 0
+        self.retried: int = 0
+        self.failed: int = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество сообщений, ожидающих отправки"""
+        return sum(len(chat.queue) for chat in self.__chats.values())
+
+    @property
+    def active_chats(self) -> int:
+        """Количество чатов, в которые сейчас отправляются сообщения"""
+        return sum(chat.task is not None for chat in self.__chats.values())
+
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs: Any) -> Message:
+        """
+        Метод ставит сообщение в очередь чата и ждет его отправки
+        :param bot: Бот
+        :type bot: Bot
+        :param chat_id: id чата
+        :type chat_id: int
+        :param text: Текст сообщения
+        :type text: str
+        :param kwargs: Остальные параметры sendMessage
+        :type kwargs: Any
+        :return: Отправленное сообщение
+        :rtype: Message
+        """
+        return await self.__enqueue(bot, chat_id, text, kwargs)
+
+    async def send_many(self, bot: Bot, chat_id: int, texts: Iterable[str], **kwargs: Any) -> list[Message]:
+        """
+        Метод ставит в очередь чата несколько сообщений подряд (например, части длинного ответа) и ждет их отправки.
+        Сообщения другого хэндлера этого чата не вклиниваются между ними
+        :param bot: Бот
+        :type bot: Bot
+        :param chat_id: id чата
+        :type chat_id: int
+        :param texts: Тексты сообщений по порядку
+        :type texts: Iterable[str]
+        :param kwargs: Остальные параметры sendMessage (общие для всех сообщений)
+        :type kwargs: Any
+        :return: Отправленные сообщения
+        :rtype: list[Message]
+        """
+        futures: list[asyncio.Future] = [self.__enqueue(bot, chat_id, text, kwargs) for text in texts]
+        return list(await asyncio.gather(*futures))
+
+    async def stop(self) -> None:
+        """
+        Метод отправляет все, что осталось в очередях, и перестает принимать новые сообщения
+        :return: None
+        """
+        self.__closed = True
+        tasks: list[asyncio.Task] = [chat.task for chat in self.__chats.values() if chat.task is not None]
+        if tasks:
+            await asyncio.wait(tasks)
+        for chat in self.__chats.values():
+            if chat.forget is not None:
+                chat.forget.cancel()
+        self.__chats.clear()
+
+    def __enqueue(self, bot: Bot, chat_id: int, text: str, kwargs: dict[str, Any]) -> asyncio.Future:
+        if self.__closed:
+            raise RuntimeError('Отправка сообщений остановлена')
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        chat: Optional[_Chat] = self.__chats.get(chat_id)
+        if chat is None:
+            chat = self.__chats[chat_id] = _Chat(TokenBucket(rate=self.__chat_rate, capacity=self.__chat_burst))
+        if chat.forget is not None:
+            chat.forget.cancel()
+            chat.forget = None
+
+        future: asyncio.Future = loop.create_future()
+        chat.queue.append((bot, text, kwargs, future))
+        if chat.task is None:
+            chat.task = loop.create_task(self.__run(chat_id, chat))
+        return future
+
+    async def __run(self, chat_id: int, chat: _Chat) -> None:
+        try:
+            while chat.queue:
+                bot, text, kwargs, future = chat.queue.popleft()
+                if future.done():
+                    continue  # Хэндлер перестал ждать (отменен), сообщение уже не нужно
+                try:
+                    message: Message = await self.__send(bot, chat_id, chat, text, kwargs)
+                except Exception as exc:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(exc)
+                else:
+                    self.sent += 1
+                    if not future.done():
+                        future.set_result(message)
+        finally:
+            chat.task = None
+            if chat.queue:
+                # Задачу отменили (остановка цикла событий): оставшиеся сообщения не будут отправлены
+                for *_, future in chat.queue:
+                    future.cancel()
+                chat.queue.clear()
+            chat.forget = asyncio.get_running_loop().call_later(chat.limiter.refill_time(), self.__forget,
+                                                                chat_id, chat)
+
+    def __forget(self, chat_id: int, chat: _Chat) -> None:
+        if self.__chats.get(chat_id) is chat and chat.task is None and not chat.queue:
+            del self.__chats[chat_id]
+
+    async def __send(self, bot: Bot, chat_id: int, chat: _Chat, text: str, kwargs: dict[str, Any]) -> Message:
+        attempt: int = 1
+        while True:
+            # Общий токен берется только после токена чата: ожидающие чаты не занимают общий лимит
+            await chat.limiter.aacquire()
+            await self.__limiter.aacquire()
+            try:
+                return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except TelegramRetryAfter as exc:
+                if attempt >= self.__max_attempts:
+                    raise
+                # Пауза только для этого чата: если превышен общий лимит, то 429 получат все чаты и встанут сами
+                chat.limiter.block(exc.retry_after)
+                self.retried += 1
+                attempt += 1
+                logger.warning('Телеграм просит подождать {} с перед отправкой в чат {}', exc.retry_after, chat_id)
@@ -1,48 +1,185 @@
 """Модуль с вспомогательными функциями"""
+import re
+from typing import Optional
+
+
 MAX_MSG_LENGTH: int = 4096
+# Теги и сущности HTML (parse_mode='HTML'): внутри них сообщение резать нельзя
+HTML_TOKEN: re.Pattern = re.compile(r'<(/?)([a-zA-Z][\w-]*)?[^<>]*>|&(?:#\d+|#x[0-9a-fA-F]+|\w+);')
+
+
+def normalize_product(product: str) -> str:
+    """
+    Функция приводит ключевое слово к каноническому виду (нижний регистр, одиночные пробелы), чтобы одинаковые
+    по смыслу запросы совпадали
+    :param product: Ключевое слово
+    :type product: str
+    :return: Нормализованное ключевое слово
+    :rtype: str
+    """
+    return ' '.join(product.lower().split())
 
 
-def adjusting_length_message(response_list: list[str]) -> list[str]:
+def adjusting_length_message(response_list: list[str], limit: int = MAX_MSG_LENGTH) -> list[str]:
     """
-    Метод получает список строк и красиво их компанует под максимальную длину сообщений телеграмма
+    Метод получает список строк и красиво их компанует под максимальную длину сообщений телеграмма: строки
+    соединяются переносом и не разрываются между сообщениями, а слишком длинная строка разбивается split_message
     :param response_list: Список строк
     :type response_list: list[str]
+    :param limit: Максимальная длина сообщения
+    :type limit: int
     :return: Список сообщений
     :rtype: list[str]
     """
     result_messages: list[str] = list()
     current_message: list[str] = list()
-    line_breaker_number: int = 0
     current_length: int = 0
 
     for string in response_list:
-        if current_length + len(string) + line_breaker_number < MAX_MSG_LENGTH:
-            # Если новая строка влезает в предел (с учетом переноса строки), то добавляем ее в текущее сообщение
-            current_length += len(string) + 1
-            line_breaker_number += 1
+        # Длина сообщения, если добавить строку (с переносом перед ней)
+        new_length: int = current_length + len(string) + (1 if current_message else 0)
+        if new_length <= limit:
             current_message.append(string)
+            current_length = new_length
+            continue
+
+        if current_message:
+            result_messages.append('\n'.join(current_message))
+        if len(string) > limit:
+            # Строка не влезает даже в отдельное сообщение - разбиваем ее
+            result_messages.extend(split_message(string, limit))
+            current_message, current_length = list(), 0
         else:
-            if len(current_message) != 0:
-                # Если мы достигли предела, то добавим в итоговый список сообщений все, что влезло
-                result_messages.append('\n'.join(current_message))
-
-            # Текущая string может превышать предел длины сообщений
-            if len(string) > MAX_MSG_LENGTH:
-                # Будем разбивать string на несколько сообщений
-                while len(string) > 0:
-                    result_messages.append(string[:MAX_MSG_LENGTH])
-                    string = string[MAX_MSG_LENGTH:]
-                line_breaker_number = 0
-                current_message = list()
-                current_length = 0
-            else:
-                # Иначе все обнуляем
-                line_breaker_number = 1
-                current_message = [string]
-                current_length = len(string) + 1
-
-    # Последние string могли не достигнуть предела, поэтому их отдельно нужно добавить в результатные сообщения
-    if len(current_message) != 0:
-        result_messages.append('\n'.join(current_message))
+            current_message, current_length = [string], len(string)
 
+    # Последние строки могли не достигнуть предела, поэтому их отдельно нужно добавить в результатные сообщения
+    if current_message:
+        result_messages.append('\n'.join(current_message))
     return result_messages
+
+
+def split_message(text: str, limit: int = MAX_MSG_LENGTH) -> list[str]:
+    """
+    Функция разбивает текст с HTML-разметкой телеграма на сообщения не длиннее limit за один проход по тексту.
+    Разрыв делается по последнему переносу строки, если его нет - по пробелу (и то и другое - только во второй
+    половине сообщения, чтобы сообщения не получались короткими), иначе - по границе limit, но никогда внутри тега
+    или сущности (&amp;).
+    Теги, открытые в месте разрыва, закрываются в конце сообщения и заново открываются в начале следующего,
+    поэтому каждое сообщение - корректная разметка. Разделитель в месте разрыва в сообщения не попадает
+    :param text: Текст
+    :type text: str
+    :param limit: Максимальная длина сообщения
+    :type limit: int
+    :return: Список сообщений
+    :rtype: list[str]
+    :raises ValueError: Если тег или открытые теги вместе с закрывающими не помещаются в limit
+    """
+    messages: list[str] = list()
+    # Открытые теги в начале текущего сообщения: (имя, открывающий тег)
+    stack: tuple[tuple[str, str], ...] = ()
+    prefix: str = ''
+    pos: int = 0
+
+    while len(prefix) + len(text) - pos > limit:
+        hi: int = pos + limit - len(prefix)
+        while True:
+            cut, cut_stack, skip = _find_cut(text, pos, hi, stack)
+            closing: str = ''.join(f'</{name}>' for name, _ in reversed(cut_stack))
+            overflow: int = len(prefix) + cut - pos + len(closing) - limit
+            if overflow <= 0:
+                break
+            # Закрывающие теги не влезли - ищем разрыв левее
+            hi -= overflow
+            if hi <= pos:
+                raise ValueError(f'Открытые теги не помещаются в сообщение длиной {limit}')
+
+        messages.append(prefix + text[pos:cut] + closing)
+        stack = cut_stack
+        prefix = ''.join(tag for _, tag in stack)
+        pos = cut + skip
+
+    if pos < len(text):
+        messages.append(prefix + text[pos:])
+    return messages
+
+
+def _find_cut(text: str, pos: int, hi: int,
+              stack: tuple[tuple[str, str], ...]) -> tuple[int, tuple[tuple[str, str], ...], int]:
+    """
+    Функция выбирает место разрыва в text[pos:hi] (см. split_message)
+    :param text: Текст
+    :type text: str
+    :param pos: Начало сообщения
+    :type pos: int
+    :param hi: Граница, дальше которой сообщение не может продолжаться
+    :type hi: int
+    :param stack: Открытые теги в pos
+    :type stack: tuple[tuple[str, str], ...]
+    :return: Место разрыва, открытые в нем теги и длина разделителя, который пропускается (0 или 1)
+    :rtype: tuple[int, tuple[tuple[str, str], ...], int]
+    :raises ValueError: Если тег в начале сообщения длиннее окна
+    """
+    # Теги и сущности в окне: ни один разрыв не должен попасть внутрь них
+    tokens: list[re.Match] = list()
+    for match in HTML_TOKEN.finditer(text, pos):
+        if match.start() >= hi:
+            break
+        tokens.append(match)
+    # Если граница попала внутрь тега или сущности, то сообщение заканчивается перед ним
+    if tokens and tokens[-1].end() > hi:
+        hi = tokens[-1].start()
+        tokens.pop()
+        if hi <= pos:
+            raise ValueError(f'Тег не помещается в сообщение: {text[pos:pos + 50]}...')
+
+    cut: Optional[int] = None
+    skip: int = 0
+    middle: int = pos + (hi - pos) // 2
+    for separator in ('\n', ' '):
+        index: int = text.rfind(separator, middle, hi + 1)
+        # Разделитель внутри тега (пробел между атрибутами) не подходит
+        while index != -1 and _inside(tokens, index):
+            index = text.rfind(separator, middle, index)
+        if index != -1:
+            cut, skip = index, 1
+            break
+    if cut is None:
+        cut = hi
+
+    for match in tokens:
+        if match.start() >= cut:
+            break
+        stack = _apply(stack, match)
+    return cut, stack, skip
+
+
+def _inside(tokens: list[re.Match], index: int) -> bool:
+    """Попадает ли позиция внутрь одного из тегов (позиции тегов возрастают)"""
+    for match in reversed(tokens):
+        if match.start() <= index:
+            return index < match.end()
+    return False
+
+
+def _apply(stack: tuple[tuple[str, str], ...], match: re.Match) -> tuple[tuple[str, str], ...]:
+    """
+    Функция обновляет стек открытых тегов по тегу match (сущности стек не меняют)
+    :param stack: Открытые теги
+    :type stack: tuple[tuple[str, str], ...]
+    :param match: Тег или сущность
+    :type match: re.Match
+    :return: Новый стек
+    :rtype: tuple[tuple[str, str], ...]
+    """
+    name: Optional[str] = match.group(2)
+    if name is None:
+        return stack
+    name = name.lower()
+    if not match.group(1):
+        return stack + ((name, match.group(0)),)
+    # Закрывающий тег закрывает последний открытый тег с тем же именем (и все, что открыто внутри него)
+    for depth in range(len(stack) - 1, -1, -1):
+        if stack[depth][0] == name:
+            return stack[:depth]
+    return stack
+
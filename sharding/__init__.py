@@ -0,0 +1,2 @@
+"""Пакет для обработки апдейтов long polling в нескольких процессах"""
+from .supervisor import chat_id_of, shard_of, ShardPool, process_shard, run_shards
@@ -0,0 +1,255 @@
+"""Модуль с режимом нескольких процессов для long polling. Процесс-супервизор один получает апдейты (getUpdates)
+и раздает их процессам-обработчикам по chat_id: апдейты одного чата всегда попадают в один процесс и обрабатываются
+в нем по порядку, поэтому состояние диалога не гонится само с собой. Кэш результатов, история и состояния диалогов
+у процессов общие - через настроенные хранилища (бд и FSM)"""
+import asyncio
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+import os
+import signal
+from typing import Any, Callable, Optional
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from loguru import logger
+
+from api.http_client import close_sessions, get_async_session
+from config_data import Config, TgBot
+
+
+POLLING_TIMEOUT: int = 30  # Сколько секунд телеграм держит запрос getUpdates, если апдейтов нет
+MAX_BACKOFF: float = 30  # Максимальная пауза между попытками после ошибки getUpdates
+
+
+def chat_id_of(update: dict[str, Any]) -> Optional[int]:
+    """
+    Функция возвращает id чата, к которому относится апдейт (для апдейтов без чата - id пользователя)
+    :param update: Апдейт в виде словаря, как его прислал телеграм
+    :type update: dict[str, Any]
+    :return: id чата или None, если апдейт не связан ни с чатом, ни с пользователем
+    :rtype: Optional[int]
+    """
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        chat: Optional[dict] = event.get('chat') or (event.get('message') or dict()).get('chat')
+        if chat is not None:
+            return chat['id']
+        user: Optional[dict] = event.get('from') or event.get('user')
+        if user is not None:
+            return user['id']
+    return None
+
+
+def shard_of(update: dict[str, Any], shards: int) -> int:
+    """
+    Функция возвращает номер процесса, который обрабатывает апдейт (одинаковый для всех апдейтов одного чата)
+    :param update: Апдейт
+    :type update: dict[str, Any]
+    :param shards: Количество процессов
+    :type shards: int
+    :return: Номер процесса
+    :rtype: int
+    """
+    chat_id: Optional[int] = chat_id_of(update)
+    return chat_id % shards if chat_id is not None else 0
+
+
+class ShardPool:
+    """
+    Процессы-обработчики с очередями апдейтов. Процесс выполняет target(config, queue) и читает из очереди пачки
+    апдейтов до None
+
+    Args:
+        target (Callable[[Config, Queue], Any]): Функция процесса (должна быть объявлена на уровне модуля)
+        config (Config): Конфиг
+        workers (int): Количество процессов
+    """
+    def __init__(self, target: Callable[[Config, Queue], Any], config: Config, workers: int) -> None:
+        # spawn, а не fork: процессы не наследуют потоки и сессии родителя
+        context = multiprocessing.get_context('spawn')
+        self.__queues: list[Queue] = [context.Queue() for _ in range(workers)]
+        self.__processes: list[BaseProcess] = [context.Process(target=target, args=(config, queue),
+                                                               name=f'shard-{number}')
+                                               for number, queue in enumerate(self.__queues)]
+
+    def start(self) -> None:
+        for process in self.__processes:
+            process.start()
+        logger.info(f'Запущено процессов-обработчиков: {len(self.__processes)}')
+
+    def submit(self, updates: list[dict[str, Any]]) -> None:
+        """
+        Метод раскладывает апдейты по процессам. Каждый процесс получает свою часть одной пачкой, порядок апдейтов
+        внутри пачки сохраняется
+        :param updates: Апдейты
+        :type updates: list[dict[str, Any]]
+        :return: None
+        """
+        batches: list[list[dict[str, Any]]] = [list() for _ in self.__queues]
+        for update in updates:
+            batches[shard_of(update, len(batches))].append(update)
+        for queue, batch in zip(self.__queues, batches):
+            if batch:
+                queue.put(batch)
+
+    def signal(self, signum: int) -> None:
+        """Метод пересылает сигнал живым процессам"""
+        for process in self.__processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def stop(self) -> None:
+        """
+        Метод просит процессы завершиться после обработки уже полученных апдейтов и ждет их (блокирующий)
+        :return: None
+        """
+        for queue in self.__queues:
+            queue.put(None)
+        for process in self.__processes:
+            process.join()
+            if process.exitcode:
+                logger.error(f'Процесс {process.name} завершился с кодом {process.exitcode}')
+
+
+async def process_shard(dispatcher: Dispatcher, bot: Bot, updates: Queue) -> None:
+    """
+    Функция процесса-обработчика: вызывает startup диспетчера, передает ему апдейты из очереди и после None
+    дожидается обработки и вызывает shutdown. Апдейты разных чатов обрабатываются конкурентно, а одного чата -
+    строго по очереди
+    :param dispatcher: Диспетчер
+    :type dispatcher: Dispatcher
+    :param bot: Бот
+    :type bot: Bot
+    :param updates: Очередь пачек апдейтов
+    :type updates: Queue
+    :return: None
+    """
+    # SIGINT из терминала получает вся группа процессов, а остановкой обработчиков управляет супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    workflow_data: dict[str, Any] = {'dispatcher': dispatcher, 'bots': [bot], **dispatcher.workflow_data}
+    # Последняя задача каждого чата: следующий апдейт чата ждет ее завершения
+    tails: dict[Optional[int], asyncio.Task] = dict()
+
+    async def handle(update: dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dispatcher.feed_raw_update(bot, update)
+        except Exception:
+            # feed_raw_update ошибки хэндлеров не логгирует, а очередь чата из-за них останавливаться не должна
+            logger.exception('Ошибка обработки апдейта {}', update.get('update_id'))
+
+    def release(chat_id: Optional[int], task: asyncio.Task) -> None:
+        if tails.get(chat_id) is task:
+            del tails[chat_id]
+
+    await dispatcher.emit_startup(bot=bot, **workflow_data)
+    logger.info('Процесс-обработчик запущен')
+    try:
+        while True:
+            batch: Optional[list[dict[str, Any]]] = await loop.run_in_executor(None, updates.get)
+            if batch is None:
+                break
+            for update in batch:
+                chat_id: Optional[int] = chat_id_of(update)
+                task: asyncio.Task = loop.create_task(handle(update, tails.get(chat_id)))
+                tails[chat_id] = task
+                task.add_done_callback(lambda done, key=chat_id: release(key, done))
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        try:
+            await dispatcher.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
+
+
+async def poll(settings: TgBot, pool: ShardPool, stop: asyncio.Event) -> None:
+    """
+    Функция получает апдейты через getUpdates и раздает их процессам, пока не будет установлен stop. Апдейты
+    не разбираются в объекты aiogram: супервизору достаточно chat_id, а разбор выполняют процессы-обработчики
+    :param settings: Настройки бота
+    :type settings: TgBot
+    :param pool: Процессы-обработчики
+    :type pool: ShardPool
+    :param stop: Событие остановки
+    :type stop: asyncio.Event
+    :return: None
+    """
+    server: TelegramAPIServer = TelegramAPIServer.from_base(settings.api_server) if settings.api_server \
+        else PRODUCTION
+    url: str = server.api_url(settings.token, 'getUpdates')
+    session: aiohttp.ClientSession = await get_async_session()
+    offset: Optional[int] = None
+    backoff: float = 1
+
+    async def get_updates(timeout: int) -> list[dict[str, Any]]:
+        params: dict[str, int] = {'timeout': timeout} if offset is None else {'timeout': timeout, 'offset': offset}
+        async with session.post(url, json=params,
+                                timeout=aiohttp.ClientTimeout(total=timeout + 10)) as response:
+            payload: dict[str, Any] = await response.json()
+        if not payload.get('ok'):
+            raise aiohttp.ClientError(payload.get('description'))
+        return payload['result']
+
+    waiting: asyncio.Task = asyncio.create_task(stop.wait())
+    try:
+        while not stop.is_set():
+            request: asyncio.Task = asyncio.create_task(get_updates(POLLING_TIMEOUT))
+            await asyncio.wait([request, waiting], return_when=asyncio.FIRST_COMPLETED)
+            if not request.done():
+                # Остановка во время ожидания апдейтов: полученные телеграмом апдейты придут при следующем запуске
+                request.cancel()
+                break
+            try:
+                updates: list[dict[str, Any]] = request.result()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                logger.warning(f'Ошибка getUpdates: {error}. Повтор через {backoff:.0f} с')
+                await asyncio.wait([waiting], timeout=backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = 1
+            if updates:
+                offset = updates[-1]['update_id'] + 1
+                pool.submit(updates)
+
+        if offset is not None:
+            # Подтверждаем телеграму уже розданные апдейты, иначе после перезапуска они придут снова
+            try:
+                await get_updates(0)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                logger.warning(f'Не удалось подтвердить полученные апдейты: {error}')
+    finally:
+        waiting.cancel()
+
+
+async def run_shards(target: Callable[[Config, Queue], Any], config: Config) -> None:
+    """
+    Функция супервизора: запускает config.tg_bot.workers процессов target(config, queue) и раздает им апдейты
+    до сигнала SIGTERM или SIGINT. После сигнала процессы дообрабатывают полученные апдейты и завершаются.
+    SIGHUP (перезагрузка конфига) пересылается процессам
+    :param target: Функция процесса-обработчика (должна быть объявлена на уровне модуля)
+    :type target: Callable[[Config, Queue], Any]
+    :param config: Конфиг
+    :type config: Config
+    :return: None
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    stop: asyncio.Event = asyncio.Event()
+    pool: ShardPool = ShardPool(target, config, config.tg_bot.workers)
+    pool.start()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    if hasattr(signal, 'SIGHUP'):
+        loop.add_signal_handler(signal.SIGHUP, pool.signal, signal.SIGHUP)
+
+    try:
+        await poll(config.tg_bot, pool, stop)
+        logger.info('Остановка процессов-обработчиков')
+    finally:
+        await loop.run_in_executor(None, pool.stop)
+        await close_sessions()
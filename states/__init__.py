@@ -4,3 +4,4 @@
 в процессе взаимодействия с ботом, для реализации машины состояний
 """
 from .states import FSMQuery
+from .storage import SQLiteStorage, count_states, create_fsm_storage
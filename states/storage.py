@@ -0,0 +1,243 @@
+"""
+Модуль с хранилищами состояний диалогов. Состояния переживают перезапуск бота и могут быть общими
+для нескольких процессов: SQLite - для процессов на одной машине, redis - для нескольких машин.
+Брошенные диалоги удаляются через FSM.ttl секунд после последнего действия
+"""
+import json
+import time
+from typing import Any, Mapping, Optional
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from loguru import logger
+
+from config_data import FSM, get_config
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище состояний в файле SQLite. Файл можно использовать из нескольких процессов одновременно (режим WAL)
+
+    Args:
+        path (str): Путь к файлу бд
+        ttl (int): Через сколько секунд без действий диалог удаляется (0 - не удалять)
+        key_builder (Optional[KeyBuilder]): Построитель ключей (по умолчанию - как у RedisStorage)
+        purge_interval (float): Как часто (в секундах) удалять устаревшие диалоги из файла
+    """
+    def __init__(self, path: str, ttl: int = 0, key_builder: Optional[KeyBuilder] = None,
+                 purge_interval: float = 60) -> None:
+        self.__path: str = path
+        self.__ttl: int = ttl
+        self.__key_builder: KeyBuilder = key_builder if key_builder is not None else DefaultKeyBuilder()
+        self.__purge_interval: float = purge_interval
+        self.__connection: Optional[aiosqlite.Connection] = None
+        self.__last_purge: float = 0.0
+
+    async def __connect(self) -> aiosqlite.Connection:
+        """
+        Метод открывает соединение с бд при первом обращении и создает таблицу состояний
+        :return: Соединение
+        :rtype: aiosqlite.Connection
+        """
+        if self.__connection is None:
+            connection: aiosqlite.Connection = await aiosqlite.connect(self.__path)
+            await connection.execute('PRAGMA journal_mode=WAL')
+            await connection.execute('PRAGMA synchronous=NORMAL')
+            await connection.execute('PRAGMA busy_timeout=5000')
+            await connection.execute('CREATE TABLE IF NOT EXISTS fsm ('
+                                     'key TEXT PRIMARY KEY, state TEXT, data TEXT, expires_at REAL)')
+            await connection.execute('CREATE INDEX IF NOT EXISTS ix_fsm_expires_at ON fsm (expires_at)')
+            await connection.commit()
+            self.__connection = connection
+        return self.__connection
+
+    def __expires_at(self) -> Optional[float]:
+        """Момент, после которого диалог считается брошенным (None - никогда)"""
+        return time.time() + self.__ttl if self.__ttl > 0 else None
+
+    async def __read(self, key: StorageKey, column: str) -> Optional[str]:
+        """
+        Метод читает колонку state или data у живого (не устаревшего) диалога
+        :param key: Ключ диалога
+        :type key: StorageKey
+        :param column: Колонка
+        :type column: str
+        :return: Значение колонки или None
+        :rtype: Optional[str]
+        """
+        connection: aiosqlite.Connection = await self.__connect()
+        async with connection.execute(f'SELECT {column} FROM fsm WHERE key = ? AND '
+                                      f'(expires_at IS NULL OR expires_at > ?)',
+                                      (self.__key_builder.build(key), time.time())) as cursor:
+            row: Optional[tuple] = await cursor.fetchone()
+        return None if row is None else row[0]
+
+    async def __write(self, key: StorageKey, column: str, value: Optional[str]) -> None:
+        """
+        Метод записывает колонку state или data и продлевает диалогу жизнь. Если у диалога больше нет ни состояния,
+        ни данных, то он удаляется
+        :param key: Ключ диалога
+        :type key: StorageKey
+        :param column: Колонка
+        :type column: str
+        :param value: Значение
+        :type value: Optional[str]
+        :return: None
+        """
+        connection: aiosqlite.Connection = await self.__connect()
+        storage_key: str = self.__key_builder.build(key)
+        now: float = time.time()
+        # Если старая запись уже устарела, то вторая колонка не должна ожить вместе с новой
+        await connection.execute('DELETE FROM fsm WHERE key = ? AND expires_at <= ?', (storage_key, now))
+        await connection.execute(f'INSERT INTO fsm (key, {column}, expires_at) VALUES (?, ?, ?) '
+                                 f'ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, '
+                                 f'expires_at = excluded.expires_at',
+                                 (storage_key, value, self.__expires_at()))
+        await connection.execute('DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL', (storage_key,))
+
+        if self.__ttl > 0 and now - self.__last_purge >= self.__purge_interval:
+            # Удаляем брошенные диалоги по индексу expires_at
+            self.__last_purge = now
+            cursor: aiosqlite.Cursor = await connection.execute(
+                'DELETE FROM fsm WHERE expires_at <= ?', (now,))
+            if cursor.rowcount > 0:
+                logger.debug(f'Удалено брошенных диалогов: {cursor.rowcount}')
+        await connection.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.__write(key, 'state', state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self.__read(key, 'state')
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.__write(key, 'data', json.dumps(dict(data), ensure_ascii=False) if data else None)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        data: Optional[str] = await self.__read(key, 'data')
+        return json.loads(data) if data is not None else dict()
+
+    async def count_states(self) -> dict[str, int]:
+        """
+        Метод считает живые диалоги по состояниям
+        :return: Состояние -> количество диалогов
+        :rtype: dict[str, int]
+        """
+        connection: aiosqlite.Connection = await self.__connect()
+        async with connection.execute('SELECT state, COUNT(*) FROM fsm WHERE state IS NOT NULL AND '
+                                      '(expires_at IS NULL OR expires_at > ?) GROUP BY state',
+                                      (time.time(),)) as cursor:
+            return {state: number for state, number in await cursor.fetchall()}
+
+    async def close(self) -> None:
+        if self.__connection is not None:
+            await self.__connection.close()
+        self.__connection = None
+
+
+def create_fsm_storage(settings: Optional[FSM] = None) -> BaseStorage:
+    """
+    Функция создает хранилище состояний, выбранное в настройках
+    :param settings: Настройки хранилища (если не переданы, то берутся из общего конфига)
+    :type settings: Optional[FSM]
+    :return: Хранилище состояний
+    :rtype: BaseStorage
+    """
+    if settings is None:
+        settings = get_config().fsm
+
+    if settings.backend == 'sqlite':
+        return SQLiteStorage(settings.url, ttl=settings.ttl)
+    if settings.backend == 'redis':
+        # redis нужен только для этого хранилища, поэтому импортируется здесь
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        ttl: Optional[int] = settings.ttl if settings.ttl > 0 else None
+        return RedisStorage.from_url(settings.url, state_ttl=ttl, data_ttl=ttl)
+    if settings.backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f'Неизвестное хранилище состояний: {settings.backend}')
+
+
+async def count_states(storage: BaseStorage) -> Optional[dict[str, int]]:
+    """
+    Функция считает диалоги по состояниям (для метрик)
+    :param storage: Хранилище состояний
+    :type storage: BaseStorage
+    :return: Состояние -> количество диалогов или None, если хранилище не умеет дешево их считать (redis)
+    :rtype: Optional[dict[str, int]]
+    """
+    if isinstance(storage, SQLiteStorage):
+        return await storage.count_states()
+    if isinstance(storage, MemoryStorage):
+        counts: dict[str, int] = dict()
+        for record in storage.storage.values():
+            if record.state is not None:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return counts
+    return None
+
+
+if __name__ == '__main__':
+    import asyncio
+    import os
+    import tempfile
+
+    from states.states import FSMQuery
+
+    async def check(make_storage, persistent: bool, expiring: bool) -> None:
+        """Один и тот же сценарий для всех хранилищ: make_storage(ttl) создает хранилище"""
+        key: StorageKey = StorageKey(bot_id=1, chat_id=10, user_id=10)
+        other: StorageKey = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+        storage: BaseStorage = make_storage(0)
+        await storage.set_state(key, FSMQuery.fill_range)
+        await storage.update_data(key, {'command': 'custom', 'product': 'red dead'})
+        await storage.update_data(key, {'range': (100, 500)})
+        assert await storage.get_state(key) == FSMQuery.fill_range.state
+        data: dict[str, Any] = await storage.get_data(key)
+        # После сериализации в JSON кортеж становится списком
+        assert list(data.pop('range')) == [100, 500]
+        assert data == {'command': 'custom', 'product': 'red dead'}
+        assert await storage.get_state(other) is None and await storage.get_data(other) == {}
+        # redis диалоги не считает (None)
+        assert await count_states(storage) in (None, {FSMQuery.fill_range.state: 1})
+        await storage.close()
+
+        if persistent:
+            # Диалог пережил перезапуск
+            storage = make_storage(0)
+            assert await storage.get_state(key) == FSMQuery.fill_range.state
+            await storage.set_state(key, None)
+            await storage.set_data(key, {})
+            assert await storage.get_state(key) is None and await storage.get_data(key) == {}
+            await storage.close()
+
+        if expiring:
+            # Брошенный диалог удаляется
+            storage = make_storage(1)
+            await storage.set_state(other, FSMQuery.fill_number)
+            await storage.set_data(other, {'command': 'low'})
+            await asyncio.sleep(1.5)
+            assert await storage.get_state(other) is None and await storage.get_data(other) == {}
+            await storage.close()
+        print(f'{type(storage).__name__}: OK')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, 'fsm.db')
+        asyncio.run(check(lambda ttl: SQLiteStorage(path, ttl=ttl, purge_interval=0), persistent=True, expiring=True))
+        asyncio.run(check(lambda ttl: MemoryStorage(), persistent=False, expiring=False))
+    try:
+        # Вместо сервера redis - его реализация в памяти процесса (pip install fakeredis)
+        from aiogram.fsm.storage.redis import RedisStorage
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeRedis
+    except ImportError:
+        print('RedisStorage: пропущено (нет redis или fakeredis)')
+    else:
+        server: FakeServer = FakeServer()
+        asyncio.run(check(lambda ttl: RedisStorage(FakeRedis(server=server), state_ttl=ttl or None,
+                                                   data_ttl=ttl or None),
+                          persistent=True, expiring=True))
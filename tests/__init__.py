@@ -0,0 +1 @@
+"""Пакет с проверками свойств"""
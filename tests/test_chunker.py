@@ -0,0 +1,118 @@
+"""Случайные проверки свойств разбиения длинных ответов на сообщения (split_message и adjusting_length_message)
+на тексте с вложенными тегами и сущностями: длина сообщений, целые теги и сущности, сбалансированная разметка
+в каждом сообщении, сохранение текста. Проверки воспроизводимы: сид - номер проверки. Генератор текста и проверка
+сообщения используются и в benchmarks/bench_chunker.py
+
+Запуск: python -m pytest tests или python -m tests.test_chunker [количество проверок]"""
+import random
+import re
+import sys
+from typing import Optional
+
+from service import MAX_MSG_LENGTH, adjusting_length_message, split_message
+
+
+CHECKS: int = 2000
+TAGS: tuple[tuple[str, str], ...] = (('b', '<b>'), ('i', '<i>'), ('u', '<u>'), ('code', '<code>'),
+                                     ('a', '<a href="https://store.epicgames.com/p/game?a=1&amp;b=2">'),
+                                     ('span', '<span class="tg-spoiler">'), ('blockquote', '<blockquote>'))
+ENTITIES: tuple[str, ...] = ('&amp;', '&lt;', '&gt;', '&quot;', '&#8381;', '&#x20BD;')
+TAG: re.Pattern = re.compile(r'<(/?)([a-z]+)[^<>]*>')
+
+
+def random_html(rng: random.Random, size: int, max_depth: int = 3) -> str:
+    """Функция создает случайный текст с разметкой: слова, длинные слова без пробелов, переносы, теги и сущности"""
+    parts: list[str] = list()
+    stack: list[str] = list()
+    length: int = 0
+    while length < size:
+        roll: float = rng.random()
+        if roll < 0.08 and len(stack) < max_depth:
+            name, tag = rng.choice(TAGS)
+            stack.append(name)
+            part: str = tag
+        elif roll < 0.16 and stack:
+            part = f'</{stack.pop()}>'
+        elif roll < 0.22:
+            part = rng.choice(ENTITIES)
+        elif roll < 0.27:
+            part = '\n'
+        elif roll < 0.29:
+            part = 'x' * rng.randint(20, 300)
+        else:
+            part = rng.choice(('Игра', 'цена', 'Red', 'Dead', '1999', 'руб.')) + ' '
+        parts.append(part)
+        length += len(part)
+    parts.extend(f'</{name}>' for name in reversed(stack))
+    return ''.join(parts)
+
+
+def visible(text: str) -> str:
+    """Текст без тегов и без пробельных символов (разделители в местах разрыва выбрасываются)"""
+    return re.sub(r'\s', '', TAG.sub('', text))
+
+
+def check_message(message: str, limit: int) -> Optional[str]:
+    """Функция проверяет одно сообщение и возвращает описание нарушения или None"""
+    if len(message) > limit:
+        return f'длина {len(message)} больше {limit}'
+    if re.search(r'<[^<>]*$', message) or re.search(r'^[^<]*>', message):
+        return 'разрезан тег'
+    if re.search(r'&(?!#\d+;|#x[0-9a-fA-F]+;|\w+;)', message):
+        return 'разрезана сущность'
+    stack: list[str] = list()
+    for match in TAG.finditer(message):
+        if not match.group(1):
+            stack.append(match.group(2))
+        elif not stack or stack.pop() != match.group(2):
+            return f'несбалансированный тег {match.group(0)}'
+    if stack:
+        return f'не закрыты теги {stack}'
+    return None
+
+
+def check_split_message(seed: int) -> None:
+    """Длинный текст: сообщения не длиннее лимита, разметка в каждом цела и сбалансирована, текст сохранен"""
+    rng: random.Random = random.Random(seed)
+    limit: int = rng.choice((200, 500, 1000, MAX_MSG_LENGTH))
+    text: str = random_html(rng, rng.randint(0, limit * 8))
+    messages: list[str] = split_message(text, limit)
+    for message in messages:
+        problem: Optional[str] = check_message(message, limit)
+        assert problem is None, f'сид {seed}, лимит {limit}: {problem}\n{message!r}'
+    assert visible(''.join(messages)) == visible(text), f'сид {seed}: текст изменился'
+    assert all(message.strip() for message in messages[:-1]), f'сид {seed}: пустое сообщение'
+
+
+def check_adjusting_length_message(seed: int) -> None:
+    """Записи истории: каждая запись короче лимита остается целой и в том же порядке"""
+    rng: random.Random = random.Random(seed)
+    limit: int = rng.choice((200, 500, 1000, MAX_MSG_LENGTH))
+    records: list[str] = [random_html(rng, rng.randint(1, limit // 3)) for _ in range(rng.randint(0, 30))]
+    if rng.random() < 0.3:
+        records.append(random_html(rng, limit * 3))
+    messages: list[str] = adjusting_length_message(records, limit)
+    for message in messages:
+        problem: Optional[str] = check_message(message, limit)
+        assert problem is None, f'сид {seed}, записи, лимит {limit}: {problem}\n{message!r}'
+    if all(len(record) <= limit for record in records):
+        assert '\n'.join(messages) == '\n'.join(records), f'сид {seed}: записи изменились'
+    assert visible(''.join(messages)) == visible(''.join(records)), f'сид {seed}: текст записей изменился'
+
+
+def test_split_message() -> None:
+    for seed in range(CHECKS):
+        check_split_message(seed)
+
+
+def test_adjusting_length_message() -> None:
+    for seed in range(CHECKS):
+        check_adjusting_length_message(seed)
+
+
+if __name__ == '__main__':
+    checks: int = int(sys.argv[1]) if len(sys.argv) > 1 else CHECKS
+    for number in range(checks):
+        check_split_message(number)
+        check_adjusting_length_message(number)
+    print(f'split_message, adjusting_length_message: {checks} проверок свойств, OK')
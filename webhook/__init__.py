@@ -0,0 +1,2 @@
+"""Пакет для получения апдейтов через вебхук"""
+from .server import create_app, serve, run_workers
@@ -0,0 +1,135 @@
+"""Модуль с aiohttp-сервером, принимающим апдейты телеграма через вебхук. Несколько процессов могут слушать
+один порт (SO_REUSEPORT), и ядро распределяет между ними входящие соединения"""
+import asyncio
+import multiprocessing
+from multiprocessing.process import BaseProcess
+import os
+import signal
+from typing import Any, Callable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+
+from config_data import Config, Metrics, Webhook
+from metrics import metrics_handler
+
+
+SHUTDOWN_TIMEOUT: float = 30  # Сколько секунд при остановке ждать обработки уже принятых апдейтов
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик запросов телеграма, который сразу отвечает телеграму, а апдейт обрабатывает в фоне.
+    При остановке сервера он дожидается обработки уже принятых апдейтов и только потом закрывает сессию бота
+    """
+    async def close(self) -> None:
+        pending: set[asyncio.Task] = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info(f'Ожидается обработка {len(pending)} принятых апдейтов')
+            _, not_done = await asyncio.wait(pending, timeout=SHUTDOWN_TIMEOUT)
+            if not_done:
+                logger.warning(f'Не дождались обработки {len(not_done)} апдейтов')
+        await super().close()
+
+
+def create_app(dispatcher: Dispatcher, bot: Bot, settings: Webhook,
+               metrics: Optional[Metrics] = None) -> web.Application:
+    """
+    Функция создает aiohttp-приложение, которое принимает апдейты на settings.path и передает их диспетчеру.
+    Если метрики включены, то они доступны на странице metrics.path (у каждого процесса свои).
+    Запуск и остановка приложения вызывают startup и shutdown диспетчера
+    :param dispatcher: Диспетчер
+    :type dispatcher: Dispatcher
+    :param bot: Бот
+    :type bot: Bot
+    :param settings: Настройки вебхука
+    :type settings: Webhook
+    :param metrics: Настройки метрик
+    :type metrics: Optional[Metrics]
+    :return: Приложение
+    :rtype: web.Application
+    """
+    app: web.Application = web.Application()
+    DrainingRequestHandler(dispatcher=dispatcher,
+                           bot=bot,
+                           secret_token=settings.secret or None).register(app, path=settings.path)
+    if metrics is not None and metrics.enabled:
+        app.router.add_get(metrics.path, metrics_handler)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def serve(app: web.Application, settings: Webhook) -> None:
+    """
+    Функция запускает приложение и работает до сигнала SIGTERM или SIGINT. После сигнала сервер перестает принимать
+    соединения, дожидается обработки принятых апдейтов и вызывает shutdown диспетчера
+    :param app: Приложение
+    :type app: web.Application
+    :param settings: Настройки вебхука
+    :type settings: Webhook
+    :return: None
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    stop: asyncio.Event = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    runner: web.AppRunner = web.AppRunner(app, handle_signals=False, shutdown_timeout=SHUTDOWN_TIMEOUT)
+    await runner.setup()
+    try:
+        # reuse_port позволяет нескольким процессам слушать один порт
+        site: web.TCPSite = web.TCPSite(runner, settings.host, settings.port, reuse_port=settings.workers > 1)
+        await site.start()
+        logger.info(f'Вебхук слушает {settings.host}:{settings.port}{settings.path}')
+        await stop.wait()
+        logger.info('Остановка сервера вебхука')
+    finally:
+        await runner.cleanup()
+
+
+def run_workers(target: Callable[[Config], Any], config: Config, workers: int) -> None:
+    """
+    Функция запускает target(config) в workers процессах и ждет их завершения. SIGTERM и SIGHUP пересылаются
+    процессам (SIGINT из терминала они получают сами). Если процесс один, то target выполняется в текущем процессе
+    :param target: Функция процесса (должна быть объявлена на уровне модуля)
+    :type target: Callable[[Config], Any]
+    :param config: Конфиг
+    :type config: Config
+    :param workers: Количество процессов
+    :type workers: int
+    :return: None
+    """
+    if workers <= 1:
+        target(config)
+        return
+
+    # spawn, а не fork: процессы не наследуют потоки и сессии родителя
+    context = multiprocessing.get_context('spawn')
+    processes: list[BaseProcess] = [context.Process(target=target, args=(config,), name=f'worker-{number}')
+                                    for number in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info(f'Запущено процессов: {workers}')
+
+    def forward(signum: int, frame: Any) -> None:
+        for child in processes:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, forward)
+
+    for process in processes:
+        while True:
+            try:
+                process.join()
+                break
+            except KeyboardInterrupt:
+                # SIGINT уже получили и процессы, дождемся их штатной остановки
+                continue
+        if process.exitcode:
+            logger.error(f'Процесс {process.name} завершился с кодом {process.exitcode}')
+